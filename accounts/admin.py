@@ -1,23 +1,22 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 from django.contrib.auth.admin import UserAdmin
-from django.http import HttpResponse
-import csv
-from django.db.models import Sum
+from . import kpis
+from .backends import forget_users
 from .models import User, Purchase
+from .exports import export_response
 from enseignants.models import Formation, Course
-from .models import CourseSubmission 
-# ✅ Export to CSV
+from enseignants.search import search_catalogue
+from etudiant.models import Submission
+# ✅ Export to CSV / JSONL (streamed)
 def export_to_csv(modeladmin, request, queryset):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="export.csv"'
-    response.write('\ufeff')  # To handle accents correctly in Excel
-    writer = csv.writer(response)
-    writer.writerow([field.name for field in queryset.model._meta.fields])
-    for obj in queryset:
-        writer.writerow([getattr(obj, field.name) for field in queryset.model._meta.fields])
-    return response
+    return export_response(queryset, 'csv')
 export_to_csv.short_description = "Exporter en CSV"
 
+def export_to_jsonl(modeladmin, request, queryset):
+    return export_response(queryset, 'jsonl')
+export_to_jsonl.short_description = "Exporter en JSONL"
+
 # ✅ User Admin
 class CustomUserAdmin(UserAdmin):
     model = User
@@ -25,7 +24,7 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('is_student', 'is_teacher', 'is_staff')
     search_fields = ('email', 'first_name', 'last_name')
     ordering = ('-date_joined',)
-    actions = [export_to_csv, 'ban_users']
+    actions = [export_to_csv, export_to_jsonl, 'ban_users']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Informations personnelles', {'fields': ('first_name', 'last_name', 'cv')}),
@@ -41,7 +40,11 @@ class CustomUserAdmin(UserAdmin):
     )
 
     def ban_users(self, request, queryset):
+        banned = list(queryset.filter(is_active=True).values('pk', *kpis.USER_FIELDS))
         queryset.update(is_active=False)
+        # update() sends no signals
+        kpis.count_users(before=banned)
+        forget_users([user['pk'] for user in banned])  # logged out on their next request
     ban_users.short_description = "Bannir les utilisateurs sélectionnés"
 
 # ✅ Formation Admin
@@ -50,31 +53,52 @@ class FormationAdmin(admin.ModelAdmin):
     list_editable = ('is_approved',)
     list_filter = ('is_approved', 'created_at')
     search_fields = ('titre', 'description')
-    actions = ['approve_formations', export_to_csv]
+    actions = ['approve_formations', export_to_csv, export_to_jsonl]
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        results = search_catalogue(queryset, search_term)
+        if ORDER_VAR not in request.GET:
+            results = results.order_by('search_rank', '-pk')  # best match first, unless a column is clicked
+        return results, False
 
     def approve_formations(self, request, queryset):
-        queryset.update(is_approved=True)
+        approved = queryset.filter(is_approved=False).update(is_approved=True)
+        kpis.count_totals(pending_formations=-approved)  # update() sends no signals
     approve_formations.short_description = "Approuver les formations sélectionnées"
 
 # ✅ Submission Admin
+class CourseListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        # Course.__str__ shows the formation: load them together
+        courses = Course.objects.select_related('formation').order_by(
+            *self.field_admin_ordering(field, request, model_admin))
+        return [(course.pk, str(course)) for course in courses]
+
 class SubmissionAdmin(admin.ModelAdmin):
     list_display = ('course', 'student', 'submitted_at', 'grade')
     list_editable = ('grade',)
-    list_filter = ('course', 'submitted_at')
+    list_filter = (('course', CourseListFilter), 'submitted_at')
+    list_select_related = ('course__formation', 'student')
     search_fields = ('student__email', 'course__titre')
 
+# ✅ Course Admin
+class CourseAdmin(admin.ModelAdmin):
+    list_select_related = ('formation',)  # shown by Course.__str__
+
 # ✅ Purchase Admin
 class PurchaseAdmin(admin.ModelAdmin):
     list_display = ('student', 'formation', 'purchased_at', 'is_paid')
     list_filter = ('is_paid', 'purchased_at', 'formation')
     search_fields = ('student__email', 'formation__titre')
-    actions = [export_to_csv]
+    actions = [export_to_csv, export_to_jsonl]
 
 # ✅ Register models
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Formation, FormationAdmin)
-admin.site.register(Course)
-admin.site.register(CourseSubmission, SubmissionAdmin)
+admin.site.register(Course, CourseAdmin)
+admin.site.register(Submission, SubmissionAdmin)
 admin.site.register(Purchase, PurchaseAdmin)
 
 admin.site.site_header = "Administration de la Plateforme Éducative"
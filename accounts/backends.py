@@ -0,0 +1,34 @@
+"""Authentication backend reading the logged-in user from the cache.
+
+``AuthenticationMiddleware`` loads ``request.user`` on every authenticated
+request. With ``CachedModelBackend`` the ``User`` comes from the shared
+cache for ``AUTH_USER_CACHE_TIMEOUT`` seconds and the table is only read
+on a miss. The cached object is the whole row: the role flags views test
+(``is_student``, ``is_teacher``, ``is_staff``, ``is_active``) and the
+password hash the session is checked against, so a password change still
+logs other sessions out.
+
+Users saved or deleted through the ORM are dropped from the cache by
+``accounts.signals``. Code changing users with ``QuerySet.update()`` calls
+``forget_users()`` itself (the admin ban action).
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+KEY = 'auth:user:{pk}'
+
+
+def forget_users(pks):
+    cache.delete_many([KEY.format(pk=pk) for pk in pks])
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = KEY.format(pk=user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
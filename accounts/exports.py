@@ -0,0 +1,76 @@
+"""Streaming CSV / JSON Lines exports for admin querysets.
+
+Rows are produced one at a time from ``QuerySet.iterator()`` and written
+straight into a ``StreamingHttpResponse``, so memory use stays flat
+whatever the number of rows. Foreign keys are joined with
+``select_related`` in the same query instead of one lookup per row.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import FileField
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+# Never leave the database through an export.
+EXCLUDED_FIELDS = {'password'}
+
+
+class Echo:
+    """File-like object whose ``write`` hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_fields(model):
+    return [field for field in model._meta.fields if field.name not in EXCLUDED_FIELDS]
+
+
+def cell(obj, field):
+    if field.is_relation:
+        related = getattr(obj, field.name)
+        return str(related) if related is not None else None
+    value = getattr(obj, field.attname)
+    if isinstance(field, FileField):
+        return value.name or None
+    return value
+
+
+def export_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    relations = [field.name for field in fields if field.is_relation]
+    if relations:
+        queryset = queryset.select_related(*relations)
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield [cell(obj, field) for field in fields]
+
+
+def stream_csv(queryset, chunk_size=CHUNK_SIZE):
+    fields = export_fields(queryset.model)
+    writer = csv.writer(Echo())
+    yield '\ufeff'  # To handle accents correctly in Excel
+    yield writer.writerow([field.name for field in fields])
+    for row in export_rows(queryset, fields, chunk_size):
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def stream_jsonl(queryset, chunk_size=CHUNK_SIZE):
+    fields = export_fields(queryset.model)
+    names = [field.name for field in fields]
+    for row in export_rows(queryset, fields, chunk_size):
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def export_response(queryset, fmt='csv'):
+    """A streaming download of ``queryset`` in ``fmt`` ('csv' or 'jsonl')."""
+    stream, content_type = FORMATS[fmt]
+    response = StreamingHttpResponse(stream(queryset), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{queryset.model._meta.model_name}.{fmt}"'
+    return response
@@ -0,0 +1,140 @@
+"""Platform KPIs behind the admin dashboard.
+
+``PlatformTotals`` (one row) holds the running totals: revenue, paid
+purchases, active users by role, formations awaiting approval and
+submissions. ``PlatformDay`` holds the same activity per day, for the
+sparklines. The dashboard reads one row plus ``SPARKLINE_DAYS`` rows,
+whatever the size of the tables behind them.
+
+Both are adjusted in place by the ``User``, ``Purchase``, ``Formation``
+and ``Submission`` signal handlers in ``accounts.signals``, and by the
+code paths that write those tables without signals (``payments.fulfil``,
+the admin actions). ``manage.py rebuild_kpis``, run nightly, recomputes
+them from the source tables.
+
+Purchases do not record the amount paid: a payment is counted at the
+price of the formation when it is counted, on the day of the purchase.
+A rebuild values every paid purchase at the current price.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from elearning import counters
+from enseignants.models import Formation
+from etudiant.models import Submission
+from .models import PlatformDay, PlatformTotals, Purchase, User
+
+SPARKLINE_DAYS = 30
+USER_FIELDS = ('is_active', 'is_staff', 'is_superuser', 'is_teacher', 'is_student')
+ROLES = (('active_staff', 'Administrateurs'), ('active_teachers', 'Enseignants'), ('active_students', 'Étudiants'))
+
+
+def user_values(user):
+    return {field: getattr(user, field) for field in USER_FIELDS}
+
+
+def active_role(values):
+    """The ``PlatformTotals`` field counting a user with these ``USER_FIELDS`` values, if any."""
+    if not values['is_active']:
+        return None
+    if values['is_staff'] or values['is_superuser']:
+        return 'active_staff'
+    if values['is_teacher']:
+        return 'active_teachers'
+    if values['is_student']:
+        return 'active_students'
+    return None
+
+
+def price(formation_id):
+    return Formation.objects.filter(pk=formation_id).values_list('prix', flat=True).first() or 0
+
+
+def count_totals(**deltas):
+    counters.add(PlatformTotals, {'pk': 1}, **deltas)
+
+
+def count_day(day, create=True, **deltas):
+    counters.add(PlatformDay, {'day': day}, create=create, **deltas)
+
+
+def count_users(before=(), after=()):
+    """Move the users described by ``before`` (``USER_FIELDS`` values) to their ``after`` roles."""
+    deltas = Counter(filter(None, map(active_role, after)))
+    deltas.subtract(filter(None, map(active_role, before)))
+    count_totals(**deltas)
+
+
+def count_payments(amount, day, count=1):
+    """Count ``count`` payments (negative: refunds) totalling ``amount``, for purchases made on ``day``."""
+    count_totals(revenue=amount, paid_purchases=count)
+    count_day(day, create=count > 0, revenue=amount, paid_purchases=count)
+
+
+def count_submissions(day, count=1):
+    count_totals(submissions=count)
+    count_day(day, create=count > 0, submissions=count)
+
+
+def sparkline(values, width=100, height=24):
+    """``points`` of an SVG polyline drawing ``values``, highest value at the top."""
+    peak = max(values, default=0) or 1
+    step = width / max(len(values) - 1, 1)
+    return ' '.join(f'{n * step:.1f},{height - height * value / peak:.1f}' for n, value in enumerate(values))
+
+
+def summary():
+    """Everything the admin dashboard shows, read from the rollup tables only."""
+    totals = PlatformTotals.objects.filter(pk=1).first() or PlatformTotals()
+    first = timezone.localdate() - timedelta(days=SPARKLINE_DAYS - 1)
+    rows = {row.day: row for row in PlatformDay.objects.filter(day__gte=first)}
+    days = [first + timedelta(days=n) for n in range(SPARKLINE_DAYS)]
+    series = {}
+    for field in ('revenue', 'paid_purchases', 'submissions', 'signups'):
+        values = [getattr(rows[day], field) if day in rows else 0 for day in days]
+        series[field] = {'total': sum(values), 'today': values[-1], 'points': sparkline(values)}
+    return {
+        'totals': totals,
+        'roles': [(label, getattr(totals, field)) for field, label in ROLES],
+        'active_users': sum(getattr(totals, field) for field, _ in ROLES),
+        'series': series,
+        'since': first,
+    }
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute the totals and every day from the source tables; return the number of rows written."""
+    paid = Purchase.objects.filter(is_paid=True)
+    staff = Q(is_staff=True) | Q(is_superuser=True)
+    totals = {
+        'revenue': paid.aggregate(revenue=Sum('formation__prix'))['revenue'] or 0,
+        'paid_purchases': paid.count(),
+        **User.objects.filter(is_active=True).aggregate(
+            active_staff=Count('pk', filter=staff),
+            active_teachers=Count('pk', filter=~staff & Q(is_teacher=True)),
+            active_students=Count('pk', filter=~staff & Q(is_teacher=False, is_student=True)),
+        ),
+        'pending_formations': Formation.objects.filter(is_approved=False).count(),
+        'submissions': Submission.objects.count(),
+    }
+    PlatformTotals.objects.update_or_create(pk=1, defaults=totals)
+
+    days = defaultdict(dict)
+    for row in (paid.annotate(day=TruncDate('purchased_at')).values('day').order_by()
+                .annotate(revenue=Sum('formation__prix'), paid_purchases=Count('pk'))):
+        days[row.pop('day')].update(row)
+    for row in (Submission.objects.annotate(day=TruncDate('submitted_at')).values('day').order_by()
+                .annotate(submissions=Count('pk'))):
+        days[row.pop('day')].update(row)
+    for row in (User.objects.annotate(day=TruncDate('date_joined')).values('day').order_by()
+                .annotate(signups=Count('pk'))):
+        days[row.pop('day')].update(row)
+    PlatformDay.objects.all().delete()
+    PlatformDay.objects.bulk_create([PlatformDay(day=day, **values) for day, values in days.items()], batch_size=2000)
+    return len(days) + 1
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.kpis import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard KPI rollups from users, purchases, formations and submissions (run nightly)."
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} rollup row(s) rebuilt."))
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_initial'),
+        ('etudiant', '0003_merge_submissions'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CourseSubmission',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+import django.core.validators
+import uploads.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_delete_coursesubmission'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='cv',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=uploads.storage.content_addressed_storage, upload_to='cvs/', validators=[django.core.validators.FileExtensionValidator(['pdf', 'docx'])]),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_user_cv'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformDay',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_purchases', models.IntegerField(default=0)),
+                ('submissions', models.IntegerField(default=0)),
+                ('signups', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlatformTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_purchases', models.IntegerField(default=0)),
+                ('active_students', models.IntegerField(default=0)),
+                ('active_teachers', models.IntegerField(default=0)),
+                ('active_staff', models.IntegerField(default=0)),
+                ('pending_formations', models.IntegerField(default=0)),
+                ('submissions', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
+from uploads.storage import content_addressed_storage
 
 
 
@@ -36,7 +37,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_student = models.BooleanField(default=False)
     is_teacher = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
-    cv = models.FileField(upload_to='cvs/', null=True, blank=True, validators=[FileExtensionValidator(['pdf', 'docx'])])
+    cv = models.FileField(upload_to='cvs/', storage=content_addressed_storage, max_length=255, null=True, blank=True, validators=[FileExtensionValidator(['pdf', 'docx'])])
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
@@ -79,23 +80,30 @@ class Purchase(models.Model):
     def __str__(self):
         return f"{self.student.get_full_name()} purchased {self.formation.titre}"
 
-class CourseSubmission(models.Model):
-    course = models.ForeignKey(
-        'enseignants.Course',  # String-based reference to resolve the circular dependency
-        on_delete=models.CASCADE,
-        related_name='course_submissions'
-    )
-    student = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name='course_submissions'
-    )
-    file = models.FileField(
-        upload_to='assignments/',
-        validators=[FileExtensionValidator(['pdf'])],
-    )
-    submitted_at = models.DateTimeField(auto_now_add=True)
-    grade = models.CharField(max_length=10, blank=True, null=True)
-    
+
+# Admin dashboard rollups, kept up to date by accounts.kpis and rebuilt
+# nightly by manage.py rebuild_kpis.
+
+class PlatformTotals(models.Model):
+    """The platform-wide counters: a single row (pk=1)."""
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_purchases = models.IntegerField(default=0)
+    active_students = models.IntegerField(default=0)
+    active_teachers = models.IntegerField(default=0)
+    active_staff = models.IntegerField(default=0)
+    pending_formations = models.IntegerField(default=0)
+    submissions = models.IntegerField(default=0)
+
+    def __str__(self):
+        return "Platform totals"
+
+
+class PlatformDay(models.Model):
+    day = models.DateField(primary_key=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_purchases = models.IntegerField(default=0)
+    submissions = models.IntegerField(default=0)
+    signups = models.IntegerField(default=0)
+
     def __str__(self):
-        return f"{self.student.get_full_name()} - {self.course.titre}"
+        return f"Platform activity on {self.day}"
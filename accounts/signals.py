@@ -0,0 +1,90 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from elearning import counters
+from enseignants.models import Formation
+from etudiant.models import Submission
+from . import kpis
+from .backends import forget_users
+from .models import User, Purchase
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def uncache_user(sender, instance, **kwargs):
+    # The cached request.user of accounts.backends
+    forget_users([instance.pk])
+
+
+# Admin dashboard KPIs (see accounts.kpis). ``_stored`` holds the values
+# of the row before the save, None for a new row.
+
+
+@receiver(pre_save, sender=User)
+def remember_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or not set(update_fields).isdisjoint(kpis.USER_FIELDS):
+        instance._stored = counters.stored_values(instance, *kpis.USER_FIELDS)
+    else:
+        # e.g. last_login on every login: no role can change
+        instance._stored = kpis.user_values(instance)
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, **kwargs):
+    stored = None if created else instance._stored
+    kpis.count_users(before=[stored] if stored else [], after=[kpis.user_values(instance)])
+    if created:
+        kpis.count_day(timezone.localdate(instance.date_joined), signups=1)
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    kpis.count_users(before=[kpis.user_values(instance)])
+    kpis.count_day(timezone.localdate(instance.date_joined), create=False, signups=-1)
+
+
+@receiver(pre_save, sender=Purchase)
+def remember_purchase(sender, instance, **kwargs):
+    instance._stored = counters.stored_values(instance, 'is_paid')
+
+
+@receiver(post_save, sender=Purchase)
+def count_purchase(sender, instance, created, **kwargs):
+    was_paid = bool(instance._stored and instance._stored['is_paid'])
+    if instance.is_paid != was_paid:
+        sign = 1 if instance.is_paid else -1
+        kpis.count_payments(sign * kpis.price(instance.formation_id), timezone.localdate(instance.purchased_at), sign)
+
+
+@receiver(post_delete, sender=Purchase)
+def uncount_purchase(sender, instance, **kwargs):
+    if instance.is_paid:
+        kpis.count_payments(-kpis.price(instance.formation_id), timezone.localdate(instance.purchased_at), -1)
+
+
+@receiver(pre_save, sender=Formation)
+def remember_formation(sender, instance, **kwargs):
+    instance._stored = counters.stored_values(instance, 'is_approved')
+
+
+@receiver(post_save, sender=Formation)
+def count_formation(sender, instance, created, **kwargs):
+    was_pending = bool(instance._stored and not instance._stored['is_approved'])
+    kpis.count_totals(pending_formations=int(not instance.is_approved) - int(was_pending))
+
+
+@receiver(post_delete, sender=Formation)
+def uncount_formation(sender, instance, **kwargs):
+    kpis.count_totals(pending_formations=-int(not instance.is_approved))
+
+
+@receiver(post_save, sender=Submission)
+def count_submission(sender, instance, created, **kwargs):
+    if created:
+        kpis.count_submissions(timezone.localdate(instance.submitted_at))
+
+
+@receiver(post_delete, sender=Submission)
+def uncount_submission(sender, instance, **kwargs):
+    kpis.count_submissions(timezone.localdate(instance.submitted_at), -1)
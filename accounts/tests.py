@@ -1,3 +1,137 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from enseignants.models import Course, Formation
+from etudiant import payments
+from etudiant.models import Submission
+from . import kpis
+from .admin import export_to_csv, export_to_jsonl
+from .models import User, Purchase, PlatformDay, PlatformTotals
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        formation = Formation.objects.create(titre="Électronique", description="d", prix=12.5, teacher=self.teacher)
+        for i in range(25):
+            student = User.objects.create_user(f'etu{i}@example.com', 'pw', is_student=True)
+            Purchase.objects.create(student=student, formation=formation, is_paid=bool(i % 2))
+        self.request = RequestFactory().get('/')
+        self.modeladmin = site._registry[Purchase]
+
+    def test_csv_is_streamed_with_related_labels(self):
+        response = export_to_csv(self.modeladmin, self.request, Purchase.objects.all())
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).decode('utf-8').lstrip('\ufeff').splitlines()
+        self.assertEqual(lines[0], 'id,student,formation,purchased_at,is_paid')
+        self.assertEqual(len(lines), 26)
+        self.assertIn('etu0@example.com,Électronique', lines[1])
+
+    def test_jsonl_export(self):
+        response = export_to_jsonl(self.modeladmin, self.request, Purchase.objects.filter(is_paid=True))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0]['formation'], 'Électronique')
+
+    def test_password_is_never_exported(self):
+        response = export_to_csv(site._registry[User], self.request, User.objects.all())
+        header = b''.join(response.streaming_content).decode('utf-8').splitlines()[0]
+        self.assertNotIn('password', header)
+
+
+class KpiTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin@example.com', 'pw')
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True)
+        self.students = [User.objects.create_user(f'etu{i}@example.com', 'pw', is_student=True) for i in range(3)]
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=20, teacher=self.teacher)
+        self.course = Course.objects.create(formation=self.formation, titre="Cours 1")
+
+    def snapshot(self):
+        totals = PlatformTotals.objects.values().get()
+        return totals, list(PlatformDay.objects.values().order_by('day'))
+
+    def test_rollups_match_a_rebuild(self):
+        first, second, third = self.students
+        Formation.objects.create(titre="Rust", description="d", prix=30, teacher=self.teacher)
+        Purchase.objects.create(student=first, formation=self.formation)
+        payments.fulfil([(first.pk, self.formation.pk), (second.pk, self.formation.pk)])
+        refunded = Purchase.objects.create(student=third, formation=self.formation, is_paid=True)
+        refunded.is_paid = False
+        refunded.save()
+        Submission.objects.create(course=self.course, student=first, file='submissions/a.pdf')
+        Submission.objects.create(course=self.course, student=second, file='submissions/b.pdf').delete()
+        site._registry[Formation].approve_formations(None, Formation.objects.all())
+        site._registry[User].ban_users(None, User.objects.filter(pk=third.pk))
+        self.teacher.last_login = self.teacher.date_joined
+        self.teacher.save(update_fields=['last_login'])
+
+        totals = PlatformTotals.objects.get()
+        self.assertEqual((totals.revenue, totals.paid_purchases), (40, 2))
+        self.assertEqual((totals.active_staff, totals.active_teachers, totals.active_students), (1, 1, 2))
+        self.assertEqual((totals.pending_formations, totals.submissions), (0, 1))
+        rollups = self.snapshot()
+        kpis.rebuild()
+        self.assertEqual(self.snapshot(), rollups)
+
+    def test_dashboard_reads_rollups_only(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('admin_dashboard'))  # caches request.user (accounts.backends)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['active_users'], 5)
+        self.assertEqual(response.context['totals'].pending_formations, 1)
+
+        payments.fulfil([(student.pk, self.formation.pk) for student in self.students])
+        for student in self.students:
+            Submission.objects.create(course=self.course, student=student, file='submissions/a.pdf')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(response.context['series']['submissions']['today'], 3)
+        self.assertEqual(response.context['series']['revenue']['total'], 60)
+
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(reverse('admin_dashboard')).status_code, 302)
+
+
+class AuthHotPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        self.client.force_login(self.student)
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries
+                          if 'FROM "django_session"' in query['sql'] or 'FROM "accounts_user"' in query['sql']]
+
+    def test_session_and_user_are_read_from_the_cache(self):
+        self.assertEqual(len(self.auth_queries(reverse('formations'))[1]), 1)  # the user, on the first request
+        response, queries = self.auth_queries(reverse('formations'))
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['user'], self.student)
+
+    def test_changed_and_banned_users_are_reloaded(self):
+        self.auth_queries(reverse('formations'))
+        self.student.first_name = "Nour"
+        self.student.save()
+        response, queries = self.auth_queries(reverse('formations'))
+        self.assertEqual((len(queries), response.context['user'].first_name), (1, "Nour"))
+
+        site._registry[User].ban_users(None, User.objects.filter(pk=self.student.pk))
+        response = self.client.get(reverse('formations'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('formations')}", fetch_redirect_response=False)
+
+    def test_sessions_opened_with_the_model_backend_stay_logged_in(self):
+        client = Client()
+        client.force_login(self.student, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(client.get(reverse('formations')).context['user'], self.student)
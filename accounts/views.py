@@ -4,8 +4,11 @@ from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
 from django import forms
 from .forms import CustomUserCreationForm
+from . import kpis
 from django.urls import reverse
 from django.utils.translation import gettext as _
+from django.conf import settings
+from elearning.caching import cache_anonymous_page
 
 class DirectPasswordResetForm(forms.Form):
     email = forms.EmailField(label=_('Email'), widget=forms.EmailInput(attrs={'class': 'form-control'}))
@@ -21,6 +24,7 @@ class DirectPasswordResetForm(forms.Form):
         return cleaned_data
 
 
+@cache_anonymous_page(settings.CATALOGUE_CACHE_TIMEOUT)
 def home(request):
     return render(request, 'home.html')
 
@@ -49,7 +53,7 @@ def register(request):
 
 @user_passes_test(lambda u: u.is_superuser)
 def admin_dashboard(request):
-    return render(request, 'accounts/admin_dashboard.html')
+    return render(request, 'accounts/admin_dashboard.html', kpis.summary())
 
 
 def direct_password_reset(request):
@@ -0,0 +1,127 @@
+"""Two-tier caching for catalogue pages and fragments.
+
+``TieredCache`` is a cache backend that reads from an in-process LRU
+(``LocMemCache``) first and falls back to the shared cache (Redis or
+files, see ``CACHES`` in settings), copying hits into the local tier.
+It is registered as the ``catalogue`` cache, so the stock
+``{% cache ... using="catalogue" %}`` tag works with it.
+
+Nothing is ever deleted on invalidation. Keys embed a generation counter
+held in the shared cache instead: ``bump('catalogue')`` (called from the
+Formation/Course signal handlers) makes every older key unreachable in
+every process at once, and stale entries simply age out of both tiers.
+"""
+import time
+from functools import wraps
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+GENERATION_KEY = 'generation:{name}'
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.local_alias = options.get('LOCAL', 'local')
+        self.shared_alias = options.get('SHARED', 'default')
+        # Local copies are short-lived so a process never keeps a large
+        # fragment long after the shared tier dropped it.
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+
+    @property
+    def local(self):
+        return caches[self.local_alias]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _timeouts(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        local = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        return timeout, local
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(key, version=1)
+        if value is None:
+            value = self.shared.get(key, version=1)
+            if value is None:
+                return default
+            self.local.set(key, value, self.local_timeout, version=1)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shared_timeout, local_timeout = self._timeouts(timeout)
+        self.shared.set(key, value, shared_timeout, version=1)
+        self.local.set(key, value, local_timeout, version=1)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.get(key, version=version) is not None:
+            return False
+        self.set(key, value, timeout, version=version)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.shared.touch(key, self._timeouts(timeout)[0], version=1)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.local.delete(key, version=1)
+        return self.shared.delete(key, version=1)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+def generation(name):
+    """Current generation number of the ``name`` cache namespace."""
+    key = GENERATION_KEY.format(name=name)
+    # Seeded from the clock so a counter lost from the cache never
+    # restarts at a value that old entries are still stored under.
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def bump(name):
+    """Invalidate everything cached under the ``name`` namespace."""
+    key = GENERATION_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def cache_anonymous_page(timeout, namespace='catalogue'):
+    """Cache the whole response of a view for anonymous GET requests.
+
+    The key contains the namespace generation, so the page is rebuilt
+    after the next ``bump(namespace)``. Logged-in users always get a fresh
+    render (their pages show personal data and CSRF tokens).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            page_cache = caches['catalogue']
+            key = f"page:{namespace}:{generation(namespace)}:{request.get_full_path()}"
+            response = page_cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                cacheable = (response.status_code == 200 and not response.streaming
+                             and not response.cookies and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE'))
+                if cacheable:
+                    page_cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
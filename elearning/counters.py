@@ -0,0 +1,36 @@
+"""Counter rows kept up to date from signal handlers.
+
+The dashboards read precomputed counters (``enseignants.dashboard``,
+``accounts.kpis``) adjusted in place with ``F()`` updates, so concurrent
+writers never lose an increment.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def add(model, key, create=True, **deltas):
+    """Add ``deltas`` to the counters of the ``model`` row matching ``key``.
+
+    The row is created when missing, unless ``create`` is false: rows
+    being deleted along with the row they count must not come back.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if model.objects.filter(**key).update(**{field: F(field) + delta for field, delta in deltas.items()}):
+        return
+    if not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Created concurrently
+        model.objects.filter(**key).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def stored_values(instance, *fields):
+    """``{field: value}`` as stored before this save, or None for a new row."""
+    if instance._state.adding:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values(*fields).first()
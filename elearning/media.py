@@ -0,0 +1,151 @@
+"""Serving protected files from MEDIA_ROOT.
+
+Course material, submissions and CVs go through views that check access
+and then call ``serve_file()``. It supports:
+
+* ``ETag`` / ``Last-Modified`` validators with conditional 304/412
+  responses, so browsers revalidate a PDF instead of downloading it again;
+* single ``Range`` requests (206 / 416), including ``If-Range``, so PDF
+  viewers can fetch pages on demand and downloads can resume;
+* offloading the transfer to the front server: ``X-Accel-Redirect`` for
+  nginx or ``X-Sendfile`` for Apache, chosen with ``MEDIA_ACCEL_REDIRECT``.
+
+Without offloading, full responses are ``FileResponse`` objects, which
+WSGI servers send with ``wsgi.file_wrapper`` (sendfile) when available.
+
+Only the public images (logos, profile pictures and their variants, see
+``uploads.images``) may be served straight from ``MEDIA_URL``; under
+DEBUG, ``serve_public_media()`` serves them and nothing else.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.static import serve
+
+from uploads.images import IMAGE_DIRS, VARIANT_DIR
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def is_public(name):
+    """Whether the media file ``name`` may be read without an access check."""
+    name = posixpath.normpath(name)
+    if name.startswith('..'):
+        return False
+    return posixpath.dirname(name) in IMAGE_DIRS or name.startswith(f'{VARIANT_DIR}/')
+
+
+def serve_public_media(request, path, document_root=None):
+    """``django.views.static.serve`` (DEBUG only) restricted to the public images."""
+    if not is_public(path):
+        raise Http404("File not found")
+    return serve(request, path, document_root=document_root)
+
+
+def parse_range(header, size):
+    """``(start, end)`` (inclusive) for a single byte range, ``None`` to send the
+    whole file, or ``False`` if the range cannot be satisfied."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None  # malformed or multi-range: ignore, as RFC 9110 allows
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:  # suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, fieldfile, as_attachment=False):
+    """Response for ``fieldfile`` (a stored FileField value) honouring caching and ranges."""
+    if not fieldfile:
+        raise Http404("File not found")
+    path = fieldfile.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    filename = os.path.basename(fieldfile.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = None
+        if request.method == 'GET' and 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+        response = build_response(path, stat.st_size, content_type, byte_range)
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Keep a copy but check it on every use: access can be revoked.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def build_response(path, size, content_type, byte_range):
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    accel = settings.MEDIA_ACCEL_REDIRECT
+    if accel:
+        # The front server handles ranges and streams from disk itself.
+        response = HttpResponse(content_type=content_type)
+        if accel == 'nginx':
+            # The path on disk, which differs from the stored name for deduplicated files.
+            name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + name)
+        else:
+            response['X-Sendfile'] = path
+        return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(iter_range(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
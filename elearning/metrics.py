@@ -0,0 +1,309 @@
+"""Per-request performance metrics, exported in the Prometheus text format.
+
+``RequestMetricsMiddleware`` records, for every request and labelled by
+URL name (``enseignants:view_submissions``...):
+
+- total latency, SQL query count and SQL time,
+- duplicate queries (the same SQL with the same parameters run again in
+  the same request, the usual sign of an N+1 loop),
+- template render time (``InstrumentedTemplates``, the template backend),
+- N+1 query patterns, on the requests checked by ``elearning.nplusone``.
+
+They are kept as histograms in the memory of each process and served by
+``/metrics/``. With several workers, each scrape sees the worker that
+answered it; scrape each worker directly to get them all.
+
+Every request also gets one ``DEBUG`` summary line from the
+``elearning.metrics`` logger, in ``key=value`` form. Requests slower
+than ``SLOW_REQUEST_MS`` are logged at ``WARNING`` instead. Only a
+``LOG_SAMPLE_RATE`` share of requests keep their ``DEBUG`` records
+(``RequestSampleFilter``), so ``LOG_LEVEL=DEBUG`` stays affordable in
+production.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import nplusone
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+UNMATCHED = '<unmatched>'
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """What one request did; filled in while ``recording()`` is active."""
+
+    def __init__(self, sampled=True, detect=False):
+        self.sampled = sampled
+        self.detect = detect  # look for N+1 queries
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.statements = Tally()
+        self.fingerprints = Tally()
+        self.origins = {}
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+
+def current():
+    """The ``RequestStats`` of the request being served, if any."""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+        stats.statements[sql, repr(params)] += 1
+        if stats.detect:
+            nplusone.track(stats, sql)
+
+
+def install(db):
+    if record_query not in db.execute_wrappers:
+        db.execute_wrappers.append(record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_on_connection_created)
+
+
+@contextmanager
+def recording(sampled=True, detect=False):
+    """Collect the queries and template renders of the block in a ``RequestStats``."""
+    install(connection)
+    stats = RequestStats(sampled, detect)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        # Templates rendered from a template (inclusion tags...) are
+        # already counted in the outer render.
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """The Django template backend, timing each render for the current request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}   # labels -> [count per bucket..., count above, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((key, list(values)) for key, values in self.series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(key, le=float(bound))} {cumulative}')
+            total = cumulative + values[-2]
+            lines.append(f'{self.name}_bucket{_labels(key, le="+Inf")} {total}')
+            lines.append(f'{self.name}_sum{_labels(key)} {values[-1]}')
+            lines.append(f'{self.name}_count{_labels(key)} {total}')
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = sorted(self.series.items())
+        lines += [f'{self.name}{_labels(key)} {value}' for key, value in series]
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+REQUESTS = Counter('elearning_requests_total', "Requests served, by URL name and status code.")
+LATENCY = Histogram('elearning_request_duration_seconds', "Total request latency.", LATENCY_BUCKETS)
+QUERIES = Histogram('elearning_db_queries', "SQL queries per request.", QUERY_BUCKETS)
+DB_TIME = Histogram('elearning_db_duration_seconds', "Time spent in SQL queries per request.", LATENCY_BUCKETS)
+DUPLICATES = Counter('elearning_db_duplicate_queries_total', "Queries repeating an earlier query of the same request.")
+TEMPLATE_TIME = Histogram('elearning_template_render_seconds', "Template render time per request.", LATENCY_BUCKETS)
+NPLUSONE = Counter('elearning_nplusone_requests_total', "Checked requests that ran N+1 queries.")
+METRICS = [REQUESTS, LATENCY, QUERIES, DB_TIME, DUPLICATES, TEMPLATE_TIME, NPLUSONE]
+
+
+def expose():
+    """Every metric in the Prometheus text exposition format."""
+    return '\n'.join(line for metric in METRICS for line in metric.expose()) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
+
+
+def observe(request, response, stats, duration):
+    """Add a finished request to the metrics and log its summary.
+
+    Raises ``NPlusOneError`` for an N+1 in strict mode.
+    """
+    match = getattr(request, 'resolver_match', None)
+    url_name = (match.view_name if match else None) or UNMATCHED
+    duplicates = stats.duplicates
+    REQUESTS.inc(url_name=url_name, status=response.status_code)
+    LATENCY.observe(duration, url_name=url_name)
+    QUERIES.observe(stats.queries, url_name=url_name)
+    DB_TIME.observe(stats.db_time, url_name=url_name)
+    TEMPLATE_TIME.observe(stats.template_time, url_name=url_name)
+    if duplicates:
+        DUPLICATES.inc(duplicates, url_name=url_name)
+    found = nplusone.offenders(stats) if stats.detect else []
+    if found:
+        NPLUSONE.inc(url_name=url_name)
+
+    slow = duration * 1000 >= settings.SLOW_REQUEST_MS
+    level = logging.WARNING if slow else logging.DEBUG
+    if logger.isEnabledFor(level) and (slow or stats.sampled):
+        log(level, request, response, stats, duration, url_name)
+    if found:
+        nplusone.report(url_name, found)
+
+
+def log(level, request, response, stats, duration, url_name):
+    slow = level >= logging.WARNING
+    fields = {
+        'url_name': url_name,
+        'method': request.method,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'queries': stats.queries,
+        'db_ms': round(stats.db_time * 1000, 1),
+        'duplicate_queries': stats.duplicates,
+        'template_ms': round(stats.template_time * 1000, 1),
+    }
+    logger.log(level, '%s %s', 'slow_request' if slow else 'request',
+               ' '.join(f'{key}={value}' for key, value in fields.items()), extra=fields)
+
+
+class RequestMetricsMiddleware:
+    """Measure every request (see the module docstring). Put it first in ``MIDDLEWARE``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sample(self):
+        mode = settings.NPLUSONE_MODE
+        return {
+            'sampled': random.random() < settings.LOG_SAMPLE_RATE,
+            'detect': mode == 'strict' or (mode == 'log' and random.random() < settings.NPLUSONE_SAMPLE_RATE),
+        }
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with recording(**self.sample()) as stats:
+            response = self.get_response(request)
+        observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with recording(**self.sample()) as stats:
+            response = await self.get_response(request)
+        observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+
+class RequestSampleFilter(logging.Filter):
+    """Drop the ``DEBUG`` records of requests left out of the ``LOG_SAMPLE_RATE`` sample."""
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        stats = _current.get()
+        return stats is None or stats.sampled
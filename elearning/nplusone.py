@@ -0,0 +1,108 @@
+"""N+1 query detection.
+
+A request has an N+1 when the same SELECT runs ``NPLUSONE_THRESHOLD``
+times or more, usually a relation loaded lazily in a loop
+(``formation.teacher`` for every formation of a list). Queries are
+compared by fingerprint: their SQL with literals and the length of
+``IN (...)`` lists removed, so the parameters do not matter.
+
+Detection rides on the request recording of ``elearning.metrics``. The
+first time a fingerprint repeats, the stack is searched for the project
+code and the template line that ran it; the report names both.
+
+``NPLUSONE_MODE`` chooses what happens to the requests with an N+1:
+
+- ``'strict'``: every request is checked and ``NPlusOneError`` is raised,
+  failing the test that made the request. The test runner
+  (``elearning.test_runner``) turns it on for the whole suite.
+- ``'log'``: a ``NPLUSONE_SAMPLE_RATE`` share of requests is checked and
+  the report is logged at ``WARNING`` (development, staging).
+- ``'off'``.
+"""
+import logging
+import os
+import re
+import sys
+
+from django.conf import settings
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_RENDER_NODE = Node.render_annotated.__code__
+# The recording code itself is never the cause.
+_OWN_FILES = {
+    os.path.join(os.path.dirname(__file__), 'nplusone.py'),
+    os.path.join(os.path.dirname(__file__), 'metrics.py'),
+}
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    return _LITERAL.sub('?', _IN_LIST.sub('IN (...)', sql))
+
+
+def is_project_file(filename):
+    return (filename.startswith(str(settings.BASE_DIR)) and filename not in _OWN_FILES
+            and 'site-packages' not in filename and 'dist-packages' not in filename)
+
+
+def find_origin():
+    """``(code, template)`` that ran the current query, as ``path:line`` strings or None.
+
+    ``code`` is the innermost project frame (a view, a model method...),
+    ``template`` the innermost template node being rendered.
+    """
+    code = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (code is None or template is None):
+        if frame.f_code is _RENDER_NODE:
+            node = frame.f_locals.get('self')
+            if template is None and getattr(node, 'origin', None) and getattr(node, 'token', None):
+                template = f'{node.origin.template_name or node.origin.name}:{node.token.lineno}'
+        elif code is None and is_project_file(frame.f_code.co_filename):
+            path = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+            code = f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return code, template
+
+
+def track(stats, sql):
+    """Count ``sql`` in ``stats``, locating it the first time it repeats."""
+    if sql.lstrip()[:6].upper() != 'SELECT':
+        return
+    key = fingerprint(sql)
+    stats.fingerprints[key] += 1
+    if stats.fingerprints[key] == 2:
+        stats.origins[key] = find_origin()
+
+
+def offenders(stats):
+    """``[(fingerprint, count, (code, template))]`` of the repeated queries, worst first."""
+    found = [
+        (key, count, stats.origins.get(key, (None, None)))
+        for key, count in stats.fingerprints.items()
+        if count >= settings.NPLUSONE_THRESHOLD
+    ]
+    return sorted(found, key=lambda offender: -offender[1])
+
+
+def describe(url_name, found):
+    lines = [f"N+1 queries in {url_name}:"]
+    for key, count, (code, template) in found:
+        lines.append(f"  {count} x {key}")
+        lines.append(f"    from {code or 'unknown code'}" + (f", template {template}" if template else ''))
+    return '\n'.join(lines)
+
+
+def report(url_name, found):
+    """Raise or log the N+1 queries ``found`` in a request, per ``NPLUSONE_MODE``."""
+    message = describe(url_name, found)
+    if settings.NPLUSONE_MODE == 'strict':
+        raise NPlusOneError(message)
+    logger.warning(message)
@@ -34,9 +34,12 @@ INSTALLED_APPS = [
     'accounts',
     'etudiant',
     'enseignants',
+    'jobs',
+    'uploads',
 ]
 
 MIDDLEWARE = [
+    'elearning.metrics.RequestMetricsMiddleware',  # first, to time the whole request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,10 +50,12 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'elearning.urls'
+TEST_RUNNER = 'elearning.test_runner.StrictTestRunner'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'elearning.metrics.InstrumentedTemplates',  # DjangoTemplates, timed per request
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -67,11 +72,34 @@ TEMPLATES = [
 WSGI_APPLICATION = 'elearning.wsgi.application'
 
 # DATABASE
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before being
+# reused, instead of one new connection per request. On PostgreSQL, DB_POOL=1
+# uses psycopg's connection pool instead (needs psycopg[pool]; Django then
+# requires CONN_MAX_AGE = 0). python manage.py bench_db compares the setups.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+# WAL lets readers work while a submission is being written; writers take
+# the lock when their transaction starts and wait up to SQLITE_TIMEOUT
+# seconds for it instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 20000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+}
 if DEBUG:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.environ.get('SQLITE_TIMEOUT', 20)),
+            },
         }
     }
 else:
@@ -83,8 +111,51 @@ else:
             'PASSWORD': os.environ['DB_PASSWORD'],
             'HOST': os.environ['DB_HOST'],
             'PORT': os.environ['DB_PORT'],
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
         }
     }
+    if DB_POOL:
+        from psycopg_pool import ConnectionPool
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'check': ConnectionPool.check_connection,  # health check on checkout
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # seconds to wait for a free connection
+            'max_idle': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        }
+
+# CACHE
+# 'default' is shared by every worker: Redis when REDIS_URL is set, files
+# in production otherwise. 'local' is a per-process LRU in front of it for
+# the catalogue (see elearning.caching).
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif DEBUG:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'}
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache'),
+    }
+CATALOGUE_CACHE_TIMEOUT = int(os.environ.get('CATALOGUE_CACHE_TIMEOUT', 600))
+CACHES = {
+    'default': SHARED_CACHE,
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local-lru',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    'catalogue': {
+        'BACKEND': 'elearning.caching.TieredCache',
+        'TIMEOUT': CATALOGUE_CACHE_TIMEOUT,
+        'OPTIONS': {'LOCAL': 'local', 'SHARED': 'default', 'LOCAL_TIMEOUT': 60},
+    },
+}
 
 # AUTHENTICATION
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,6 +169,27 @@ AUTH_USER_MODEL = 'accounts.User'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
+# request.user is read from the 'default' cache, the table on a miss (see accounts.backends).
+# Sessions store the backend that logged them in: ModelBackend stays listed so
+# sessions opened before the cached backend are not logged out. They are read
+# from the table until their next login; drop it once they have expired.
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 300))
+
+# SESSIONS
+# 'cached_db': written to the table and the 'default' cache, read from the
+# cache (the table on a miss). 'signed_cookies': no server-side storage,
+# but a session cannot be revoked before it expires (logging out only
+# clears the cookie of that browser). 'db': the table on every request.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_BACKEND]
 
 # INTERNATIONALIZATION
 LANGUAGE_CODE = 'en-us'
@@ -112,6 +204,27 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Course files, submissions and CVs are stored once per content hash
+# (uploads.storage); python manage.py gc_media removes unused files.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'content_addressed': {'BACKEND': 'uploads.storage.ContentAddressedStorage'},
+}
+# Course files, submissions and CVs are served by access-checked views.
+# Set to 'nginx' (X-Accel-Redirect to MEDIA_ACCEL_PREFIX, an internal
+# location aliased to MEDIA_ROOT) or 'apache' (X-Sendfile) to let the
+# front server stream them.
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# CHUNKED UPLOADS (see uploads.chunks)
+UPLOAD_TEMP_DIR = os.environ.get('UPLOAD_TEMP_DIR', BASE_DIR / 'tmp' / 'uploads')  # outside MEDIA_ROOT: never served
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+UPLOAD_COURSE_MAX_SIZE = int(os.environ.get('UPLOAD_COURSE_MAX_SIZE', 500 * 1024 * 1024))
+SUBMISSION_MAX_SIZE = int(os.environ.get('SUBMISSION_MAX_SIZE', 5 * 1024 * 1024))
+UPLOAD_LOCK_TIMEOUT = int(os.environ.get('UPLOAD_LOCK_TIMEOUT', 120))  # seconds
+UPLOAD_EXPIRY_HOURS = int(os.environ.get('UPLOAD_EXPIRY_HOURS', 24))  # python manage.py purge_uploads
 
 # EMAIL
 if DEBUG:
@@ -123,10 +236,67 @@ else:
     EMAIL_USE_TLS = True
     EMAIL_HOST_USER = os.environ['EMAIL_HOST_USER']
     EMAIL_HOST_PASSWORD = os.environ['EMAIL_HOST_PASSWORD']
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@elearning.local')
+CONTACT_EMAIL = os.environ.get('CONTACT_EMAIL', DEFAULT_FROM_EMAIL)
+
+# BACKGROUND JOBS (python manage.py run_jobs)
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_DELAY = int(os.environ.get('JOBS_RETRY_DELAY', 30))  # seconds, doubled on each retry
+JOBS_LOCK_TIMEOUT = int(os.environ.get('JOBS_LOCK_TIMEOUT', 600))  # reclaim jobs of crashed workers
 
 # THIRD-PARTY KEYS
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', '')  # e.g. a local stub server in tests/benchmarks
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SITE_ID = 1
+
+# LOGGING & METRICS (see elearning.metrics; Prometheus scrapes /metrics/)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1 if DEBUG else 0.01))  # share of requests keeping DEBUG records
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))  # logged at WARNING
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # bearer token for /metrics/; superusers only when empty
+# N+1 queries (see elearning.nplusone): 'strict' raises (forced by the test
+# runner), 'log' reports a NPLUSONE_SAMPLE_RATE share of requests (staging).
+NPLUSONE_MODE = os.environ.get('NPLUSONE_MODE', 'log' if DEBUG else 'off')
+NPLUSONE_SAMPLE_RATE = float(os.environ.get('NPLUSONE_SAMPLE_RATE', 1 if DEBUG else 0.1))
+NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 3))  # runs of the same SELECT in one request
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_sample': {'()': 'elearning.metrics.RequestSampleFilter'},
+    },
+    'formatters': {
+        'plain': {'format': '{asctime} {levelname} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'filters': ['request_sample'], 'formatter': 'plain'},
+    },
+    'loggers': {
+        app: {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False}
+        for app in ('elearning', 'accounts', 'enseignants', 'etudiant', 'jobs', 'uploads')
+    },
+}
+
+# CATALOGUE & ACCESS
+CATALOGUE_PAGE_SIZE = int(os.environ.get('CATALOGUE_PAGE_SIZE', 20))
+ENTITLEMENT_CACHE_TIMEOUT = int(os.environ.get('ENTITLEMENT_CACHE_TIMEOUT', 3600))
+SUBMISSIONS_PAGE_SIZE = int(os.environ.get('SUBMISSIONS_PAGE_SIZE', 50))
+
+# BULK GRADING (see enseignants.grading)
+GRADE_SHEET_MAX_SIZE = int(os.environ.get('GRADE_SHEET_MAX_SIZE', 5 * 1024 * 1024))
+GRADE_ERRORS_SHOWN = int(os.environ.get('GRADE_ERRORS_SHOWN', 20))
+
+# PDF PREVIEWS & TEXT (see uploads.pdfs, python manage.py process_pdfs)
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
+PDF_THUMBNAIL_WIDTH = int(os.environ.get('PDF_THUMBNAIL_WIDTH', 240))  # pixels
+PDF_TEXT_MAX_CHARS = int(os.environ.get('PDF_TEXT_MAX_CHARS', 100_000))  # per file
+PDF_PREVIEW_MAX_AGE = int(os.environ.get('PDF_PREVIEW_MAX_AGE', 24 * 3600))  # seconds
+
+# IMAGE VARIANTS (see uploads.images, python manage.py build_image_variants)
+IMAGE_WIDTHS = [int(width) for width in os.environ.get('IMAGE_WIDTHS', '160,320,640,1280').split(',')]
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 80))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', os.cpu_count() or 1))
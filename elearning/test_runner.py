@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class StrictTestRunner(DiscoverRunner):
+    """The default runner, with every test request checked for N+1 queries (see elearning.nplusone)."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_MODE = 'strict'
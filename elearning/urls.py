@@ -7,6 +7,7 @@ from .views import carriers,formations
 from django.urls import reverse_lazy
 from django.conf import settings
 from django.conf.urls.static import static
+from elearning.media import serve_public_media
 from . import views
 from .views import test_reset_confirm
 
@@ -23,8 +24,12 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(next_page=reverse_lazy('home')), name='logout'),
     path('enseignants/',include('enseignants.urls')),
     path('etudiant/',include('etudiant.urls')),
+    path('uploads/', include('uploads.urls')),
     path('formations/',formations, name='formations'),
+    path('formations/api/', views.formations_api, name='formations_api'),
     path('test-reset-confirm/', test_reset_confirm, name='test_reset_confirm'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Public images only: course files, submissions and CVs go through their views.
+    urlpatterns += static(settings.MEDIA_URL, view=serve_public_media, document_root=settings.MEDIA_ROOT)
@@ -1,19 +1,37 @@
 from django.shortcuts import render,redirect
 from enseignants.models import Formation,UserProfile
-from enseignants.forms import ProfilePictureForm
+from enseignants.forms import ProfilePictureForm, CatalogueFilterForm
+from enseignants.catalogue import attach_previews, filter_catalogue, catalogue_page
+from etudiant.entitlements import formation_ids
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.core.mail import send_mail
+from jobs.queue import enqueue
+from jobs.tasks import send_mail
 from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from elearning.caching import cache_anonymous_page
+from elearning import metrics as request_metrics
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+import hmac
 
 
 def test_reset_confirm(request):
     return render(request, 'registration/password_reset_confirm.html', {'validlink': True})
+@cache_anonymous_page(settings.CATALOGUE_CACHE_TIMEOUT)
 def carriers(request):
-    formations = Formation.objects.all()
-    return render(request, 'carriers.html', {'formations': formations})
+    form = CatalogueFilterForm(request.GET)
+    form.is_valid()
+    formations, next_cursor = catalogue_page(Formation.objects.select_related('teacher'),
+                                             after=form.cleaned_data.get('after'))
+    return render(request, 'carriers.html', {
+        'formations': formations,
+        'next_query': urlencode({'after': next_cursor}) if next_cursor else None,
+    })
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 
@@ -22,8 +40,52 @@ def formations(request):
     if hasattr(request.user, 'is_teacher') and request.user.is_teacher and not request.user.is_superuser:
         # Redirect teachers to the enseignants formations view
         return redirect('enseignants:formations')
-    formations = Formation.objects.all()
-    return render(request, 'formations.html', {'formations': formations})
+    form = CatalogueFilterForm(request.GET)
+    form.is_valid()
+    formations, next_cursor = catalogue_page(
+        filter_catalogue(Formation.objects.select_related('teacher'), **form.filters()).prefetch_related('courses'),
+        after=form.cleaned_data.get('after'),
+    )
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_query = params.urlencode()
+    return render(request, 'formations.html', {
+        'formations': attach_previews(formations),
+        'purchased_formations': formation_ids(request.user),
+        'filter_form': form,
+        'next_query': next_query,
+    })
+
+
+def formations_api(request):
+    """JSON catalogue: one keyset page of formations matching the filters."""
+    form = CatalogueFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    formations, next_cursor = catalogue_page(
+        filter_catalogue(Formation.objects.select_related('teacher'), **form.filters()),
+        after=form.cleaned_data.get('after'),
+    )
+    return JsonResponse({
+        'results': [
+            {
+                'id': formation.id,
+                'titre': formation.titre,
+                'description': formation.description,
+                'prix': str(formation.prix),
+                'teacher': {
+                    'id': formation.teacher_id,
+                    'name': formation.teacher.get_full_name(),
+                },
+                'created_at': formation.created_at.isoformat(),
+                'url': reverse('etudiant:formation_detail', args=[formation.id]),
+            }
+            for formation in formations
+        ],
+        'next': next_cursor,
+    })
 @login_required
 def profile_view(request):
     # Get or create the user's profile
@@ -72,15 +134,15 @@ def contact(request):
             """
             
             try:
-                # Send email to admin
-                send_mail(
-                    email_subject,
-                    email_message,
-                    settings.DEFAULT_FROM_EMAIL,  # From email (set in settings.py)
-                    [settings.CONTACT_EMAIL],  # To email (set in settings.py)
-                    fail_silently=False,
+                # Queue the email to admin; the job worker sends it
+                enqueue(
+                    send_mail,
+                    subject=email_subject,
+                    message=email_message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[settings.CONTACT_EMAIL],
                 )
-                
+
                 # Success message
                 messages.success(request, "Votre message a été envoyé avec succès. Nous vous répondrons dans les plus brefs délais.")
                 return redirect('contact')
@@ -92,4 +154,13 @@ def contact(request):
             messages.error(request, "Veuillez remplir tous les champs obligatoires.")
     
     # Display the contact form (GET request or form submission failed)
-    return render(request, 'contact.html')
\ No newline at end of file
+    return render(request, 'contact.html')
+
+
+def metrics(request):
+    """Prometheus scrape endpoint: needs ``Authorization: Bearer <METRICS_TOKEN>`` or a superuser."""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not ((settings.METRICS_TOKEN and hmac.compare_digest(token, settings.METRICS_TOKEN))
+            or request.user.is_superuser):
+        raise PermissionDenied
+    return HttpResponse(request_metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,78 @@
+"""ZIP archives streamed while they are built.
+
+``stream_zip()`` writes the archive with ``zipfile`` into an unseekable
+``Sink`` and yields whatever was written after each ``CHUNK_SIZE`` read,
+so the archive is never staged on disk and memory stays at about one
+chunk per download, whatever the number and size of the files. As the
+output cannot be rewound, every entry is followed by a data descriptor
+holding its CRC and sizes; ZIP64 is used for the entries that need it.
+
+Files already compressed (PDF, images, Office documents, archives) are
+``STORED``: deflating them again costs CPU for almost no gain. The rest
+is ``DEFLATED``.
+"""
+import logging
+import os
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+STORED_EXTENSIONS = {
+    '.pdf', '.zip', '.gz', '.bz2', '.xz', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4',
+}
+
+
+class Sink:
+    """Write-only file object keeping what ``zipfile`` writes until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def compress_type(name):
+    return zipfile.ZIP_STORED if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries):
+    """Yield the bytes of a ZIP archive of ``entries``, ``(name in the archive, path)`` pairs.
+
+    Files that cannot be read are left out (and logged), since the
+    response has already started when they are reached.
+    """
+    sink = Sink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, path in entries:
+            try:
+                source = open(path, 'rb')
+            except OSError as error:
+                logger.warning("Left %s out of a ZIP download: %s", path, error)
+                continue
+            with source:
+                stat = os.fstat(source.fileno())
+                info = zipfile.ZipInfo(name, time.localtime(max(stat.st_mtime, 315532800))[:6])  # 1980 at least
+                info.file_size = stat.st_size  # decides on ZIP64 before the header is written
+                info.compress_type = compress_type(name)
+                info.external_attr = 0o644 << 16
+                with archive.open(info, 'w') as target:
+                    while chunk := source.read(CHUNK_SIZE):
+                        target.write(chunk)
+                        if sink.chunks:
+                            yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db.models import Prefetch, Q
+
+from etudiant.models import Submission
+from uploads.models import PdfInfo
+from uploads.storage import digest_of
+from .models import Formation, Course
+from .search import search_catalogue, terms
+
+COURSE_FILES = {'td': 'td_file', 'tp': 'tp_file', 'correction': 'correction'}
+PREVIEW_FILES = ('td', 'tp')  # corrections are never shown before they are opened
+
+
+def course_digest(course, kind):
+    fieldfile = getattr(course, COURSE_FILES[kind])
+    return digest_of(fieldfile.name) if fieldfile else None
+
+
+def formations_for(user):
+    """Base queryset of the formations ``user`` may manage or browse."""
+    formations = Formation.objects.select_related('teacher')
+    if user.is_teacher and not user.is_superuser:
+        formations = formations.filter(teacher=user)
+    return formations
+
+
+def load_formations(user, with_submissions=False):
+    """Load the formations page for ``user`` in a fixed number of queries.
+
+    Courses are prefetched in one query. When ``with_submissions`` is set the
+    submissions of every course (with their students) are fetched in one
+    more query, newest first, as ``course.submissions_for_teacher``. The
+    query count does not depend on the catalogue size.
+    """
+    courses = Course.objects.all()
+    if with_submissions:
+        courses = courses.prefetch_related(
+            Prefetch(
+                'etudiant_submissions',
+                queryset=Submission.objects.select_related('student').order_by('-submitted_at'),
+                to_attr='submissions_for_teacher',
+            ),
+        )
+    return list(formations_for(user).prefetch_related(Prefetch('courses', queryset=courses)))
+
+
+def filter_catalogue(formations, q='', min_price=None, max_price=None, teacher=None):
+    """Narrow ``formations`` with the catalogue search filters."""
+    if terms(q):
+        formations = search_catalogue(formations, q)
+    if min_price is not None:
+        formations = formations.filter(prix__gte=min_price)
+    if max_price is not None:
+        formations = formations.filter(prix__lte=max_price)
+    if teacher:
+        formations = formations.filter(teacher_id=teacher)
+    return formations
+
+
+def parse_cursor(value):
+    """The cursor of a catalogue page from its query string form, or ``None`` if malformed.
+
+    Plain catalogue cursors are a formation id; search results carry the
+    rank of the last formation too, as ``"<rank>:<id>"``.
+    """
+    rank, _, pk = str(value).rpartition(':')
+    try:
+        pk = int(pk)
+        rank = float(rank) if rank else None
+    except ValueError:
+        return None
+    if pk < 1:
+        return None
+    return pk if rank is None else (rank, pk)
+
+
+def catalogue_page(formations, after=None, size=None):
+    """Return one keyset page of ``formations``, newest first.
+
+    ``after`` is the cursor returned with the previous page (the id of its
+    last formation). Pages are fetched with ``id < after`` rather than an
+    OFFSET, so every page costs the same however deep the client goes.
+    Search results (annotated by ``search_catalogue``) come best match
+    first and are paged on ``(search_rank, id)`` instead, with a
+    ``(rank, id)`` cursor (see ``parse_cursor``).
+    Returns ``(formations, next_cursor)``; the cursor is ``None`` on the
+    last page.
+    """
+    size = size or settings.CATALOGUE_PAGE_SIZE
+    ranked = 'search_rank' in formations.query.annotations
+    if ranked:
+        formations = formations.order_by('search_rank', '-pk')
+        if isinstance(after, tuple):
+            rank, pk = after
+            formations = formations.filter(Q(search_rank__gt=rank) | Q(search_rank=rank, pk__lt=pk))
+    else:
+        formations = formations.order_by('-pk')
+        if after:
+            formations = formations.filter(pk__lt=after[1] if isinstance(after, tuple) else after)
+    page = list(formations[:size + 1])
+    if len(page) > size:
+        page = page[:size]
+        last = page[-1]
+        return page, f'{last.search_rank!r}:{last.pk}' if ranked else last.pk
+    return page, None
+
+
+def attach_previews(formations):
+    """Set ``course.previews``, ``{kind: page count}`` of the TD/TP PDFs with a thumbnail.
+
+    Courses must be prefetched; the page counts are read in one query
+    (thumbnails are served by ``course_preview``).
+    """
+    courses = [course for formation in formations for course in formation.courses.all()]
+    digests = {(course.pk, kind): course_digest(course, kind) for course in courses for kind in PREVIEW_FILES}
+    pages = {}
+    if any(digests.values()):
+        pages = dict(PdfInfo.objects.filter(blob_id__in={digest for digest in digests.values() if digest},
+                                            status=PdfInfo.DONE).exclude(thumbnail=b'')
+                     .values_list('blob_id', 'pages'))
+    for course in courses:
+        course.previews = {kind: pages[digests[course.pk, kind]] for kind in PREVIEW_FILES
+                           if digests[course.pk, kind] in pages}
+    return formations
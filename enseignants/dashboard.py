@@ -0,0 +1,134 @@
+"""Summary tables behind the teacher dashboard.
+
+``FormationStats``, ``CourseStats`` and ``EnrollmentDay`` hold counters,
+so the dashboard reads one row per formation, course or day instead of
+scanning purchases and submissions. They are adjusted in place (``F()``
+updates) by the ``Purchase``, ``Enrollment`` and ``Submission`` signal
+handlers in ``enseignants.signals``, and by the code paths that write
+those tables without signals (``payments.fulfil``, grading).
+
+Counters can drift (rows changed with ``QuerySet.update()`` elsewhere, a
+crash between two writes): ``manage.py rebuild_dashboard_stats``, run
+nightly, recomputes every row from the source tables.
+
+Revenue is ``paid_purchases * prix``: purchases do not record the
+amount paid.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncWeek
+from django.utils import timezone
+
+from accounts.models import Purchase
+from elearning import counters
+from etudiant.models import Enrollment, Submission
+from .catalogue import formations_for
+from .models import Course, CourseStats, EnrollmentDay, FormationStats
+
+HISTORY_WEEKS = 12
+
+
+def is_ungraded(grade):
+    return grade is None or grade == ''
+
+
+def count_purchases(formation_id, purchases=0, paid=0):
+    counters.add(FormationStats, {'formation_id': formation_id}, create=purchases >= 0 and paid >= 0,
+                 purchases=purchases, paid_purchases=paid)
+
+
+def count_enrollments(enrollments, sign=1):
+    """Count (``sign=-1``: uncount) ``enrollments`` on the day each was created."""
+    days = Counter(
+        (enrollment.formation_id, timezone.localdate(enrollment.created_at))
+        for enrollment in enrollments if enrollment.formation_id
+    )
+    for (formation_id, day), count in days.items():
+        counters.add(EnrollmentDay, {'formation_id': formation_id, 'day': day}, create=sign > 0,
+                     enrollments=sign * count)
+
+
+def count_submissions(course_id, submissions=0, submitters=0, ungraded=0):
+    counters.add(CourseStats, {'course_id': course_id}, create=submissions >= 0,
+                 submissions=submissions, submitters=submitters, ungraded=ungraded)
+
+
+def count_regrading(course_id, old_grades, new_grades):
+    """Adjust the ungraded backlog of a course after its grades changed from ``old_grades`` to ``new_grades``."""
+    delta = sum(map(is_ungraded, new_grades)) - sum(map(is_ungraded, old_grades))
+    count_submissions(course_id, ungraded=delta)
+
+
+def summary(user):
+    """Everything the dashboard of ``user`` shows, read from the summary tables only."""
+    students = Coalesce(F('stats__paid_purchases'), 0)
+    formation_ids = formations_for(user).values('pk')
+    formations = list(
+        formations_for(user).order_by('-pk').annotate(
+            sales=Coalesce(F('stats__purchases'), 0),
+            students=students,
+            revenue=ExpressionWrapper(students * F('prix'), output_field=DecimalField()),
+            ungraded=Coalesce(Sum('courses__stats__ungraded'), 0),
+        )
+    )
+    courses = list(
+        Course.objects.filter(formation__in=formation_ids)
+        .select_related('formation').order_by('formation', 'pk')
+        .annotate(
+            submissions=Coalesce(F('stats__submissions'), 0),
+            submitters=Coalesce(F('stats__submitters'), 0),
+            ungraded=Coalesce(F('stats__ungraded'), 0),
+            students=Coalesce(F('formation__stats__paid_purchases'), 0),
+        )
+    )
+    for course in courses:
+        course.submission_rate = round(100 * course.submitters / course.students) if course.students else None
+    since = timezone.localdate() - timedelta(weeks=HISTORY_WEEKS)
+    weeks = list(
+        EnrollmentDay.objects.filter(formation__in=formation_ids, day__gte=since)
+        .annotate(week=TruncWeek('day')).values('week').order_by('week')
+        .annotate(enrollments=Sum('enrollments'))
+    )
+    peak = max((week['enrollments'] for week in weeks), default=0)
+    for week in weeks:
+        week['share'] = round(100 * week['enrollments'] / peak) if peak else 0
+    return {
+        'formations': formations,
+        'courses': courses,
+        'weeks': weeks,
+        'total_revenue': sum(formation.revenue for formation in formations),
+        'total_students': sum(formation.students for formation in formations),
+        'total_ungraded': sum(course.ungraded for course in courses),
+    }
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute every summary row from the source tables; return the number of rows written."""
+    FormationStats.objects.all().delete()
+    FormationStats.objects.bulk_create([
+        FormationStats(formation_id=row['formation'], purchases=row['purchases'], paid_purchases=row['paid'])
+        for row in Purchase.objects.values('formation').order_by()
+        .annotate(purchases=Count('pk'), paid=Count('pk', filter=Q(is_paid=True)))
+    ], batch_size=2000)
+
+    EnrollmentDay.objects.all().delete()
+    EnrollmentDay.objects.bulk_create([
+        EnrollmentDay(formation_id=row['formation'], day=row['day'], enrollments=row['enrollments'])
+        for row in Enrollment.objects.filter(formation__isnull=False)
+        .annotate(day=TruncDate('created_at')).values('formation', 'day').order_by()
+        .annotate(enrollments=Count('pk'))
+    ], batch_size=2000)
+
+    CourseStats.objects.all().delete()
+    CourseStats.objects.bulk_create([
+        CourseStats(course_id=row['course'], submissions=row['submissions'],
+                    submitters=row['submitters'], ungraded=row['ungraded'])
+        for row in Submission.objects.values('course').order_by()
+        .annotate(submissions=Count('pk'), submitters=Count('student', distinct=True),
+                  ungraded=Count('pk', filter=Q(grade__isnull=True) | Q(grade='')))
+    ], batch_size=2000)
+    return FormationStats.objects.count() + EnrollmentDay.objects.count() + CourseStats.objects.count()
@@ -1,4 +1,7 @@
 from django import forms
+from uploads.forms import UploadChoiceField
+from uploads.models import Upload
+from .catalogue import parse_cursor
 from .models import Formation, Course,UserProfile
 
 class FormationForm(forms.ModelForm):
@@ -9,6 +12,13 @@ class FormationForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 4}),
         }
 class CourseForm(forms.ModelForm):
+    FILE_FIELDS = ('td_file', 'tp_file', 'correction')
+
+    # Ids of chunked uploads (see uploads.chunks), used instead of the file inputs
+    td_file_upload = UploadChoiceField(Upload.COURSE)
+    tp_file_upload = UploadChoiceField(Upload.COURSE)
+    correction_upload = UploadChoiceField(Upload.COURSE)
+
     class Meta:
         model = Course
         fields = ['titre', 'td_file', 'tp_file', 'correction']
@@ -17,7 +27,45 @@ class CourseForm(forms.ModelForm):
             'tp_file': 'Fichier TP',
             'correction': 'Correction'
         }
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            for name in self.FILE_FIELDS:
+                self.fields[f'{name}_upload'].limit_to(user)
+
+    def save(self, commit=True):
+        course = super().save(commit=False)
+        for name in self.FILE_FIELDS:
+            upload = self.cleaned_data.get(f'{name}_upload')
+            if upload:
+                upload.attach(course, name)
+        if commit:
+            course.save()
+        return course
 class ProfilePictureForm(forms.ModelForm):
     class Meta:
         model = UserProfile
-        fields = ['profile_picture']
\ No newline at end of file
+        fields = ['profile_picture']
+
+class CatalogueFilterForm(forms.Form):
+    q = forms.CharField(required=False, max_length=200)
+    min_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    teacher = forms.IntegerField(required=False, min_value=1)
+    after = forms.CharField(required=False, max_length=64)
+
+    def clean_after(self):
+        value = self.cleaned_data['after']
+        if not value:
+            return None
+        cursor = parse_cursor(value)
+        if cursor is None:
+            raise forms.ValidationError("Curseur de pagination invalide.")
+        return cursor
+
+    def filters(self):
+        """Cleaned filter values, skipping any field that failed validation."""
+        data = getattr(self, 'cleaned_data', {})
+        return {name: data.get(name) for name in ('q', 'min_price', 'max_price', 'teacher')
+                if data.get(name) not in (None, '')}
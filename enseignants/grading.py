@@ -0,0 +1,132 @@
+"""Bulk grading: a whole grade sheet applied in one transaction.
+
+Grades come from the grid of ``view_submissions`` (one ``grade-<pk>``
+field per submission of the page) or from an uploaded CSV sheet with
+``submission`` and ``grade`` columns, the format ``grade_sheet``
+downloads. Comma, semicolon and tab separated sheets are accepted.
+
+Every row is checked first, against the grades of the course read in
+one query. A sheet with errors changes nothing and every error is
+reported with its line. A valid sheet only writes the grades that
+changed, in one transaction and batches of ``BATCH_SIZE`` rows (see
+``write()``): 10,000 rows take a few dozen queries and well under a
+second.
+"""
+import csv
+import io
+from collections import defaultdict
+from math import ceil
+
+from django.conf import settings
+from django.db import transaction
+
+from accounts.exports import Echo
+from etudiant.models import Submission
+from . import dashboard
+
+BATCH_SIZE = 500
+GRADE_MAX_LENGTH = Submission._meta.get_field('grade').max_length
+SHEET_HEADER = ['submission', 'email', 'student', 'submitted_at', 'grade']
+
+
+class SheetError(ValueError):
+    """The uploaded file cannot be read as a grade sheet."""
+
+
+def stream_sheet(course):
+    """The CSV grade sheet of ``course``, one line per submission, newest first."""
+    writer = csv.writer(Echo())
+    yield '\ufeff'  # To handle accents correctly in Excel
+    yield writer.writerow(SHEET_HEADER)
+    submissions = (Submission.objects.filter(course=course).select_related('student')
+                   .order_by('-submitted_at', '-pk'))
+    for submission in submissions.iterator(chunk_size=2000):
+        student = submission.student
+        yield writer.writerow([
+            submission.pk, student.email, student.get_full_name().strip(),
+            submission.submitted_at.strftime('%Y-%m-%d %H:%M'), submission.grade or '',
+        ])
+
+
+def read_sheet(file):
+    """``[(line, submission, grade)]`` from an uploaded CSV sheet."""
+    if file.size > settings.GRADE_SHEET_MAX_SIZE:
+        raise SheetError(f"Le fichier dépasse {settings.GRADE_SHEET_MAX_SIZE // (1024 * 1024)} Mo.")
+    try:
+        text = file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise SheetError("Le fichier doit être un CSV encodé en UTF-8.")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    columns = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+    if 'submission' not in columns or 'grade' not in columns:
+        raise SheetError("Le fichier doit avoir les colonnes « submission » et « grade ».")
+    return [
+        (reader.line_num, row[columns['submission']], row[columns['grade']])
+        for row in reader
+    ]
+
+
+def grid_rows(data):
+    """``[(None, submission, grade)]`` from the ``grade-<pk>`` fields of the submissions grid."""
+    return [(None, name[len('grade-'):], value) for name, value in data.items() if name.startswith('grade-')]
+
+
+def apply(course, rows):
+    """Check ``rows`` and write their grades to the submissions of ``course``.
+
+    Returns ``(updated, errors)``: the number of grades changed and one
+    message per invalid row. Nothing is written when there are errors.
+    """
+    current = dict(Submission.objects.filter(course=course).values_list('pk', 'grade'))
+    grades, errors = {}, []
+    for line, submission, grade in rows:
+        where = f"Ligne {line}" if line else f"Soumission {submission}"
+        grade = (grade or '').strip()
+        try:
+            pk = int(submission)
+        except (TypeError, ValueError):
+            errors.append(f"{where} : identifiant de soumission invalide « {submission or ''} »")
+            continue
+        if pk not in current:
+            errors.append(f"{where} : la soumission {pk} n'appartient pas à ce cours")
+        elif pk in grades:
+            errors.append(f"{where} : la soumission {pk} apparaît plusieurs fois")
+        elif len(grade) > GRADE_MAX_LENGTH:
+            errors.append(f"{where} : note trop longue ({GRADE_MAX_LENGTH} caractères au plus)")
+        else:
+            grades[pk] = grade or None
+    if errors:
+        return 0, errors
+
+    changed = {pk: grade for pk, grade in grades.items() if grade != (current[pk] or None)}
+    with transaction.atomic():
+        write(changed)
+        # No signals were sent: update the dashboard counters here
+        dashboard.count_regrading(course.pk, [current[pk] for pk in changed], changed.values())
+    return len(changed), []
+
+
+def write(grades):
+    """Save ``{submission pk: grade}`` in batches of ``BATCH_SIZE`` rows.
+
+    Sheets hold few distinct grades, so the rows are grouped by grade and
+    each group saved with ``UPDATE ... WHERE id IN (...)``. ``bulk_update()``,
+    which builds one ``CASE`` branch per row (several times slower for
+    10,000 rows), is kept for sheets varied enough to need fewer queries
+    that way.
+    """
+    by_grade = defaultdict(list)
+    for pk, grade in grades.items():
+        by_grade[grade].append(pk)
+    grouped = sum(ceil(len(pks) / BATCH_SIZE) for pks in by_grade.values())
+    if grouped > 2 * ceil(len(grades) / BATCH_SIZE):
+        Submission.objects.bulk_update([Submission(pk=pk, grade=grade) for pk, grade in grades.items()],
+                                       ['grade'], batch_size=BATCH_SIZE)
+        return
+    for grade, pks in by_grade.items():
+        for start in range(0, len(pks), BATCH_SIZE):
+            Submission.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).update(grade=grade)
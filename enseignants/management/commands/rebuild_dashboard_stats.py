@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from enseignants.dashboard import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the teacher dashboard summary tables from purchases, enrollments and submissions (run nightly)."
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} summary row(s) rebuilt."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from enseignants.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text index of the formation catalogue."
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"{count} formations indexed."))
@@ -0,0 +1,61 @@
+import unicodedata
+
+from django.db import migrations
+
+TABLE = 'enseignants_formation_search'
+
+CREATE = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "titre, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    ],
+    'postgresql': [
+        f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+        "formation_id bigint PRIMARY KEY REFERENCES enseignants_formation (id) ON DELETE CASCADE "
+        "DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)",
+        f"CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING gin (document)",
+    ],
+}
+
+# Frozen copies of enseignants.search as of this migration: later changes
+# to the live module must not change what it does. ``manage.py
+# rebuild_search_index`` reindexes with the current code.
+INSERT = {
+    'sqlite': f"INSERT INTO {TABLE} (rowid, titre, body) VALUES (%s, %s, %s)",
+    'postgresql': f"INSERT INTO {TABLE} (formation_id, document) VALUES "
+                  "(%s, setweight(to_tsvector('french', %s), 'A') || setweight(to_tsvector('french', %s), 'B')) "
+                  "ON CONFLICT (formation_id) DO NOTHING",
+}
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def create_index(apps, schema_editor):
+    for statement in CREATE.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+    if schema_editor.connection.vendor in CREATE:
+        insert = INSERT[schema_editor.connection.vendor]
+        Formation = apps.get_model('enseignants', 'Formation')
+        with schema_editor.connection.cursor() as cursor:
+            for formation in Formation.objects.prefetch_related('courses'):
+                body = ' '.join([formation.description, *(course.titre for course in formation.courses.all())])
+                cursor.execute(insert, [formation.pk, fold(formation.titre), fold(body)])
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enseignants', '0002_userprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enseignants', '0003_formation_search'),
+        ('etudiant', '0003_merge_submissions'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='AssignmentSubmission',
+        ),
+    ]
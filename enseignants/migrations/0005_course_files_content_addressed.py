@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+import django.core.validators
+import uploads.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enseignants', '0004_delete_assignmentsubmission'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='correction',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=uploads.storage.content_addressed_storage, upload_to='courses/corrections/', validators=[django.core.validators.FileExtensionValidator(['pdf'])]),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='td_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=uploads.storage.content_addressed_storage, upload_to='courses/td/', validators=[django.core.validators.FileExtensionValidator(['pdf'])]),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='tp_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=uploads.storage.content_addressed_storage, upload_to='courses/tp/', validators=[django.core.validators.FileExtensionValidator(['pdf'])]),
+        ),
+    ]
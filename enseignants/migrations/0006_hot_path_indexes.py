@@ -0,0 +1,55 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_enrollments(apps, schema_editor):
+    """Keep the oldest enrollment of each (student, formation) pair."""
+    Enrollment = apps.get_model('enseignants', 'Enrollment')
+    duplicates = list(
+        Enrollment.objects.values('student_id', 'formation_id')
+        .annotate(keep=Min('id'), rows=Count('id')).filter(rows__gt=1)
+    )
+    for group in duplicates:
+        Enrollment.objects.filter(
+            student_id=group['student_id'], formation_id=group['formation_id'],
+        ).exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enseignants', '0005_course_files_content_addressed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # New indexes are created before the single-column FK indexes they
+    # replace are dropped, and duplicates are removed before the constraint.
+    operations = [
+        migrations.AddIndex(
+            model_name='formation',
+            index=models.Index(fields=['teacher', '-id'], name='formation_teacher_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='formation',
+            index=models.Index(fields=['is_approved', '-created_at'], name='formation_approved_recent_idx'),
+        ),
+        migrations.RunPython(dedupe_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student', 'formation'), name='unique_enseignants_enrollment'),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='formation',
+            name='teacher',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='formations', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enseignants', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='enseignants.course')),
+                ('submissions', models.IntegerField(default=0)),
+                ('submitters', models.IntegerField(default=0)),
+                ('ungraded', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FormationStats',
+            fields=[
+                ('formation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='enseignants.formation')),
+                ('purchases', models.IntegerField(default=0)),
+                ('paid_purchases', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EnrollmentDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('enrollments', models.IntegerField(default=0)),
+                ('formation', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_days', to='enseignants.formation')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('formation', 'day'), name='unique_enrollment_day')],
+            },
+        ),
+    ]
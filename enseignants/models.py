@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
+from uploads.storage import content_addressed_storage
 
 class EnseignantProfile(models.Model):
     user = models.OneToOneField(
@@ -41,11 +42,19 @@ class Formation(models.Model):
     teacher = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='formations'
+        related_name='formations',
+        db_index=False,  # formation_teacher_recent_idx starts with teacher
     )
     is_approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A teacher's formations, newest first (catalogue order)
+            models.Index(fields=['teacher', '-id'], name='formation_teacher_recent_idx'),
+            models.Index(fields=['is_approved', '-created_at'], name='formation_approved_recent_idx'),
+        ]
+
     def __str__(self):
         return self.titre
 
@@ -59,16 +68,19 @@ class Course(models.Model):
     titre = models.CharField(max_length=200)
     td_file = models.FileField(
         upload_to='courses/td/',
+        storage=content_addressed_storage, max_length=255,
         null=True, blank=True,
         validators=[FileExtensionValidator(['pdf'])]
     )
     tp_file = models.FileField(
         upload_to='courses/tp/',
+        storage=content_addressed_storage, max_length=255,
         null=True, blank=True,
         validators=[FileExtensionValidator(['pdf'])]
     )
     correction = models.FileField(
         upload_to='courses/corrections/',
+        storage=content_addressed_storage, max_length=255,
         null=True, blank=True,
         validators=[FileExtensionValidator(['pdf'])]
     )
@@ -82,7 +94,8 @@ class Enrollment(models.Model):
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='enrollments'
+        related_name='enrollments',
+        db_index=False,  # covered by unique_enseignants_enrollment
     )
     formation = models.ForeignKey(
         Formation,
@@ -91,24 +104,46 @@ class Enrollment(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'formation'], name='unique_enseignants_enrollment'),
+        ]
+
     def __str__(self):
         return f"{self.student.get_full_name()} enrolled in {self.formation.titre}"
-class AssignmentSubmission(models.Model):
-    course = models.ForeignKey(
-        Course,
-        on_delete=models.CASCADE,
-        related_name='assignment_submissions'  # changed from 'submissions'
-    )
-    student = models.ForeignKey(
-        settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE,
-        related_name='assignment_submissions'  # changed from 'submissions'
-    )
-    file = models.FileField(
-        upload_to='assignments/',
-        validators=[FileExtensionValidator(['pdf'])],
-    )
-    submitted_at = models.DateTimeField(auto_now_add=True)
+
+
+# Teacher dashboard summary tables, kept up to date by enseignants.dashboard
+# and rebuilt nightly by manage.py rebuild_dashboard_stats.
+
+class FormationStats(models.Model):
+    formation = models.OneToOneField(Formation, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    purchases = models.IntegerField(default=0)
+    paid_purchases = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats of formation {self.formation_id}"
+
+
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    submissions = models.IntegerField(default=0)
+    submitters = models.IntegerField(default=0)  # distinct students
+    ungraded = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats of course {self.course_id}"
+
+
+class EnrollmentDay(models.Model):
+    formation = models.ForeignKey(Formation, on_delete=models.CASCADE, related_name='enrollment_days', db_index=False)
+    day = models.DateField()
+    enrollments = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['formation', 'day'], name='unique_enrollment_day'),
+        ]
 
     def __str__(self):
-        return f"{self.student.get_full_name()} - {self.course.titre}"
+        return f"{self.enrollments} enrollment(s) in formation {self.formation_id} on {self.day}"
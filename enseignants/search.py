@@ -0,0 +1,202 @@
+"""Full-text search over the formation catalogue.
+
+Each formation has one document in ``enseignants_formation_search`` built
+from its title (weighted highest), its description, the titles of its
+courses and the text of their TD and TP PDFs (extracted by
+``manage.py process_pdfs``, see ``uploads.pdfs``). The table is an FTS5 virtual table on SQLite and a tsvector table
+with a GIN index on PostgreSQL; both are created by migration 0003 and
+kept up to date by the signal handlers in ``enseignants.signals``. Without
+a backend the PDF text is not searched.
+
+Text is accent-folded before indexing and querying so "général" matches
+"generale", and every query term is matched as a prefix.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from uploads.models import PdfInfo
+from uploads.storage import digest_of
+from .models import Formation
+
+TABLE = 'enseignants_formation_search'
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+INDEXED_FILES = ('td_file', 'tp_file')  # corrections stay out of the catalogue
+CHUNK_SIZE = 500
+FORMATION_ID = f'"{Formation._meta.db_table}"."id"'  # correlates the rank subquery
+NO_RANK = Value(0.0, output_field=FloatField())
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text):
+    """Lower-case ``text`` and strip diacritics (é -> e, ç -> c)."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def terms(query):
+    """Split a user query into folded search terms."""
+    return _WORD_RE.findall(fold(query))
+
+
+def document(titre, description, course_titles, file_texts=()):
+    """The folded ``(title, body)`` text indexed for one formation."""
+    return fold(titre), fold(' '.join([description, *course_titles, *file_texts]))
+
+
+def course_digests(course):
+    """SHA-256 of the stored TD/TP files of ``course``."""
+    digests = (digest_of(getattr(course, name).name) for name in INDEXED_FILES if getattr(course, name))
+    return [digest for digest in digests if digest]
+
+
+def pdf_texts(courses):
+    """``{digest: text}`` of the TD/TP PDFs of ``courses`` read so far, in one query."""
+    digests = {digest for course in courses for digest in course_digests(course)}
+    if not digests:
+        return {}
+    return dict(PdfInfo.objects.filter(blob_id__in=digests, status=PdfInfo.DONE)
+                .exclude(text='').values_list('blob_id', 'text'))
+
+
+def formation_document(formation, courses, texts):
+    return document(formation.titre, formation.description, [course.titre for course in courses],
+                    [texts[digest] for course in courses for digest in course_digests(course) if digest in texts])
+
+
+class SqliteBackend:
+    def index(self, cursor, pk, title, body):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [pk])
+        cursor.execute(f"INSERT INTO {TABLE} (rowid, titre, body) VALUES (%s, %s, %s)", [pk, title, body])
+
+    def remove(self, cursor, pk):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [pk])
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    def ranking(self, words):
+        match = ' '.join(f'"{word}"*' for word in words)
+        return (
+            f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s",
+            f"SELECT bm25({TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s AND rowid = {FORMATION_ID}",
+            [match],
+        )
+
+
+class PostgresBackend:
+    VECTOR = "setweight(to_tsvector('french', %s), 'A') || setweight(to_tsvector('french', %s), 'B')"
+
+    def index(self, cursor, pk, title, body):
+        cursor.execute(
+            f"INSERT INTO {TABLE} (formation_id, document) VALUES (%s, {self.VECTOR}) "
+            f"ON CONFLICT (formation_id) DO UPDATE SET document = EXCLUDED.document",
+            [pk, title, body],
+        )
+
+    def remove(self, cursor, pk):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE formation_id = %s", [pk])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TABLE}")
+
+    def ranking(self, words):
+        query = ' & '.join(f"{word}:*" for word in words)
+        return (
+            f"SELECT formation_id FROM {TABLE} WHERE document @@ to_tsquery('french', %s)",
+            # Negated: like bm25, lower is better.
+            f"SELECT -ts_rank(document, to_tsquery('french', %s)) FROM {TABLE} WHERE formation_id = {FORMATION_ID}",
+            [query],
+        )
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend():
+    """The index backend for the default database, or ``None`` if unsupported."""
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def index_formation(formation):
+    """(Re)index a single formation."""
+    backend = get_backend()
+    if backend is None:
+        return
+    courses = list(formation.courses.only('titre', *INDEXED_FILES))
+    title, body = formation_document(formation, courses, pdf_texts(courses))
+    with connection.cursor() as cursor:
+        backend.index(cursor, formation.pk, title, body)
+
+
+def remove_formation(pk):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.remove(cursor, pk)
+
+
+def rebuild_index():
+    """Drop every document and index the whole catalogue again."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        formations = Formation.objects.prefetch_related('courses').order_by('pk')
+        last = 0
+        # Keyset chunks: the PDF texts of a chunk are read in one query.
+        while chunk := list(formations.filter(pk__gt=last)[:CHUNK_SIZE]):
+            courses = {formation.pk: list(formation.courses.all()) for formation in chunk}
+            texts = pdf_texts([course for group in courses.values() for course in group])
+            for formation in chunk:
+                title, body = formation_document(formation, courses[formation.pk], texts)
+                backend.index(cursor, formation.pk, title, body)
+            count += len(chunk)
+            last = chunk[-1].pk
+    return count
+
+
+def search_catalogue(formations, query):
+    """Narrow ``formations`` to those matching ``query``.
+
+    Every term must match (as a prefix) the title, description or one of
+    the course titles. The formations are annotated with ``search_rank``,
+    lower for better matches (bm25 on SQLite, negated ``ts_rank`` on
+    PostgreSQL); order by it to get the best match first. Databases without
+    a search backend fall back to an ``icontains`` scan where every
+    formation has the same rank.
+    """
+    words = terms(query)
+    if not words:
+        return formations.none().annotate(search_rank=NO_RANK)
+    backend = get_backend()
+    if backend is None:
+        for word in words:
+            formations = formations.filter(
+                Q(titre__icontains=word) | Q(description__icontains=word) | Q(courses__titre__icontains=word)
+            )
+        return formations.annotate(search_rank=NO_RANK).distinct()
+    ids, rank, params = backend.ranking(words)
+    return formations.filter(pk__in=RawSQL(ids, params)).annotate(
+        search_rank=RawSQL(rank, params, output_field=FloatField()))
+
+
+def search_formations(query, limit=None):
+    """Ids of the formations matching ``query``, best match first (see ``search_catalogue``)."""
+    if not terms(query):
+        return []
+    ids = search_catalogue(Formation.objects.all(), query).order_by('search_rank', '-pk')
+    return list(ids.values_list('pk', flat=True)[:limit])
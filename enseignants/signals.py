@@ -0,0 +1,128 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User, Purchase
+from elearning import counters
+from elearning.caching import bump
+from etudiant.models import Enrollment, Submission
+from jobs.queue import enqueue
+from uploads import images
+from uploads.signals import pdfs_processed
+from uploads.tasks import make_image_variants
+from . import dashboard, search
+from .models import Formation, Course, UserProfile
+
+
+@receiver(post_save, sender=Formation)
+def index_formation(sender, instance, **kwargs):
+    search.index_formation(instance)
+
+
+@receiver(post_delete, sender=Formation)
+def unindex_formation(sender, instance, **kwargs):
+    search.remove_formation(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def reindex_course_formation(sender, instance, **kwargs):
+    formation = Formation.objects.filter(pk=instance.formation_id).first()
+    if formation is not None:
+        search.index_formation(formation)
+
+
+@receiver(pdfs_processed)
+def reindex_course_pdfs(sender, digests, **kwargs):
+    # Stored names hold the digest: courses/td/<sha256>/cours.pdf
+    matches = Q()
+    for digest in digests:
+        matches |= Q(td_file__contains=f'/{digest}/') | Q(tp_file__contains=f'/{digest}/')
+    formations = list(Formation.objects.filter(courses__in=Course.objects.filter(matches)).distinct())
+    for formation in formations:
+        search.index_formation(formation)
+    if formations:
+        bump('catalogue')  # cards show the previews
+
+
+@receiver(post_save, sender=Formation)
+@receiver(post_delete, sender=Formation)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_catalogue(sender, instance, **kwargs):
+    bump('catalogue')
+
+
+@receiver(post_save, sender=User)
+def invalidate_teacher_cards(sender, instance, **kwargs):
+    # Cards show the teacher's name and CV link.
+    if instance.is_teacher:
+        bump('catalogue')
+
+
+@receiver(post_save, sender=UserProfile)
+def resize_profile_picture(sender, instance, **kwargs):
+    name = instance.profile_picture.name
+    if name and name != UserProfile._meta.get_field('profile_picture').default and images.is_stale(name):
+        enqueue(make_image_variants, name=name)
+
+
+# Teacher dashboard counters (see enseignants.dashboard)
+
+@receiver(post_save, sender=Purchase)
+def count_purchase(sender, instance, created, **kwargs):
+    # _stored: set by accounts.signals.remember_purchase
+    was_paid = instance._stored['is_paid'] if instance._stored else None
+    if created:
+        dashboard.count_purchases(instance.formation_id, purchases=1, paid=int(instance.is_paid))
+    elif was_paid is not None and was_paid != instance.is_paid:
+        dashboard.count_purchases(instance.formation_id, paid=1 if instance.is_paid else -1)
+
+
+@receiver(post_delete, sender=Purchase)
+def uncount_purchase(sender, instance, **kwargs):
+    dashboard.count_purchases(instance.formation_id, purchases=-1, paid=-int(instance.is_paid))
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    if created:
+        dashboard.count_enrollments([instance])
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    dashboard.count_enrollments([instance], sign=-1)
+
+
+def has_other_submission(instance):
+    return Submission.objects.filter(
+        student_id=instance.student_id, course_id=instance.course_id).exclude(pk=instance.pk).exists()
+
+
+@receiver(pre_save, sender=Submission)
+def remember_grade(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'grade' in update_fields:
+        stored = counters.stored_values(instance, 'grade')
+        instance._stored_grade = stored['grade'] if stored else None
+
+
+@receiver(post_save, sender=Submission)
+def count_submission(sender, instance, created, **kwargs):
+    regraded = '_stored_grade' in instance.__dict__
+    stored_grade = instance.__dict__.pop('_stored_grade', None)
+    if created:
+        dashboard.count_submissions(
+            instance.course_id, submissions=1, submitters=int(not has_other_submission(instance)),
+            ungraded=int(dashboard.is_ungraded(instance.grade)),
+        )
+    elif regraded:
+        dashboard.count_regrading(instance.course_id, [stored_grade], [instance.grade])
+
+
+@receiver(post_delete, sender=Submission)
+def uncount_submission(sender, instance, **kwargs):
+    dashboard.count_submissions(
+        instance.course_id, submissions=-1, submitters=-int(not has_other_submission(instance)),
+        ungraded=-int(dashboard.is_ungraded(instance.grade)),
+    )
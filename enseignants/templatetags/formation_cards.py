@@ -0,0 +1,32 @@
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from elearning.caching import generation
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/formation_card.html'
+
+
+@register.simple_tag(takes_context=True)
+def shared_formation_card(context, formation):
+    """``{% shared_formation_card formation %}`` -- the card of a formation as every
+    student who has not bought it sees it, from the ``catalogue`` cache.
+
+    Cards are kept for ``CATALOGUE_CACHE_TIMEOUT`` seconds under the
+    catalogue generation (read once per page), so any catalogue change
+    rebuilds them.
+    """
+    if 'catalogue_generation' not in context.render_context:
+        context.render_context['catalogue_generation'] = generation('catalogue')
+    key = make_template_fragment_key('formation_card', [formation.pk, context.render_context['catalogue_generation']])
+    cache = caches['catalogue']
+    card = cache.get(key)
+    if card is None:
+        with context.push(formation=formation):
+            card = context.template.engine.get_template(CARD_TEMPLATE).render(context)
+        cache.set(key, card, settings.CATALOGUE_CACHE_TIMEOUT)
+    return mark_safe(card)
@@ -1,3 +1,526 @@
-from django.test import TestCase
+import os
+import tempfile
+import zipfile
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import Http404
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User, Purchase
+from etudiant.models import Enrollment, Submission
+from elearning import metrics, nplusone, zipstream
+from elearning.media import serve_public_media
+from elearning.caching import bump, generation
+from etudiant import payments
+from . import dashboard, grading, search
+from .models import Formation, Course, CourseStats, EnrollmentDay, FormationStats
+
+
+def make_catalogue(teacher, student, formations, courses):
+    for i in range(formations):
+        formation = Formation.objects.create(titre=f"Formation {i}", description="desc", prix=10, teacher=teacher)
+        for j in range(courses):
+            course = Course.objects.create(formation=formation, titre=f"Cours {i}.{j}")
+            Submission.objects.create(course=course, student=student, file='submissions/a.pdf')
+            Submission.objects.create(course=course, student=student, file='submissions/b.pdf')
+
+
+class FormationsQueryBudgetTests(TestCase):
+    # session, user, formations, courses, submissions,
+    # and the entitlement lookup (enrollments, purchases) on a cold cache
+    QUERY_BUDGET = 7
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        self.client.force_login(self.teacher)
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('enseignants:formations'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_query_count_does_not_grow_with_catalogue(self):
+        make_catalogue(self.teacher, self.student, formations=1, courses=1)
+        small = self.count_queries()
+        make_catalogue(self.teacher, self.student, formations=5, courses=4)
+        large = self.count_queries()
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.QUERY_BUDGET)
+
+    def test_submissions_are_attached_to_courses(self):
+        make_catalogue(self.teacher, self.student, formations=2, courses=2)
+        response = self.client.get(reverse('enseignants:formations'))
+        courses = [c for f in response.context['formations'] for c in f.courses.all()]
+        self.assertEqual(len(courses), 4)
+        for course in courses:
+            self.assertEqual(len(course.submissions_for_teacher), 2)
+
+
+@override_settings(CATALOGUE_PAGE_SIZE=3)
+class CatalogueApiTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.other = User.objects.create_user('autre@example.com', 'pw', is_teacher=True, first_name='A', last_name='T')
+        for i in range(7):
+            Formation.objects.create(titre=f"Python {i}", description="bases", prix=i * 10, teacher=self.teacher)
+        Formation.objects.create(titre="Java", description="objets", prix=50, teacher=self.other)
+
+    def get(self, **params):
+        response = self.client.get(reverse('formations_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_keyset_pages_cover_catalogue_once(self):
+        seen, after = [], None
+        while True:
+            page = self.get(**({'after': after} if after else {}))
+            self.assertLessEqual(len(page['results']), 3)
+            seen += [f['id'] for f in page['results']]
+            after = page['next']
+            if after is None:
+                break
+        self.assertEqual(sorted(seen, reverse=True), seen)
+        self.assertEqual(len(set(seen)), Formation.objects.count())
+
+    def test_carriers_pages_reach_every_formation(self):
+        seen, query = [], ''
+        while True:
+            response = self.client.get(f"{reverse('carriers')}?{query}")
+            seen += [formation.pk for formation in response.context['formations']]
+            query = response.context['next_query']
+            if not query:
+                break
+            self.assertContains(response, f'href="?{query}"')
+        self.assertEqual(seen, list(Formation.objects.order_by('-pk').values_list('pk', flat=True)))
+
+    def test_search_pages_best_match_first(self):
+        # Newest, but only matching in its description: ranked after every title match.
+        scripts = Formation.objects.create(titre="Scripts", description="Automatiser avec Python", prix=0,
+                                           teacher=self.teacher)
+        seen, after = [], None
+        while True:
+            page = self.get(q='python', **({'after': after} if after else {}))
+            seen += [f['id'] for f in page['results']]
+            after = page['next']
+            if after is None:
+                break
+        titles = list(Formation.objects.filter(titre__startswith="Python").order_by('-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, titles + [scripts.pk])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('formations_api'), {'q': 'python', 'after': 'x:1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters(self):
+        titles = [f['titre'] for f in self.get(q='java')['results']]
+        self.assertEqual(titles, ['Java'])
+        prices = [float(f['prix']) for f in self.get(min_price=20, max_price=40)['results']]
+        self.assertEqual(sorted(prices), [20, 30, 40])
+        page = self.get(teacher=self.other.id)
+        self.assertEqual([f['teacher']['id'] for f in page['results']], [self.other.id])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse('formations_api'), {'min_price': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.python = Formation.objects.create(titre="Programmation générale", description="Les bases", prix=0, teacher=self.teacher)
+        self.java = Formation.objects.create(titre="Java", description="Programmation objet", prix=0, teacher=self.teacher)
+
+    def test_accent_folding_and_prefix(self):
+        self.assertEqual(search.search_formations("generale"), [self.python.pk])
+        self.assertEqual(search.search_formations("GÉNÉR"), [self.python.pk])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(search.search_formations("programmation"), [self.python.pk, self.java.pk])
+
+    def test_index_follows_course_and_formation_changes(self):
+        course = Course.objects.create(formation=self.java, titre="Exceptions et généricité")
+        self.assertEqual(search.search_formations("genericite"), [self.java.pk])
+        course.delete()
+        self.assertEqual(search.search_formations("genericite"), [])
+        self.java.delete()
+        self.assertEqual(search.search_formations("java"), [])
+
+    def test_rebuild(self):
+        self.assertEqual(search.rebuild_index(), 2)
+        self.assertEqual(search.search_formations("java objet"), [self.java.pk])
+
+
+@override_settings(SUBMISSIONS_PAGE_SIZE=2)
+class ViewSubmissionsTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        make_catalogue(self.teacher, self.student, formations=1, courses=1)
+        self.course = Course.objects.get()
+        self.url = reverse('enseignants:view_submissions', args=[self.course.pk])
+        self.client.force_login(self.teacher)
+
+    def test_newest_first_and_paginated(self):
+        Submission.objects.create(course=self.course, student=self.student, file='submissions/c.pdf')
+        response = self.client.get(self.url)
+        page = response.context['submissions']
+        self.assertEqual(response.context['submission_count'], 3)
+        self.assertEqual([s.file.name for s in page], ['submissions/c.pdf', 'submissions/b.pdf'])
+
+    def test_grade_is_saved(self):
+        submission = Submission.objects.filter(course=self.course).first()
+        self.client.post(self.url, {f'grade-{submission.pk}': '17'})
+        submission.refresh_from_db()
+        self.assertEqual(submission.grade, '17')
+
+    def upload(self, text):
+        sheet = SimpleUploadedFile('notes.csv', text.encode('utf-8'), content_type='text/csv')
+        return self.client.post(self.url, {'sheet': sheet}, follow=True)
+
+    def test_grade_sheet_round_trip(self):
+        response = self.client.get(reverse('enseignants:grade_sheet', args=[self.course.pk]))
+        lines = b''.join(response.streaming_content).decode('utf-8').lstrip('\ufeff').splitlines()
+        self.assertEqual(lines[0], 'submission,email,student,submitted_at,grade')
+        self.assertEqual(len(lines), 3)
+        # Filled in with a spreadsheet using semicolons
+        sheet = '\n'.join(line.replace(',', ';') + '14,5' for line in lines[1:])
+        response = self.upload('submission;email;student;submitted_at;grade\n' + sheet)
+        self.assertContains(response, '2 note(s) enregistrée(s)')
+        self.assertEqual(set(Submission.objects.values_list('grade', flat=True)), {'14,5'})
+
+    def test_invalid_rows_are_reported_and_nothing_is_saved(self):
+        first, second = Submission.objects.filter(course=self.course)
+        other = Submission.objects.create(course=Course.objects.create(formation=self.course.formation, titre="Autre"),
+                                          student=self.student, file='submissions/x.pdf')
+        response = self.upload(f'submission,grade\n{first.pk},12\nabc,10\n{other.pk},10\n{second.pk},{"9" * 11}\n')
+        errors = [str(message) for message in response.context['messages']]
+        self.assertEqual(errors[:3], [
+            "Ligne 3 : identifiant de soumission invalide « abc »",
+            f"Ligne 4 : la soumission {other.pk} n'appartient pas à ce cours",
+            "Ligne 5 : note trop longue (10 caractères au plus)",
+        ])
+        self.assertFalse(Submission.objects.exclude(grade=None).exists())
+        self.assertContains(self.upload('id;note\n1;12'), 'colonnes « submission » et « grade »')
+
+    def test_large_sheet_is_batched(self):
+        Submission.objects.bulk_create(
+            Submission(course=self.course, student=self.student, file='submissions/a.pdf') for _ in range(10000))
+        rows = [(n, pk, str(n % 20)) for n, pk in enumerate(Submission.objects.values_list('pk', flat=True), 2)]
+        with CaptureQueriesContext(connection) as queries:
+            updated, errors = grading.apply(self.course, rows)
+        self.assertEqual((updated, errors), (len(rows), []))
+        self.assertLess(len(queries), 50)
+        self.assertEqual(grading.apply(self.course, rows), (0, []))
+        # All different: saved with bulk_update()
+        self.assertEqual(grading.apply(self.course, [(n, pk, f'{n}/20') for n, pk, _ in rows[:30]]), (30, []))
+        self.assertEqual(Submission.objects.get(pk=rows[29][1]).grade, '31/20')
+
+
+class SubmissionsZipTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=self.media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='Émile', last_name='S')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=0, teacher=self.teacher)
+        self.course = Course.objects.create(formation=self.formation, titre="Cours 1")
+        self.other = Course.objects.create(formation=self.formation, titre="Cours 2")
+        self.pdf = os.urandom(300 * 1024)
+        self.submit(self.course, 'copie.pdf', b'%PDF-1.4 ' + self.pdf)
+        self.submit(self.course, 'notes.txt', b'bonjour ' * 1000)
+        self.submit(self.other, 'tp.pdf', b'%PDF-1.4 tp')
+        self.client.force_login(self.teacher)
+
+    def submit(self, course, name, content):
+        submission = Submission(course=course, student=self.student)
+        submission.file.save(name, ContentFile(content))
+        return submission
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        chunks = list(response.streaming_content)
+        return zipfile.ZipFile(BytesIO(b''.join(chunks))), chunks
+
+    def test_course_archive_is_streamed(self):
+        archive, chunks = self.download(reverse('enseignants:course_submissions_zip', args=[self.course.pk]))
+        names = archive.namelist()
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(name.startswith('Cours_1/Émile_S/') for name in names))
+        pdf, text = (archive.getinfo(name) for name in sorted(names, key=lambda name: not name.endswith('.pdf')))
+        self.assertEqual(pdf.compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(text.compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.read(pdf), b'%PDF-1.4 ' + self.pdf)
+        self.assertIsNone(archive.testzip())
+        # Handed over as it is written, never as one block
+        self.assertGreater(len(chunks), 4)
+        self.assertLessEqual(max(map(len, chunks)), zipstream.CHUNK_SIZE + 1024)
+
+    def test_formation_archive_skips_missing_files(self):
+        missing = self.submit(self.other, 'perdu.pdf', b'%PDF-1.4 perdu')
+        os.remove(missing.file.path)
+        with self.assertLogs('elearning.zipstream', 'WARNING'):
+            archive, _ = self.download(reverse('enseignants:formation_submissions_zip', args=[self.formation.pk]))
+        self.assertEqual(sorted(name.split('/')[0] for name in archive.namelist()), ['Cours_1', 'Cours_1', 'Cours_2'])
+
+    def test_only_the_teacher_can_download(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('enseignants:formation_submissions_zip', args=[self.formation.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class CourseFileTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=self.media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        cache.clear()
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        formation = Formation.objects.create(titre="Python", description="d", prix=0, teacher=self.teacher)
+        self.course = Course.objects.create(formation=formation, titre="Cours")
+        self.course.td_file.save('td.pdf', ContentFile(b'%PDF-1.4 ' + b'x' * 1000))
+        Enrollment.objects.create(student=self.student, formation=formation)
+        self.url = reverse('enseignants:course_file', args=[self.course.pk, 'td'])
+        self.client.force_login(self.student)
+
+    def test_full_download_and_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content)[:8], b'%PDF-1.4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF')
+        self.assertEqual(response['Content-Range'], 'bytes 0-3/1009')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), b'xxxxx')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='nginx')
+    def test_offload_to_front_server(self):
+        response = self.client.get(self.url)
+        digest = self.course.td_file.name.split('/')[-2]
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/blobs/{digest[:2]}/{digest}')
+
+    def test_media_url_serves_public_images_only(self):
+        # The DEBUG route of MEDIA_URL (elearning.urls)
+        for name, content in (('logo.png', b'png'), ('profile_pics/me.jpg', b'jpg'), ('cvs/cv.pdf', b'%PDF')):
+            os.makedirs(os.path.join(self.media.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media.name, name), 'wb') as f:
+                f.write(content)
+        request = RequestFactory().get('/media/')  # anonymous
+        for name in ('logo.png', 'profile_pics/me.jpg'):
+            self.assertEqual(serve_public_media(request, name, document_root=self.media.name).status_code, 200)
+        td_file = self.course.td_file
+        blob = td_file.storage.blob_name(td_file.name.split('/')[-2])
+        for name in (td_file.name, blob, 'cvs/cv.pdf', 'profile_pics/../cvs/cv.pdf', 'variants/../cvs/cv.pdf'):
+            with self.assertRaises(Http404):
+                serve_public_media(request, name, document_root=self.media.name)
+
+    def test_students_without_access_are_refused(self):
+        self.client.force_login(User.objects.create_user('autre@example.com', 'pw', is_student=True))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class CatalogueCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=10, teacher=self.teacher)
+
+    def cached_page(self, path):
+        return caches['catalogue'].get(f"page:catalogue:{generation('catalogue')}:{path}")
+
+    def test_anonymous_page_is_cached_until_catalogue_changes(self):
+        response = self.client.get(reverse('carriers'))
+        self.assertEqual(self.cached_page('/carriers/').content, response.content)
+        Formation.objects.create(titre="Java", description="d", prix=10, teacher=self.teacher)
+        self.assertIsNone(self.cached_page('/carriers/'))
+
+    def test_logged_in_pages_are_not_cached(self):
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('carriers'))
+        self.assertIsNone(self.cached_page('/carriers/'))
+
+    def test_student_card_fragment_follows_generation(self):
+        student = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        self.client.force_login(student)
+        self.assertContains(self.client.get(reverse('formations')), "Python")
+        # Writes that bypass the signals are not seen until the next bump.
+        Formation.objects.filter(pk=self.formation.pk).update(titre="Renamed")
+        self.assertNotContains(self.client.get(reverse('formations')), "Renamed")
+        bump('catalogue')
+        self.assertContains(self.client.get(reverse('formations')), "Renamed")
+
+    def test_students_get_cached_cards_on_both_catalogue_pages(self):
+        student = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        self.client.force_login(student)
+        self.assertContains(self.client.get(reverse('enseignants:formations')), "Python")
+        Formation.objects.filter(pk=self.formation.pk).update(titre="Renamed")
+        self.assertNotContains(self.client.get(reverse('formations')), "Renamed")
+
+    def test_teacher_profile_change_bumps_generation(self):
+        before = generation('catalogue')
+        self.teacher.first_name = "Paul"
+        self.teacher.save()
+        self.assertGreater(generation('catalogue'), before)
+
+
+@override_settings(METRICS_TOKEN='scrape-me')
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=10, teacher=self.teacher)
+        Purchase.objects.create(student=self.student, formation=self.formation, is_paid=True)
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), **headers)
+
+    def test_requests_are_measured_per_url_name(self):
+        self.client.force_login(self.teacher)
+        out = StringIO()
+        with redirect_stdout(out):
+            response = self.client.get(reverse('enseignants:view_enrolled_students', args=[self.formation.pk]))
+        self.assertEqual(response.context['total_students'], 1)
+        self.assertEqual(out.getvalue(), '')
+
+        body = self.scrape(HTTP_AUTHORIZATION='Bearer scrape-me').content.decode()
+        label = '{url_name="enseignants:view_enrolled_students"}'
+        self.assertIn(f'elearning_request_duration_seconds_count{label} 1', body)
+        self.assertIn(f'elearning_db_queries_count{label} 1', body)
+        self.assertIn(f'elearning_template_render_seconds_count{label} 1', body)
+        self.assertIn('elearning_requests_total{status="200",url_name="enseignants:view_enrolled_students"} 1', body)
+
+    def test_duplicate_queries_are_counted(self):
+        with metrics.recording() as stats:
+            for _ in range(3):
+                User.objects.filter(pk=self.student.pk).first()
+            User.objects.filter(pk=self.teacher.pk).first()
+        self.assertEqual(stats.queries, 4)
+        self.assertEqual(stats.duplicates, 2)
+
+    def test_scrape_needs_token_or_superuser(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        admin = User.objects.create_superuser('admin@example.com', 'pw', first_name='A', last_name='D')
+        self.client.force_login(admin)
+        self.assertEqual(self.scrape().status_code, 200)
+
+
+class NPlusOneTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        make_catalogue(self.teacher, self.teacher, formations=3, courses=1)
+
+    def test_reports_code_and_template_line(self):
+        template = engines['django'].from_string("{% for s in submissions %}\n{{ s.student.email }}\n{% endfor %}")
+        with metrics.recording(detect=True) as stats:
+            template.render({'submissions': Submission.objects.all()})
+            for course in Course.objects.all():
+                course.formation.teacher_id
+        (student_key, count, (code, line)), (formation_key, *_) = nplusone.offenders(stats)
+        self.assertEqual(count, 6)
+        self.assertIn('"accounts_user"', student_key)
+        self.assertIn('"enseignants_formation"', formation_key)
+        self.assertTrue(code.startswith('enseignants/tests.py:'))
+        self.assertEqual(line, '<unknown source>:2')
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            nplusone.fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s, %s) AND "name" = \'x\' LIMIT 21'),
+            nplusone.fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s) AND "name" = \'y\' LIMIT 1'),
+        )
+
+    def test_admin_lists_load_relations_upfront(self):
+        admin = User.objects.create_superuser('admin@example.com', 'pw', first_name='A', last_name='D')
+        for formation in Formation.objects.all():
+            Purchase.objects.create(student=admin, formation=formation)
+        self.client.force_login(admin)
+        for model in ('accounts/purchase', 'enseignants/formation', 'enseignants/course', 'etudiant/submission'):
+            self.assertEqual(self.client.get(f'/admin/{model}/').status_code, 200)
+
+    def test_strict_mode_raises(self):
+        with metrics.recording(detect=True) as stats:
+            [str(course) for course in Course.objects.all()]
+        with self.assertRaisesMessage(nplusone.NPlusOneError, 'enseignants/models.py'):
+            nplusone.report('test', nplusone.offenders(stats))
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.students = [
+            User.objects.create_user(f'etu{i}@example.com', 'pw', is_student=True, first_name='E', last_name=str(i))
+            for i in range(3)
+        ]
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=25, teacher=self.teacher)
+        self.course = Course.objects.create(formation=self.formation, titre="Cours 1")
+
+    def snapshot(self):
+        return (
+            list(FormationStats.objects.values_list('formation', 'purchases', 'paid_purchases').order_by('pk')),
+            list(EnrollmentDay.objects.values_list('formation', 'day', 'enrollments').order_by('pk')),
+            list(CourseStats.objects.values_list('course', 'submissions', 'submitters', 'ungraded').order_by('pk')),
+        )
+
+    def test_counters_match_a_rebuild(self):
+        first, second, third = self.students
+        unpaid = Purchase.objects.create(student=first, formation=self.formation)
+        payments.fulfil([(first.pk, self.formation.pk), (second.pk, self.formation.pk)])
+        unpaid.refresh_from_db()
+        Purchase.objects.create(student=third, formation=self.formation, is_paid=True)
+        Purchase.objects.filter(student=third).get().delete()
+        for student in (first, first, second):
+            Submission.objects.create(course=self.course, student=student, file='submissions/a.pdf')
+        graded = Submission.objects.filter(student=second).get()
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('enseignants:view_submissions', args=[self.course.pk]),
+                         {f'grade-{graded.pk}': '15'})
+        Submission.objects.filter(student=first).first().delete()
+
+        self.assertEqual(FormationStats.objects.get().paid_purchases, 2)
+        self.assertEqual(CourseStats.objects.values_list('submissions', 'submitters', 'ungraded').get(), (2, 2, 1))
+        counters = self.snapshot()
+        dashboard.rebuild()
+        self.assertEqual(self.snapshot(), counters)
+
+    def test_dashboard_reads_summary_rows(self):
+        payments.fulfil([(student.pk, self.formation.pk) for student in self.students])
+        Submission.objects.create(course=self.course, student=self.students[0], file='submissions/a.pdf')
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('enseignants:dashboard'))
+        self.assertEqual(response.context['total_revenue'], 75)
+        self.assertEqual(response.context['total_students'], 3)
+        self.assertEqual(response.context['total_ungraded'], 1)
+        self.assertEqual(response.context['courses'][0].submission_rate, 33)
+        self.assertEqual(response.context['weeks'][0]['enrollments'], 3)
+
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(reverse('enseignants:dashboard')).status_code, 403)
@@ -7,6 +7,7 @@ app_name = 'enseignants'
 urlpatterns = [
     path('publier/', views.create_formation, name='publier'),
     path('formations/', views.formations, name='formations'),
+    path('dashboard/', views.teacher_dashboard, name='dashboard'),
     path('formation/create/', views.create_formation, name='create_formation'),
     path('formation/edit/<int:pk>/', views.edit_formation, name='edit_formation'),
     path('formation/delete/<int:pk>/', views.delete_formation, name='delete_formation'),
@@ -16,6 +17,11 @@ urlpatterns = [
     path('course/submit/<int:pk>/', views.submit_assignment, name='submit_assignment'),
     path('formation/buy/<int:pk>/', views.buy_formation, name='buy_formation'),
     path('course/<int:course_pk>/submissions/', views.view_submissions, name='view_submissions'),
+    path('course/<int:course_pk>/grades.csv', views.grade_sheet, name='grade_sheet'),
+    path('course/<int:course_pk>/submissions.zip', views.course_submissions_zip, name='course_submissions_zip'),
+    path('formation/<int:formation_pk>/submissions.zip', views.formation_submissions_zip, name='formation_submissions_zip'),
     path('formation/<int:formation_pk>/students/', views.view_enrolled_students, name='view_enrolled_students'),
     path('teacher/<int:teacher_id>/cv/', views.view_teacher_cv, name='view_teacher_cv'),
+    path('course/<int:pk>/file/<str:kind>/', views.course_file, name='course_file'),
+    path('course/<int:pk>/preview/<str:kind>.webp', views.course_preview, name='course_preview'),
 ]
\ No newline at end of file
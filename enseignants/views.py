@@ -1,14 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404, HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
-from django.http import Http404, FileResponse
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import Http404, StreamingHttpResponse
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.core.paginator import Paginator
+from django.utils.text import get_valid_filename
 import os
 from .forms import FormationForm, CourseForm
-from .models import Formation, Course, AssignmentSubmission, EnseignantProfile
+from .models import Formation, Course, EnseignantProfile
+from .catalogue import COURSE_FILES, PREVIEW_FILES, attach_previews, course_digest, load_formations
+from . import dashboard, grading
+from elearning.media import serve_file
+from uploads.models import PdfInfo
+from elearning.zipstream import stream_zip
 from etudiant.models import Submission  # Student submissions
 from accounts.models import Purchase, User
+from etudiant.entitlements import formation_ids, has_access
 import logging
 logger = logging.getLogger(__name__)
 
@@ -34,29 +43,11 @@ def create_formation(request):
 @login_required
 def formations(request):
     """List all formations with purchase status"""
-    print(f"[DEBUG] Logged-in teacher: {getattr(request.user, 'username', getattr(request.user, 'email', str(request.user)))}")
-    if request.user.is_teacher and not request.user.is_superuser:
-        formations = Formation.objects.filter(teacher=request.user)
-    else:
-        formations = Formation.objects.all()
-    print(f"[DEBUG] Found {formations.count()} formations for this teacher.")
-    purchased_formations = Purchase.objects.filter(
-        student=request.user
-    ).values_list('formation_id', flat=True)
-    from .models import AssignmentSubmission  # Only import AssignmentSubmission here
-    for formation in formations:
-        print(f"[DEBUG] Formation: {formation.titre} (ID={formation.id})")
-        for course in formation.courses.all():
-            print(f"    [DEBUG] Course: {course.titre} (ID={course.id})")
-            student_submissions = list(Submission.objects.filter(course=course))
-            assignment_submissions = list(AssignmentSubmission.objects.filter(course=course))
-            submissions = student_submissions + assignment_submissions
-            print(f"        [DEBUG] {len(student_submissions)} student submissions, {len(assignment_submissions)} assignment submissions, {len(submissions)} total.")
-            for s in student_submissions:
-                print(f"            [DEBUG] Submission: id={s.id}, student={getattr(s.student, 'username', getattr(s.student, 'email', s.student))}, file={s.file}, submitted_at={getattr(s, 'submitted_at', None)}")
-            for a in assignment_submissions:
-                print(f"            [DEBUG] AssignmentSubmission: id={a.id}, student={getattr(a.student, 'username', getattr(a.student, 'email', a.student))}, file={a.file}, submitted_at={getattr(a, 'submitted_at', None)}")
-            course.submissions_for_teacher = submissions
+    formations = attach_previews(load_formations(
+        request.user,
+        with_submissions=request.user.is_teacher or request.user.is_superuser,
+    ))
+    purchased_formations = formation_ids(request.user)
     return render(request, 'formations.html', {
         'formations': formations,
         'purchased_formations': purchased_formations,
@@ -100,7 +91,7 @@ def create_course(request, formation_pk):
         return redirect('enseignants:formations')
     
     if request.method == 'POST':
-        form = CourseForm(request.POST, request.FILES)
+        form = CourseForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             course = form.save(commit=False)
             course.formation = formation
@@ -123,7 +114,7 @@ def edit_course(request, pk):
         return redirect('enseignants:formations')
     
     if request.method == 'POST':
-        form = CourseForm(request.POST, request.FILES, instance=course)
+        form = CourseForm(request.POST, request.FILES, instance=course, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, "Cours mis à jour avec succès")
@@ -151,15 +142,12 @@ def submit_assignment(request, pk):
     course = get_object_or_404(Course, pk=pk)
     
     # Check purchase status
-    if not Purchase.objects.filter(
-        student=request.user,
-        formation=course.formation
-    ).exists() and not request.user.is_teacher:
+    if not has_access(request.user, course.formation_id) and not request.user.is_teacher:
         messages.error(request, "Achat de la formation requis")
         return redirect('enseignants:formations')
     
     if request.method == 'POST' and 'file' in request.FILES:
-        AssignmentSubmission.objects.create(
+        Submission.objects.create(
             course=course,
             student=request.user,
             file=request.FILES['file']
@@ -194,30 +182,19 @@ logger = logging.getLogger(__name__)
 @login_required
 def view_enrolled_students(request, formation_pk):
     """View to display all students enrolled in a formation"""
+    formation = get_object_or_404(Formation, pk=formation_pk)
+
+    # Check if the current user is the teacher of this formation
+    if request.user.id != formation.teacher_id and not request.user.is_superuser:
+        messages.error(request, "Vous n'êtes pas autorisé à voir les étudiants de cette formation.")
+        return redirect('enseignants:formations')
+
     try:
-        formation = get_object_or_404(Formation, pk=formation_pk)
-        
-        # Check if the current user is the teacher of this formation
-        if request.user != formation.teacher and not request.user.is_superuser:
-            messages.error(request, "Vous n'êtes pas autorisé à voir les étudiants de cette formation.")
-            return redirect('enseignants:formations')
-        
-        # Debug: Print formation details
-        print("\n" + "="*50)
-        print(f"[DEBUG] Viewing enrolled students for formation: {formation.titre} (ID: {formation.id})")
-        print(f"[DEBUG] Teacher: {formation.teacher}")
-        
         # Get all purchases for this formation
         purchases = Purchase.objects.filter(
             formation=formation
         ).select_related('student')
-        
-        # Debug: Print all purchases
-        print(f"[DEBUG] Found {purchases.count()} purchases for this formation")
-        for p in purchases:
-            print(f"[DEBUG] - Purchase ID: {p.id}, Student: {p.student.email if p.student else 'None'}, "
-                  f"Paid: {p.is_paid}, Date: {p.purchased_at}")
-        
+
         # Get unique students (in case of multiple purchases)
         students = {}
         for purchase in purchases:
@@ -227,24 +204,16 @@ def view_enrolled_students(request, formation_pk):
                     'purchased_at': purchase.purchased_at,
                     'is_paid': purchase.is_paid
                 }
-        
-        # Debug: Print unique students
-        print(f"[DEBUG] Found {len(students)} unique students")
-        for student_id, data in students.items():
-            print(f"[DEBUG] - Student: {data['student'].email}, "
-                  f"Paid: {data['is_paid']}, Date: {data['purchased_at']}")
-        print("="*50 + "\n")
-        
+        logger.debug("Formation %s: %s purchase(s), %s student(s)", formation.pk, len(purchases), len(students))
+
         # Convert to list for template
         students_list = list(students.values())
-        
+
     except Exception as e:
-        import traceback
-        print(f"[ERROR] Error in view_enrolled_students: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error listing the students of formation %s", formation.pk)
         students_list = []
         messages.error(request, f"Une erreur est survenue : {str(e)}")
-    
+
     return render(request, 'enrolled_students.html', {
         'formation': formation,
         'students': students_list,
@@ -254,70 +223,136 @@ def view_enrolled_students(request, formation_pk):
 @login_required
 def view_teacher_cv(request, teacher_id):
     """View to display teacher's CV"""
-    try:
-        teacher = User.objects.get(id=teacher_id, is_teacher=True)
-        enseignant_profile = get_object_or_404(EnseignantProfile, user=teacher)
-        
-        if not enseignant_profile.cv:
-            raise Http404("CV not found")
-            
-        # Get the file path
-        file_path = os.path.join(settings.MEDIA_ROOT, str(enseignant_profile.cv))
-        
-        # Open the file and serve it as a response
-        try:
-            response = FileResponse(open(file_path, 'rb'), content_type='application/pdf')
-            response['Content-Disposition'] = f'inline; filename="{os.path.basename(file_path)}"'
-            return response
-        except FileNotFoundError:
-            raise Http404("CV file not found")
-            
-    except User.DoesNotExist:
-        raise Http404("Teacher not found")
+    teacher = get_object_or_404(User, id=teacher_id, is_teacher=True)
+    enseignant_profile = EnseignantProfile.objects.filter(user=teacher).first()
+    cv = enseignant_profile.cv if enseignant_profile and enseignant_profile.cv else teacher.cv
+    return serve_file(request, cv)
+
+@login_required
+def course_file(request, pk, kind):
+    """Serve a course TD/TP/correction to its teacher and to enrolled students"""
+    if kind not in COURSE_FILES:
+        raise Http404("Unknown file")
+    course = get_object_or_404(Course.objects.select_related('formation'), pk=pk)
+    if not (request.user.is_superuser or request.user.id == course.formation.teacher_id
+            or has_access(request.user, course.formation_id)):
+        raise PermissionDenied
+    return serve_file(request, getattr(course, COURSE_FILES[kind]), as_attachment='download' in request.GET)
+
+@login_required
+def course_preview(request, pk, kind):
+    """Thumbnail of the first page of a course TD/TP (see uploads.pdfs)"""
+    # Shown on the catalogue cards, before purchase, like the course titles.
+    if kind not in PREVIEW_FILES:
+        raise Http404("Unknown file")
+    course = get_object_or_404(Course.objects.only('td_file', 'tp_file'), pk=pk)
+    digest = course_digest(course, kind)
+    thumbnail = digest and PdfInfo.objects.filter(
+        blob_id=digest, status=PdfInfo.DONE).values_list('thumbnail', flat=True).first()
+    if not thumbnail:
+        raise Http404("No preview")
+    # The digest names the file: its thumbnail never changes.
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(bytes(thumbnail), content_type='image/webp')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.PDF_PREVIEW_MAX_AGE)
+    return response
 
 @login_required
 def view_submissions(request, course_pk):
     """View all submissions for a course"""
-    course = get_object_or_404(Course, pk=course_pk)
-    logger.debug(f"[Teacher View] Viewing submissions for course id={course.id}, title={course.titre}")
-    logger.debug(f"[Teacher View] Logged-in teacher: {request.user} | Course owner: {course.formation.teacher}")
+    course = get_object_or_404(Course.objects.select_related('formation__teacher'), pk=course_pk)
 
     # Check if user is the course teacher or superuser
     if request.user != course.formation.teacher and not request.user.is_superuser:
         messages.error(request, f"Vous n'êtes pas autorisé à voir les soumissions de ce cours. Seul l'enseignant créateur ({course.formation.teacher}) peut voir les soumissions.")
         return redirect('enseignants:formations')
 
-    # Get all submissions from both models
-    student_submissions = Submission.objects.filter(course=course).select_related('student')
-    assignment_submissions = AssignmentSubmission.objects.filter(course=course).select_related('student')
-    
-    # Combine submissions from both models
-    all_submissions = list(student_submissions) + list(assignment_submissions)
-    
-    # Process each submission to ensure they have the required attributes
-    for sub in all_submissions:
-        # Ensure student has get_full_name method
-        if hasattr(sub, 'student') and not hasattr(sub.student, 'get_full_name'):
-            sub.student.get_full_name = lambda: getattr(sub.student, 'name', '') or getattr(sub.student, 'email', 'Étudiant inconnu')
-            
-        # Ensure submitted_at is set
-        if not hasattr(sub, 'submitted_at'):
-            sub.submitted_at = getattr(sub, 'created_at', timezone.now())
-        
-        # Ensure file attribute is set (some might use 'fichier' instead)
-        if not hasattr(sub, 'file'):
-            sub.file = getattr(sub, 'fichier', None)
-    
-    # Sort by submission date (newest first)
-    all_submissions.sort(key=lambda x: x.submitted_at if hasattr(x, 'submitted_at') and x.submitted_at else timezone.now(), reverse=True)
-    
-    # Log the number of submissions found for debugging
-    logger.debug(f"[Teacher View] Found {len(all_submissions)} submissions for course {course.id}")
-    for sub in all_submissions:
-        logger.debug(f"[Teacher View] Submission: {sub.id} by {getattr(sub.student, 'email', 'Unknown')} at {getattr(sub, 'submitted_at', 'No date')}")
-    
+    if request.method == 'POST':
+        # Grid of the page or uploaded grade sheet, see enseignants.grading
+        try:
+            if 'sheet' in request.FILES:
+                rows = grading.read_sheet(request.FILES['sheet'])
+            else:
+                rows = grading.grid_rows(request.POST)
+        except grading.SheetError as error:
+            messages.error(request, str(error))
+        else:
+            updated, errors = grading.apply(course, rows)
+            for error in errors[:settings.GRADE_ERRORS_SHOWN]:
+                messages.error(request, error)
+            if len(errors) > settings.GRADE_ERRORS_SHOWN:
+                messages.error(request, f"… et {len(errors) - settings.GRADE_ERRORS_SHOWN} autre(s) erreur(s)")
+            if errors:
+                messages.warning(request, "Aucune note n'a été enregistrée : corrigez les erreurs et recommencez.")
+            else:
+                messages.success(request, f"{updated} note(s) enregistrée(s)")
+        return redirect(f"{request.path}?page={request.POST.get('page', 1)}")
+
+    # Served by the (course, -submitted_at) index, newest first
+    submissions = Submission.objects.filter(course=course).select_related('student').order_by('-submitted_at', '-pk')
+    page = Paginator(submissions, settings.SUBMISSIONS_PAGE_SIZE).get_page(request.GET.get('page'))
+    logger.debug("Teacher %s viewing page %s of submissions for course %s", request.user.pk, page.number, course.pk)
+
     return render(request, 'view_submissions.html', {
         'course': course,
-        'submissions': all_submissions,
-        'submission_count': len(all_submissions)
-    })
\ No newline at end of file
+        'submissions': page,
+        'page_obj': page,
+        'submission_count': page.paginator.count
+    })
+
+@login_required
+def grade_sheet(request, course_pk):
+    """CSV of the submissions of a course, to fill in and upload on view_submissions"""
+    course = get_object_or_404(Course.objects.select_related('formation'), pk=course_pk)
+    if request.user.id != course.formation.teacher_id and not request.user.is_superuser:
+        raise PermissionDenied
+    response = StreamingHttpResponse(grading.stream_sheet(course), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="notes-cours-{course.pk}.csv"'
+    return response
+
+def _archive_part(name, fallback):
+    try:
+        return get_valid_filename(name)
+    except SuspiciousFileOperation:
+        return fallback
+
+def _submission_entries(submissions):
+    """``(name in the archive, path)`` of each submission: ``<course>/<student>/<pk>-<file name>``"""
+    submissions = submissions.select_related('course', 'student').order_by('course', 'student__email', 'submitted_at')
+    for submission in submissions.iterator(chunk_size=500):
+        course = _archive_part(submission.course.titre, f'cours-{submission.course_id}')
+        student = _archive_part(submission.student.get_full_name().strip() or submission.student.email,
+                                f'etudiant-{submission.student_id}')
+        yield f'{course}/{student}/{submission.pk}-{os.path.basename(submission.file.name)}', submission.file.path
+
+def _submissions_zip(submissions, filename):
+    response = StreamingHttpResponse(stream_zip(_submission_entries(submissions)), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+def course_submissions_zip(request, course_pk):
+    """Every submission of a course in one ZIP, streamed as it is built"""
+    course = get_object_or_404(Course.objects.select_related('formation'), pk=course_pk)
+    if request.user.id != course.formation.teacher_id and not request.user.is_superuser:
+        raise PermissionDenied
+    return _submissions_zip(Submission.objects.filter(course=course), f'soumissions-cours-{course.pk}.zip')
+
+@login_required
+def formation_submissions_zip(request, formation_pk):
+    """Every submission of every course of a formation in one ZIP, streamed as it is built"""
+    formation = get_object_or_404(Formation, pk=formation_pk)
+    if request.user.id != formation.teacher_id and not request.user.is_superuser:
+        raise PermissionDenied
+    return _submissions_zip(Submission.objects.filter(course__formation=formation),
+                            f'soumissions-formation-{formation.pk}.zip')
+
+@login_required
+def teacher_dashboard(request):
+    """Revenue, enrollments, submission rates and grading backlog of the teacher's formations"""
+    if not (request.user.is_teacher or request.user.is_superuser):
+        raise PermissionDenied
+    return render(request, 'teacher_dashboard.html', dashboard.summary(request.user))
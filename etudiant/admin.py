@@ -1,4 +1 @@
-from django.contrib import admin
-from .models import Submission
-
-admin.site.register(Submission)
+# Submission is registered with the other platform models in accounts.admin.
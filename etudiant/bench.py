@@ -0,0 +1,215 @@
+"""Helpers shared by the ``bench_*``, ``seed_bench`` and ``load_test`` commands."""
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, Max, Min
+from django.test import override_settings
+from django.utils import timezone
+
+from accounts import kpis
+from accounts.models import User, Purchase
+from elearning.caching import bump
+from enseignants import dashboard
+from enseignants.models import Formation, Course
+from enseignants.search import rebuild_index
+from .models import Enrollment, Submission
+
+# Seeded users all have an address in this domain and this password.
+DOMAIN = 'bench.local'
+PASSWORD = 'bench'
+
+FIRST_NAMES = ['Amine', 'Camille', 'Chloé', 'Fatima', 'Hugo', 'Inès', 'Karim', 'Léa', 'Lucas',
+               'Manon', 'Mehdi', 'Nour', 'Sofia', 'Thomas', 'Yanis', 'Zoé']
+LAST_NAMES = ['Benali', 'Bernard', 'Dubois', 'El Idrissi', 'Fontaine', 'Garcia', 'Haddad',
+              'Lefèvre', 'Martin', 'Mercier', 'Moreau', 'Petit', 'Roux', 'Traoré']
+SUBJECTS = ['Python', 'Java', 'Algèbre linéaire', 'Bases de données', 'Réseaux', 'Analyse',
+            'Probabilités', 'Développement web', 'Apprentissage automatique', 'Systèmes',
+            'Compilation', 'Sécurité', 'Statistiques', 'Anglais technique', 'Gestion de projet']
+LEVELS = ['initiation', 'intermédiaire', 'avancé', 'projet', 'révisions']
+GRADES = [None, None, '8', '10', '12', '14', '15', '17', '19']
+
+
+@contextmanager
+def scratch_database():
+    """Run the block against a freshly migrated throwaway database.
+
+    The benchmarks write to the database, so they never touch the real
+    one: like the test runner, this creates (and afterwards destroys) the
+    test database of the ``default`` alias. On SQLite it is a file in a
+    temporary directory, which also serves as ``MEDIA_ROOT``.
+    """
+    scratch = tempfile.TemporaryDirectory()
+    settings_dict = connection.settings_dict
+    if connection.vendor == 'sqlite':
+        settings_dict.setdefault('TEST', {})['NAME'] = f'{scratch.name}/bench.sqlite3'
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=scratch.name):
+            yield scratch.name
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        scratch.cleanup()
+
+
+def migrate(targets):
+    """Migrate the current database to ``targets`` (``[(app, migration)]``)."""
+    executor = MigrationExecutor(connection)
+    executor.migrate(targets)
+
+
+def latest_migrations():
+    executor = MigrationExecutor(connection)
+    return executor.loader.graph.leaf_nodes()
+
+
+def analyze():
+    """Refresh the planner statistics."""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def seed(students=100_000, teachers=500, formations=5_000, courses=6, purchases=4,
+         submissions=2_000_000, batch_size=5_000, random_seed=42, log=None):
+    """Bulk-create a realistic catalogue and its activity; return the row counts.
+
+    ``courses`` and ``purchases`` are averages per formation and per student.
+    Popular formations sell much more than the rest (the popularity follows
+    a 1/rank law), about one purchase in ten is left unpaid, and paid ones
+    are enrolled. ``submissions`` are spread over the enrolled students'
+    courses. Dates are spread over the last two years. Signals are not sent:
+    the search index, the dashboard summary tables, the platform KPIs and
+    the catalogue cache are refreshed at the end.
+    """
+    rng = random.Random(random_seed)
+    log = log or (lambda message: None)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    counts = {}
+
+    def person(role, i, **fields):
+        return User(
+            email=f'{role}-{i}@{DOMAIN}', password=password,
+            first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+            date_joined=now - timedelta(days=rng.randint(0, 730)), **fields,
+        )
+
+    User.objects.bulk_create([person('admin', 0, is_staff=True, is_superuser=True)])
+    teacher_rows = User.objects.bulk_create(
+        [person('prof', i, is_teacher=True) for i in range(teachers)], batch_size=batch_size)
+    student_ids = []
+    for start in range(0, students, batch_size):
+        rows = [person('etu', i, is_student=True) for i in range(start, min(start + batch_size, students))]
+        student_ids += [row.pk for row in User.objects.bulk_create(rows)]
+    counts['users'] = 1 + teachers + students
+    log(f"{counts['users']} users")
+
+    formation_rows = Formation.objects.bulk_create([
+        Formation(
+            titre=f"{rng.choice(SUBJECTS)} ({rng.choice(LEVELS)}) #{i}",
+            description=f"Cours, TD et TP de {rng.choice(SUBJECTS).lower()}, avec corrections.",
+            prix=Decimal(rng.choice([0, 19, 29, 49, 79, 99, 149])),
+            teacher=rng.choice(teacher_rows), is_approved=rng.random() < 0.85,
+        )
+        for i in range(formations)
+    ], batch_size=batch_size)
+    counts['formations'] = len(formation_rows)
+
+    courses_of = {}
+    pending = []
+    for formation in formation_rows:
+        for j in range(rng.randint(1, 2 * courses - 1)):
+            pending.append(Course(formation=formation, titre=f"Séance {j + 1}",
+                                  td_file=f'courses/td/seance-{j + 1}.pdf'))
+    for course in Course.objects.bulk_create(pending, batch_size=batch_size):
+        courses_of.setdefault(course.formation_id, []).append(course.pk)
+    counts['courses'] = len(pending)
+    log(f"{counts['formations']} formations, {counts['courses']} courses")
+
+    on_sale = [formation.pk for formation in formation_rows if formation.is_approved]
+    rng.shuffle(on_sale)
+    weights = [1 / rank for rank in range(1, len(on_sale) + 1)]
+    enrolled = []   # (student_id, formation_id) of paid purchases
+    counts['purchases'] = 0
+    for start in range(0, len(student_ids), batch_size):
+        purchase_rows, enrollment_rows = [], []
+        for student_id in student_ids[start:start + batch_size]:
+            wanted = min(rng.randint(0, 2 * purchases), len(on_sale))
+            bought = set()
+            while len(bought) < wanted:
+                bought.update(rng.choices(on_sale, weights, k=wanted - len(bought)))
+            for formation_id in bought:
+                paid = rng.random() < 0.9
+                purchase_rows.append(Purchase(student_id=student_id, formation_id=formation_id, is_paid=paid))
+                if paid:
+                    enrollment_rows.append(Enrollment(student_id=student_id, formation_id=formation_id))
+                    enrolled.append((student_id, formation_id))
+        Purchase.objects.bulk_create(purchase_rows)
+        Enrollment.objects.bulk_create(enrollment_rows)
+        counts['purchases'] += len(purchase_rows)
+    counts['enrollments'] = len(enrolled)
+    log(f"{counts['purchases']} purchases, {counts['enrollments']} enrollments")
+
+    counts['submissions'] = 0
+    while enrolled and counts['submissions'] < submissions:
+        rows = []
+        for _ in range(min(batch_size, submissions - counts['submissions'])):
+            student_id, formation_id = rng.choice(enrolled)
+            rows.append(Submission(
+                student_id=student_id, course_id=rng.choice(courses_of[formation_id]),
+                file=f'submissions/devoir-{student_id}.pdf', grade=rng.choice(GRADES),
+            ))
+        Submission.objects.bulk_create(rows)
+        counts['submissions'] += len(rows)
+    log(f"{counts['submissions']} submissions")
+
+    for model, field in ((Formation, 'created_at'), (Course, 'created_at'), (Purchase, 'purchased_at'),
+                         (Enrollment, 'created_at'), (Submission, 'submitted_at')):
+        spread_dates(model, field, now)
+    rebuild_index()
+    dashboard.rebuild()
+    kpis.rebuild()
+    bump('catalogue')
+    return counts
+
+
+def spread_dates(model, field, now, days=730, buckets=52):
+    """Spread ``model.<field>`` over the last ``days``, older rows first.
+
+    ``auto_now_add`` stamps every bulk-created row with the same date.
+    """
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    step = (bounds['high'] - bounds['low']) // buckets + 1
+    for i in range(buckets):
+        low = bounds['low'] + i * step
+        model.objects.filter(pk__gte=low, pk__lt=low + step).update(
+            **{field: now - timedelta(days=days * (buckets - i) / buckets)})
+
+
+def sample():
+    """Representative rows to request: the busiest course, its formation and teacher, one of its students.
+
+    Returns ``None`` when there are no submissions to sample from.
+    """
+    busiest = (Submission.objects.values('course').annotate(n=Count('pk'))
+               .order_by('-n').values_list('course', flat=True).first())
+    if busiest is None:
+        return None
+    course = Course.objects.select_related('formation__teacher').get(pk=busiest)
+    student = User.objects.filter(
+        etudiant_enrollments__formation=course.formation_id, is_student=True).order_by('pk').first()
+    return {
+        'course': course,
+        'formation': course.formation,
+        'teacher': course.formation.teacher,
+        'student': student,
+        'admin': User.objects.filter(is_superuser=True).order_by('pk').first(),
+    }
@@ -0,0 +1,61 @@
+"""Which formations a user may access.
+
+A user is entitled to a formation once they are enrolled in it or have a
+paid purchase for it. The ids are loaded in two ``values_list`` queries,
+cached per user under a version number, and kept on the user object for
+the rest of the request, so access checks are plain set lookups.
+
+Writes to ``Purchase`` or ``Enrollment`` bump the user's version (see
+``etudiant.signals``), which makes the cached set unreachable.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from accounts.models import Purchase
+from .models import Enrollment
+
+VERSION_KEY = 'entitlements:version:{user_id}'
+SET_KEY = 'entitlements:{user_id}:{version}'
+
+
+def _version(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    # Seed with the clock so a version evicted from the cache never comes
+    # back with a number that still points at an old set.
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def formation_ids(user):
+    """Frozen set of the formation ids ``user`` may access."""
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, '_entitlements', None)
+    if ids is not None:
+        return ids
+    key = SET_KEY.format(user_id=user.pk, version=_version(user.pk))
+    cached = cache.get(key)
+    if cached is None:
+        cached = sorted(
+            set(Enrollment.objects.filter(student=user, formation__isnull=False).values_list('formation_id', flat=True))
+            | set(Purchase.objects.filter(student=user, is_paid=True).values_list('formation_id', flat=True))
+        )
+        cache.set(key, cached, settings.ENTITLEMENT_CACHE_TIMEOUT)
+    user._entitlements = ids = frozenset(cached)
+    return ids
+
+
+def has_access(user, formation):
+    """Whether ``user`` has bought or is enrolled in ``formation`` (instance or id)."""
+    return getattr(formation, 'pk', formation) in formation_ids(user)
+
+
+def invalidate(user_id):
+    """Forget the cached entitlements of one user."""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
@@ -0,0 +1,81 @@
+import logging
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from enseignants.models import Formation, Course
+from etudiant.bench import scratch_database
+from etudiant.models import Enrollment
+
+# (label, SESSION_ENGINE, AUTHENTICATION_BACKENDS); the first is the untuned setup.
+SETUPS = [
+    ('db', 'django.contrib.sessions.backends.db', ['django.contrib.auth.backends.ModelBackend']),
+    ('cached_db', 'django.contrib.sessions.backends.cached_db', ['accounts.backends.CachedModelBackend']),
+    ('signed_cookies', 'django.contrib.sessions.backends.signed_cookies', ['accounts.backends.CachedModelBackend']),
+]
+AUTH_TABLES = ('FROM "django_session"', 'FROM "accounts_user"')
+
+
+class Command(BaseCommand):
+    help = ("Count the queries and time of authenticated requests on the catalogue and a formation page "
+            "with database sessions, cached sessions and signed cookie sessions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and setup.")
+        parser.add_argument('--formations', type=int, default=30)
+
+    def handle(self, *args, **options):
+        logging.disable(logging.WARNING)
+        try:
+            with scratch_database():
+                student, formation = self.seed(options['formations'])
+                urls = {
+                    'formations': reverse('formations'),
+                    'formation page': reverse('etudiant:formation_detail', args=[formation.pk]),
+                }
+                results = {}
+                for label, engine, backends in SETUPS:
+                    with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=backends):
+                        cache.clear()
+                        client = Client()
+                        client.force_login(student)
+                        for endpoint, url in urls.items():
+                            results[endpoint, label] = self.run(client, url, options['requests'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f"{connection.vendor}, {options['requests']} authenticated requests each")
+        self.stdout.write(f"{'endpoint':<15} {'sessions':<15} {'queries':>8} {'auth':>6} {'ms/req':>8}")
+        for endpoint in urls:
+            for label, _, _ in SETUPS:
+                queries, auth, ms = results[endpoint, label]
+                self.stdout.write(f"{endpoint:<15} {label:<15} {queries:>8.1f} {auth:>6.1f} {ms:>8.2f}")
+
+    def seed(self, formations):
+        teacher = User.objects.create_user('bench-prof@example.com', 'pw', is_teacher=True)
+        created = Formation.objects.bulk_create([
+            Formation(titre=f"Formation {i}", description="Benchmark", prix=10, teacher=teacher)
+            for i in range(formations)
+        ])
+        Course.objects.bulk_create([Course(formation=formation, titre="Cours") for formation in created])
+        student = User.objects.create_user('bench-etu@example.com', 'pw', is_student=True)
+        Enrollment.objects.create(student=student, formation=created[0])
+        return student, created[0]
+
+    def run(self, client, url, requests):
+        """``(queries, session and user queries, ms)`` per request, after a warm-up request."""
+        assert client.get(url).status_code == 200
+        queries = auth = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                client.get(url)
+            queries += len(captured)
+            auth += sum(1 for query in captured if any(table in query['sql'] for table in AUTH_TABLES))
+        return queries / requests, auth / requests, (time.perf_counter() - started) * 1000 / requests
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from etudiant import payments
+from etudiant.stripe_stub import start_stub
+
+
+class Command(BaseCommand):
+    help = "Compare sync and async Stripe checkout throughput against the local stub server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--latency', type=float, default=0.1, help="Simulated Stripe latency in seconds.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Sync worker threads, i.e. the WSGI worker pool serving checkouts.")
+
+    def handle(self, *args, **options):
+        server = start_stub(latency=options['latency'])
+        formation = SimpleNamespace(id=1, titre="Benchmark", prix=Decimal('49.00'))
+        user = SimpleNamespace(id=1)
+        params = payments.session_params(formation, user, 'http://localhost/success', 'http://localhost/cancel')
+        total = options['requests']
+        try:
+            with override_settings(STRIPE_SECRET_KEY='sk_test_bench', STRIPE_API_BASE=server.url):
+                payments.reset_client()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(options['workers']) as pool:
+                    list(pool.map(lambda _: payments.create_checkout_session(params), range(total)))
+                sync_elapsed = time.perf_counter() - started
+
+                payments.reset_client()
+                async_elapsed = asyncio.run(self.run_async(params, total, options['concurrency']))
+                payments.reset_client()
+        finally:
+            server.shutdown()
+
+        self.stdout.write(f"{total} checkouts, {options['latency'] * 1000:.0f} ms simulated Stripe latency")
+        self.stdout.write(f"sync  ({options['workers']} workers):  {total / sync_elapsed:8.1f} req/s")
+        self.stdout.write(f"async ({options['concurrency']} in flight): {total / async_elapsed:8.1f} req/s")
+
+    async def run_async(self, params, total, concurrency):
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with limit:
+                await payments.create_checkout_session_async(params)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - started
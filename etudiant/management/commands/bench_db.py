@@ -0,0 +1,105 @@
+import copy
+import logging
+import threading
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from accounts.models import User
+from enseignants.models import Formation, Course
+from etudiant.bench import scratch_database
+from etudiant.models import Enrollment
+
+PDF = b'%PDF-1.4\n' + b'0' * 2048
+
+
+def baseline(settings_dict):
+    """The connection settings before tuning: one connection per request, default journaling."""
+    profile = copy.deepcopy(settings_dict)
+    profile['CONN_MAX_AGE'] = 0
+    profile['CONN_HEALTH_CHECKS'] = False
+    if connection.vendor == 'sqlite':
+        profile['OPTIONS'] = {'init_command': 'PRAGMA journal_mode=DELETE'}
+    else:
+        profile['OPTIONS'] = {key: value for key, value in profile['OPTIONS'].items() if key != 'pool'}
+    return profile
+
+
+class Command(BaseCommand):
+    help = ("Measure requests/s on the formation listing and submission endpoints "
+            "with the untuned and the configured database connection settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and setup.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients (threads).")
+        parser.add_argument('--formations', type=int, default=30)
+
+    def handle(self, *args, **options):
+        logging.disable(logging.ERROR)  # failed requests are counted, not logged
+        try:
+            with scratch_database():
+                students, course = self.seed(options['formations'], options['concurrency'])
+                tuned = copy.deepcopy(connection.settings_dict)
+                results = {}
+                for label, profile in (('before', baseline(tuned)), ('after', tuned)):
+                    self.configure(profile)
+                    results[label] = {
+                        'formations': self.run(students, options, lambda client: client.get(reverse('formations'))),
+                        'submission': self.run(students, options, lambda client: client.post(
+                            reverse('etudiant:submit_course_assignment', args=[course.pk]),
+                            {'fichier': SimpleUploadedFile('devoir.pdf', PDF, 'application/pdf')},
+                        )),
+                    }
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f"{connection.vendor}, {options['concurrency']} clients, {options['requests']} requests each")
+        for endpoint in ('formations', 'submission'):
+            for label in ('before', 'after'):
+                rate, errors = results[label][endpoint]
+                self.stdout.write(f"{endpoint:<11} {label:<6} {rate:8.1f} req/s  {errors} error(s)")
+
+    def configure(self, profile):
+        settings_dict = connections.settings['default']
+        connections.close_all()
+        settings_dict.clear()
+        settings_dict.update(profile)
+
+    def seed(self, formations, students):
+        teacher = User.objects.create_user('bench-prof@example.com', 'pw', is_teacher=True)
+        created = Formation.objects.bulk_create([
+            Formation(titre=f"Formation {i}", description="Benchmark", prix=10, teacher=teacher)
+            for i in range(formations)
+        ])
+        course = Course.objects.create(formation=created[0], titre="Cours", td_file='courses/td/bench.pdf')
+        users = [User.objects.create_user(f'bench-{i}@example.com', 'pw', is_student=True) for i in range(students)]
+        Enrollment.objects.bulk_create([Enrollment(student=user, formation=created[0]) for user in users])
+        return users, course
+
+    def run(self, students, options, request):
+        """Requests per second (and failed requests) with one client per student."""
+        per_client = max(options['requests'] // len(students), 1)
+        errors = []
+
+        def work(student):
+            client = Client(raise_request_exception=False)
+            client.force_login(student)
+            try:
+                for _ in range(per_client):
+                    if request(client).status_code >= 500:
+                        errors.append(student.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(student,)) for student in students]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return per_client * len(students) / elapsed, len(errors)
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+
+from enseignants.models import Formation
+from etudiant.bench import analyze, latest_migrations, migrate, sample, scratch_database, seed
+from etudiant.models import Enrollment, Submission
+
+# The schema before the hot-path indexes and enrollment constraints.
+BEFORE = [('enseignants', '0005_course_files_content_addressed'), ('etudiant', '0005_alter_submission_file')]
+BATCH = 20000
+
+
+class Command(BaseCommand):
+    help = ("Seed a scratch database and show the query plans and timings of the hot lookups "
+            "before and after the composite indexes and unique constraints.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=1_000_000)
+        parser.add_argument('--students', type=int, default=20_000)
+        parser.add_argument('--formations', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query; the median is reported.")
+        parser.add_argument('--plans', action='store_true', help="Print the query plans.")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            migrate(BEFORE)
+            self.seed(options)
+            analyze()
+            before = self.measure(options)
+            enrollments = Enrollment.objects.count()
+            started = time.perf_counter()
+            migrate(latest_migrations())
+            migration_time = time.perf_counter() - started
+            analyze()
+            after = self.measure(options)
+            removed = enrollments - Enrollment.objects.count()
+
+        self.stdout.write(f"Migration: {migration_time:.1f} s, {removed} duplicate enrollment(s) removed")
+        self.stdout.write(f"{'query':<28} {'before':>10} {'after':>10}")
+        for label in before:
+            self.stdout.write(f"{label:<28} {before[label][0]:>8.2f}ms {after[label][0]:>8.2f}ms")
+        if options['plans']:
+            for label in before:
+                self.stdout.write(f"\n{label}\n  before: {before[label][1]}\n  after:  {after[label][1]}")
+
+    def seed(self, options):
+        seed(students=options['students'], teachers=50, formations=options['formations'],
+             courses=5, purchases=5, submissions=options['submissions'], batch_size=BATCH)
+        # Duplicates, as the old buy flow could create them.
+        rng = random.Random(42)
+        pairs = list(Enrollment.objects.values_list('student_id', 'formation_id'))
+        Enrollment.objects.bulk_create([
+            Enrollment(student_id=student_id, formation_id=formation_id)
+            for student_id, formation_id in rng.sample(pairs, len(pairs) // 100)
+        ], batch_size=BATCH)
+        self.sample = sample()
+
+    def queries(self):
+        s = self.sample
+        student, formation = s['student'], s['formation']
+        enrolled = Enrollment.objects.filter(student=student).values_list('formation_id', flat=True).first()
+        return {
+            'enrollment exists': Enrollment.objects.filter(student=student, formation_id=enrolled),
+            'student formations': Enrollment.objects.filter(student=student).values_list('formation_id', flat=True),
+            'formation students': Enrollment.objects.filter(formation=formation).order_by('-created_at')[:50],
+            'student progress': Submission.objects.filter(student=student, course__formation_id=enrolled)
+                .values('course').annotate(n=Count('pk'), last=Max('submitted_at')).order_by(),
+            'course submissions': Submission.objects.filter(course=s['course']).order_by('-submitted_at')[:50],
+            'teacher formations': Formation.objects.filter(teacher=s['teacher']).order_by('-pk')[:20],
+            'approved formations': Formation.objects.filter(is_approved=True).order_by('-created_at')[:20],
+        }
+
+    def measure(self, options):
+        """``{label: (median ms, plan)}`` for every hot query."""
+        results = {}
+        for label, queryset in self.queries().items():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (statistics.median(timings), queryset.explain().replace('\n', '\n          '))
+        return results
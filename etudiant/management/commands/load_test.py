@@ -0,0 +1,109 @@
+import json
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from etudiant.bench import sample, scratch_database, seed
+
+
+def scenarios(rows):
+    """``(url name, role, url kwargs)`` of every page in the suite."""
+    return [
+        ('home', None, {}),
+        ('carriers', None, {}),
+        ('formations_api', None, {}),
+        ('formations', 'student', {}),
+        ('etudiant:formation_detail', 'student', {'pk': rows['formation'].pk}),
+        ('enseignants:formations', 'teacher', {}),
+        ('enseignants:dashboard', 'teacher', {}),
+        ('enseignants:view_submissions', 'teacher', {'course_pk': rows['course'].pk}),
+        ('enseignants:view_enrolled_students', 'teacher', {'formation_pk': rows['formation'].pk}),
+        ('admin_dashboard', 'admin', {}),
+    ]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))]
+
+
+class Command(BaseCommand):
+    help = ("Request the main pages through the test client and report p50/p95/p99 latency and "
+            "query counts per URL name. Runs on a freshly seeded scratch database unless --existing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Measured requests per URL.")
+        parser.add_argument('--warmup', type=int, default=2, help="Unmeasured requests per URL first.")
+        parser.add_argument('--existing', action='store_true',
+                            help="Use the configured database as is (e.g. after seed_bench) instead of a scratch one.")
+        parser.add_argument('--students', type=int, default=5_000)
+        parser.add_argument('--formations', type=int, default=300)
+        parser.add_argument('--submissions', type=int, default=200_000)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            if not options['existing']:
+                stack.enter_context(scratch_database())
+                seed(students=options['students'], teachers=max(options['formations'] // 10, 1),
+                     formations=options['formations'], submissions=options['submissions'])
+            # The test client sends Host: testserver, which --existing settings rarely allow.
+            stack.enter_context(override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']))
+            rows = sample()
+            if rows is None:
+                raise CommandError("Nothing to request: seed the database first (manage.py seed_bench).")
+            results = self.run(scenarios(rows), rows, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'url':<36} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'errors':>7}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<36} {result['p50']:>6.1f}ms {result['p95']:>6.1f}ms {result['p99']:>6.1f}ms "
+                f"{result['queries']:>8} {result['errors']:>7}"
+            )
+
+    def run(self, suite, rows, options):
+        clients = {None: Client(raise_request_exception=False)}
+        results = {}
+        for name, role, kwargs in suite:
+            if role is not None and rows[role] is None:
+                continue
+            if role not in clients:
+                clients[role] = Client(raise_request_exception=False)
+                clients[role].force_login(rows[role])
+            client, url = clients[role], reverse(name, kwargs=kwargs)
+            for _ in range(options['warmup']):
+                client.get(url)
+            timings, queries, errors, statuses = [], [], 0, set()
+            for _ in range(options['requests']):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+                errors += response.status_code != 200
+                statuses.add(response.status_code)
+            if errors:
+                self.stderr.write(self.style.WARNING(
+                    f"{name}: {errors}/{options['requests']} responses were not 200 "
+                    f"(status {', '.join(map(str, sorted(statuses - {200})))}): its figures measure error pages."
+                ))
+            timings.sort()
+            results[name] = {
+                'requests': len(timings),
+                'p50': percentile(timings, 50),
+                'p95': percentile(timings, 95),
+                'p99': percentile(timings, 99),
+                'queries': statistics.median_high(queries),
+                'errors': errors,
+            }
+        return results
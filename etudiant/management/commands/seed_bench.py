@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from etudiant.bench import DOMAIN, PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with synthetic users, formations, courses, purchases and submissions "
+            "(millions of rows with the defaults) to see how the site behaves at scale.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100_000)
+        parser.add_argument('--teachers', type=int, default=500)
+        parser.add_argument('--formations', type=int, default=5_000)
+        parser.add_argument('--courses', type=int, default=6, help="Average courses per formation.")
+        parser.add_argument('--purchases', type=int, default=4, help="Average purchases per student.")
+        parser.add_argument('--submissions', type=int, default=2_000_000)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42, help="Random seed: the same seed gives the same data.")
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded data first.")
+        parser.add_argument('--force', action='store_true', help="Allow seeding when DEBUG is off.")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG is off: this may be a production database. Use --force to seed it anyway.")
+        seeded = User.objects.filter(email__endswith=f'@{DOMAIN}')
+        if options['clear']:
+            # Formations, courses, purchases, enrollments and submissions cascade.
+            deleted, _ = seeded.delete()
+            self.stdout.write(f"{deleted} seeded row(s) deleted")
+        elif seeded.exists():
+            raise CommandError("The database is already seeded. Use --clear to seed it again.")
+
+        started = time.perf_counter()
+        counts = seed(
+            students=options['students'], teachers=options['teachers'], formations=options['formations'],
+            courses=options['courses'], purchases=options['purchases'], submissions=options['submissions'],
+            batch_size=options['batch_size'], random_seed=options['seed'], log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(counts.values())} rows in {time.perf_counter() - started:.1f} s. "
+            f"Users are <role>-<n>@{DOMAIN} (admin-0, prof-0, etu-0...), password \"{PASSWORD}\"."
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etudiant', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='grade',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['course', '-submitted_at'], name='submission_course_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', 'course'], name='submission_student_course_idx'),
+        ),
+    ]
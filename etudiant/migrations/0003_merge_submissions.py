@@ -0,0 +1,37 @@
+from django.db import migrations
+
+SOURCES = [
+    # (app, model, grade column)
+    ('enseignants', 'AssignmentSubmission', None),
+    ('accounts', 'CourseSubmission', 'grade'),
+]
+
+
+def merge_submissions(apps, schema_editor):
+    """Copy every AssignmentSubmission and CourseSubmission row into Submission.
+
+    Done with INSERT ... SELECT so rows never pass through Python and the
+    original submitted_at values are kept.
+    """
+    qn = schema_editor.quote_name
+    target = apps.get_model('etudiant', 'Submission')._meta.db_table
+    for app_label, model_name, grade in SOURCES:
+        source = apps.get_model(app_label, model_name)._meta.db_table
+        schema_editor.execute(
+            f"INSERT INTO {qn(target)} (student_id, course_id, file, submitted_at, grade) "
+            f"SELECT student_id, course_id, file, submitted_at, {qn(grade) if grade else 'NULL'} "
+            f"FROM {qn(source)}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_initial'),
+        ('enseignants', '0003_formation_search'),
+        ('etudiant', '0002_submission_grade_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+import uploads.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etudiant', '0004_stripeevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='file',
+            field=models.FileField(max_length=255, storage=uploads.storage.content_addressed_storage, upload_to='submissions/'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_enrollments(apps, schema_editor):
+    """Keep the oldest enrollment of each (student, formation) pair."""
+    Enrollment = apps.get_model('etudiant', 'Enrollment')
+    duplicates = list(
+        Enrollment.objects.filter(formation__isnull=False).values('student_id', 'formation_id')
+        .annotate(keep=Min('id'), rows=Count('id')).filter(rows__gt=1)
+    )
+    for group in duplicates:
+        Enrollment.objects.filter(
+            student_id=group['student_id'], formation_id=group['formation_id'],
+        ).exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('etudiant', '0005_alter_submission_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # New indexes are created before the single-column FK indexes they
+    # replace are dropped, and duplicates are removed before the constraint.
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', 'course', 'submitted_at'], name='submission_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['formation', '-created_at'], name='enrollment_formation_date_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='submission_student_course_idx',
+        ),
+        migrations.RunPython(dedupe_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('student', 'formation'), name='unique_enrollment'),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='etudiant_enrollments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='formation',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='etudiant_enrollments', to='enseignants.formation'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='etudiant_submissions', to='enseignants.course'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='student',
+            field=models.ForeignKey(db_index=False, limit_choices_to={'is_student': True}, on_delete=django.db.models.deletion.CASCADE, related_name='etudiant_submissions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from enseignants.models import Formation, Course  # Now import Course too
+from uploads.storage import content_addressed_storage
 
 class EtudiantProfile(models.Model):
     user = models.OneToOneField(
@@ -14,10 +15,19 @@ class EtudiantProfile(models.Model):
 
 # Corrected Enrollment with unique related_name
 class Enrollment(models.Model):
-    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='etudiant_enrollments')  # Using AUTH_USER_MODEL
-    formation = models.ForeignKey(Formation, on_delete=models.CASCADE, related_name='etudiant_enrollments', null=True, blank=True)
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='etudiant_enrollments', db_index=False)  # covered by unique_enrollment
+    formation = models.ForeignKey(Formation, on_delete=models.CASCADE, related_name='etudiant_enrollments', null=True, blank=True, db_index=False)  # covered by enrollment_formation_date_idx
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'formation'], name='unique_enrollment'),
+        ]
+        indexes = [
+            # Students of a formation, latest first
+            models.Index(fields=['formation', '-created_at'], name='enrollment_formation_date_idx'),
+        ]
+
     def __str__(self):
         return f"Enrollment for {self.student.get_full_name()} ({self.student.email}) in {self.formation.titre if self.formation else 'No Formation'}"
 
@@ -26,15 +36,35 @@ class Submission(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         limit_choices_to={'is_student': True},
-        related_name='etudiant_submissions'  # avoid clash
+        related_name='etudiant_submissions',  # avoid clash
+        db_index=False,  # covered by submission_progress_idx
     )
     course = models.ForeignKey(
         Course,
         on_delete=models.CASCADE,
-        related_name='etudiant_submissions'  # avoid clash with enseignants
+        related_name='etudiant_submissions',  # avoid clash with enseignants
+        db_index=False,  # covered by submission_course_recent_idx
     )
-    file = models.FileField(upload_to='submissions/')
+    file = models.FileField(upload_to='submissions/', storage=content_addressed_storage, max_length=255)
     submitted_at = models.DateTimeField(auto_now_add=True)
+    grade = models.CharField(max_length=10, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', '-submitted_at'], name='submission_course_recent_idx'),
+            # progress_map(): count and latest date per course read from the index alone
+            models.Index(fields=['student', 'course', 'submitted_at'], name='submission_progress_idx'),
+        ]
 
     def __str__(self):
         return f"Submission by {self.student.get_full_name()} ({self.student.email}) for {self.course.titre}"
+
+
+class StripeEvent(models.Model):
+    """A Stripe webhook event that has already been processed."""
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
@@ -0,0 +1,192 @@
+"""Stripe checkout and order fulfilment.
+
+Checkout sessions are created through one shared ``StripeClient`` backed
+by a pooled ``HTTPXClient``, so sync views (WSGI) and the async
+``checkout`` view (ASGI) reuse keep-alive connections instead of opening
+a TLS connection to Stripe per purchase. httpx is needed for the async
+path; without it the client falls back to Stripe's default sync
+transport.
+
+Orders are fulfilled by ``fulfil()``, which is idempotent and works on
+batches. The ``stripe_webhook`` view calls it for
+``checkout.session.completed`` events, so access no longer depends on the
+student coming back to ``payment_success``.
+"""
+import logging
+from collections import Counter, defaultdict
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts import kpis
+from accounts.models import Purchase, User
+from enseignants import dashboard
+from enseignants.models import Formation
+from jobs.queue import enqueue
+from . import entitlements
+from .models import Enrollment
+from .tasks import send_enrollment_confirmation
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def stripe_client():
+    """The process-wide Stripe client (created on first use)."""
+    global _client
+    if _client is None:
+        try:
+            http_client = stripe.HTTPXClient(allow_sync_methods=True)
+        except ImportError:
+            http_client = None
+        options = {}
+        if settings.STRIPE_API_BASE:
+            options['base_addresses'] = {'api': settings.STRIPE_API_BASE}
+        _client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            http_client=http_client,
+            max_network_retries=2,
+            **options,
+        )
+    return _client
+
+
+def reset_client():
+    """Drop the shared client, e.g. after changing ``STRIPE_API_BASE``."""
+    global _client
+    _client = None
+
+
+def session_params(formation, user, success_url, cancel_url):
+    return {
+        'payment_method_types': ['card'],
+        'line_items': [{
+            'price_data': {
+                'currency': 'usd',
+                'product_data': {
+                    'name': formation.titre,
+                },
+                'unit_amount': int(formation.prix * 100),
+            },
+            'quantity': 1,
+        }],
+        'mode': 'payment',
+        'success_url': success_url,
+        'cancel_url': cancel_url,
+        'client_reference_id': str(user.id),
+        'metadata': {
+            'formation_id': str(formation.id),
+            'user_id': str(user.id),
+        },
+    }
+
+
+def create_checkout_session(params):
+    return stripe_client().v1.checkout.sessions.create(params=params)
+
+
+async def create_checkout_session_async(params):
+    return await stripe_client().v1.checkout.sessions.create_async(params=params)
+
+
+def retrieve_checkout_session(session_id):
+    return stripe_client().v1.checkout.sessions.retrieve(session_id)
+
+
+def paid_orders(sessions):
+    """``(student_id, formation_id)`` for each paid checkout session."""
+    orders = set()
+    for session in sessions:
+        if session['payment_status'] not in ('paid', 'no_payment_required'):
+            continue
+        metadata = session['metadata'] or {}
+        try:
+            orders.add((int(metadata['user_id']), int(metadata['formation_id'])))
+        except (KeyError, TypeError, ValueError):
+            logger.error("Checkout session %s has no usable metadata", session['id'])
+    return orders
+
+
+def matching(orders):
+    """Filter matching the rows of any of the ``(student_id, formation_id)`` ``orders``."""
+    match = Q()
+    for student_id, formation_id in orders:
+        match |= Q(student_id=student_id, formation_id=formation_id)
+    return match
+
+
+def fulfil(orders):
+    """Enroll each student and mark their purchase paid, for every ``(student_id, formation_id)``.
+
+    Safe to call any number of times for the same order, including
+    concurrently; orders of deleted students or formations are skipped.
+    Runs a fixed number of queries for the whole batch, plus two to update
+    the dashboard counters of each formation and two for the platform KPIs
+    of each purchase day; returns the number of new enrollments.
+    """
+    orders = set(orders)
+    if not orders:
+        return 0
+
+    with transaction.atomic():
+        # Locking the students serializes concurrent fulfilments of their
+        # orders (the webhook racing payment_success) on PostgreSQL; SQLite
+        # transactions are IMMEDIATE. Orders of deleted students or
+        # formations are dropped: their rows would fail the foreign keys.
+        students = set(User.objects.select_for_update().filter(pk__in={student_id for student_id, _ in orders})
+                       .values_list('pk', flat=True))
+        prices = dict(Formation.objects.filter(pk__in={formation_id for _, formation_id in orders})
+                      .values_list('pk', 'prix'))
+        gone = {order for order in orders if order[0] not in students or order[1] not in prices}
+        if gone:
+            logger.warning("Skipping %s order(s) of deleted students or formations: %s", len(gone), sorted(gone))
+            orders -= gone
+            if not orders:
+                return 0
+        match = matching(orders)
+        enrolled = set(Enrollment.objects.filter(match).values_list('student_id', 'formation_id'))
+        stored = {(student_id, formation_id): (is_paid, purchased_at)
+                  for student_id, formation_id, is_paid, purchased_at
+                  in Purchase.objects.filter(match).values_list('student_id', 'formation_id', 'is_paid', 'purchased_at')}
+        new = orders - enrolled
+        created = []
+        if new:
+            Enrollment.objects.bulk_create(
+                [Enrollment(student_id=student_id, formation_id=formation_id) for student_id, formation_id in new],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts leaves the pks unset: read the new rows back.
+            created = list(Enrollment.objects.filter(matching(new)))
+        Purchase.objects.bulk_create(
+            [Purchase(student_id=student_id, formation_id=formation_id, is_paid=True)
+             for student_id, formation_id in orders],
+            ignore_conflicts=True,
+        )
+        Purchase.objects.filter(match, is_paid=False).update(is_paid=True)
+        # bulk_create() and update() send no signals: do what the
+        # Enrollment and Purchase handlers would.
+        for enrollment in created:
+            enqueue(send_enrollment_confirmation, enrollment_id=enrollment.pk)
+        dashboard.count_enrollments(created)
+        today = timezone.localdate()
+        new_purchases, newly_paid, paid_on = Counter(), Counter(), defaultdict(list)
+        for student_id, formation_id in orders:
+            is_paid, purchased_at = stored.get((student_id, formation_id), (False, None))
+            if is_paid:
+                continue
+            new_purchases[formation_id] += purchased_at is None
+            newly_paid[formation_id] += 1
+            paid_on[timezone.localdate(purchased_at) if purchased_at else today].append(formation_id)
+        for formation_id in newly_paid:
+            dashboard.count_purchases(formation_id, purchases=new_purchases[formation_id], paid=newly_paid[formation_id])
+        for day, formation_ids in paid_on.items():
+            kpis.count_payments(sum(prices[pk] for pk in formation_ids), day, len(formation_ids))
+
+    for student_id in {student_id for student_id, _ in orders}:
+        entitlements.invalidate(student_id)
+    logger.info("Fulfilled %s order(s), %s new enrollment(s)", len(orders), len(created))
+    return len(created)
@@ -0,0 +1,33 @@
+"""Per-student progress over the courses of the catalogue."""
+from collections import namedtuple
+
+from django.db.models import Count, Max, OuterRef, Subquery
+
+from .models import Submission
+
+CourseProgress = namedtuple('CourseProgress', ['submissions', 'last_submitted_at', 'grade'])
+
+
+def progress_map(student, formation=None):
+    """Map course id -> ``CourseProgress`` for every course ``student`` submitted to.
+
+    Runs a single grouped query over the student's submissions, restricted
+    to ``formation`` when given. ``grade`` is the latest grade recorded for
+    the course, or ``None``. Courses without a submission are absent, so
+    ``course.id in progress`` answers "already submitted?".
+    """
+    submissions = Submission.objects.filter(student=student)
+    if formation is not None:
+        submissions = submissions.filter(course__formation=formation)
+    latest_grade = Submission.objects.filter(
+        course=OuterRef('course'), student=student, grade__isnull=False,
+    ).exclude(grade='').order_by('-submitted_at', '-pk').values('grade')[:1]
+    rows = submissions.values('course').annotate(
+        submissions=Count('pk'),
+        last_submitted_at=Max('submitted_at'),
+        grade=Subquery(latest_grade),
+    ).order_by()
+    return {
+        row['course']: CourseProgress(row['submissions'], row['last_submitted_at'], row['grade'])
+        for row in rows
+    }
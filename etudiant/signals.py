@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import Purchase
+from jobs.queue import enqueue
+from . import entitlements
+from .models import Enrollment
+from .tasks import send_enrollment_confirmation
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_entitlements(sender, instance, **kwargs):
+    entitlements.invalidate(instance.student_id)
+    # The view that made the write usually still holds the same user object.
+    if sender.student.is_cached(instance):
+        instance.student.__dict__.pop('_entitlements', None)
+
+
+@receiver(post_save, sender=Enrollment)
+def queue_enrollment_confirmation(sender, instance, created, **kwargs):
+    if created:
+        enqueue(send_enrollment_confirmation, enrollment_id=instance.pk)
@@ -0,0 +1,70 @@
+"""A local stand-in for the Stripe API, for tests and the checkout benchmark.
+
+Only the checkout session endpoints are implemented. Point the app at it
+with ``STRIPE_API_BASE`` (then call ``payments.reset_client()``)::
+
+    server = start_stub(latency=0.05)
+    ...
+    server.shutdown()
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class StubStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        form = dict(parse_qsl(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()))
+        time.sleep(self.server.latency)
+        if self.path != '/v1/checkout/sessions':
+            return self.reply(404, {'error': {'message': 'Unknown endpoint', 'type': 'invalid_request_error'}})
+        session_id = f"cs_test_{next(self.server.ids)}"
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'url': f"https://checkout.stripe.test/c/pay/{session_id}",
+            'payment_status': self.server.payment_status,
+            'metadata': {key[9:-1]: value for key, value in form.items() if key.startswith('metadata[')},
+        }
+        self.server.sessions[session_id] = session
+        self.reply(200, session)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        session = self.server.sessions.get(self.path.rsplit('/', 1)[-1])
+        if session is None:
+            return self.reply(404, {'error': {'message': 'No such session', 'type': 'invalid_request_error'}})
+        self.reply(200, session)
+
+
+class StubStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def start_stub(latency=0.0, payment_status='paid'):
+    """Serve the stub on a free localhost port; ``server.url`` is its base address."""
+    server = StubStripeServer(('127.0.0.1', 0), StubStripeHandler)
+    server.latency = latency
+    server.payment_status = payment_status
+    server.sessions = {}
+    server.ids = itertools.count(1)
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
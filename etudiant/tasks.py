@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from jobs.queue import task
+from .models import Enrollment
+
+
+@task
+def send_enrollment_confirmation(enrollment_id):
+    enrollment = Enrollment.objects.select_related('student', 'formation').filter(pk=enrollment_id).first()
+    if enrollment is None or enrollment.formation is None:
+        return
+    send_mail(
+        f"Inscription confirmée : {enrollment.formation.titre}",
+        f"Bonjour {enrollment.student.get_full_name()},\n\n"
+        f"Votre inscription à la formation « {enrollment.formation.titre} » est confirmée.\n",
+        settings.DEFAULT_FROM_EMAIL,
+        [enrollment.student.email],
+        fail_silently=False,
+    )
@@ -0,0 +1,11 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def progress_for(progress, course):
+    """``{% with p=course_progress|progress_for:course %}`` -- a course's entry in a progress map."""
+    if not progress:
+        return None
+    return progress.get(getattr(course, 'pk', course))
@@ -1,3 +1,232 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, models, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User, Purchase
+from enseignants.models import Formation, Course
+from . import entitlements, payments
+from .models import Enrollment, Submission, StripeEvent
+from .progress import progress_map
+from .stripe_stub import start_stub
+
+
+class EntitlementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=10, teacher=self.teacher)
+        self.other = Formation.objects.create(titre="Java", description="d", prix=10, teacher=self.teacher)
+
+    def fresh_student(self):
+        return User.objects.get(pk=self.student.pk)
+
+    def test_enrollment_and_paid_purchase_grant_access(self):
+        Enrollment.objects.create(student=self.student, formation=self.formation)
+        Purchase.objects.create(student=self.student, formation=self.other, is_paid=False)
+        self.assertEqual(entitlements.formation_ids(self.fresh_student()), {self.formation.pk})
+        Purchase.objects.filter(formation=self.other).delete()
+        Purchase.objects.create(student=self.student, formation=self.other, is_paid=True)
+        self.assertEqual(entitlements.formation_ids(self.fresh_student()), {self.formation.pk, self.other.pk})
+
+    def test_checks_are_served_from_cache(self):
+        Enrollment.objects.create(student=self.student, formation=self.formation)
+        entitlements.formation_ids(self.fresh_student())
+        student = self.fresh_student()
+        with self.assertNumQueries(0):
+            self.assertTrue(entitlements.has_access(student, self.formation))
+            self.assertFalse(entitlements.has_access(student, self.other.pk))
+
+    def test_writes_invalidate_cached_set(self):
+        student = self.fresh_student()
+        self.assertFalse(entitlements.has_access(student, self.formation))
+        Enrollment.objects.create(student=student, formation=self.formation)
+        self.assertTrue(entitlements.has_access(student, self.formation))
+        Enrollment.objects.filter(student=student).delete()
+        self.assertFalse(entitlements.has_access(self.fresh_student(), self.formation))
+
+    def test_enrollment_is_unique(self):
+        Enrollment.objects.create(student=self.student, formation=self.formation)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Enrollment.objects.create(student=self.student, formation=self.formation)
+
+
+class ProgressMapTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=10, teacher=self.teacher)
+        self.courses = [Course.objects.create(formation=self.formation, titre=f"Cours {i}") for i in range(5)]
+
+    def test_one_query_for_all_courses(self):
+        for course in self.courses[:3]:
+            Submission.objects.create(course=course, student=self.student, file='submissions/a.pdf')
+        Submission.objects.create(course=self.courses[0], student=self.student, file='submissions/b.pdf', grade='15')
+        with self.assertNumQueries(1):
+            progress = progress_map(self.student, self.formation)
+        self.assertEqual(set(progress), {c.pk for c in self.courses[:3]})
+        self.assertEqual(progress[self.courses[0].pk].submissions, 2)
+        self.assertEqual(progress[self.courses[0].pk].grade, '15')
+        self.assertIsNone(progress[self.courses[1].pk].grade)
+
+    def test_formation_detail_query_count_is_flat(self):
+        Enrollment.objects.create(student=self.student, formation=self.formation)
+        self.client.force_login(self.student)
+        url = reverse('etudiant:formation_detail', args=[self.formation.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for course in self.courses:
+            Submission.objects.create(course=course, student=self.student, file='submissions/a.pdf')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(response.context['submitted_course_ids']), 5)
+
+
+def signed(payload, secret):
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test_stub', STRIPE_WEBHOOK_SECRET='whsec_test')
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = start_stub()
+        cls.settings_override = override_settings(STRIPE_API_BASE=cls.stub.url)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.stub.shutdown()
+        payments.reset_client()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        payments.reset_client()
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.student = User.objects.create_user('etu@example.com', 'pw', is_student=True, first_name='E', last_name='S')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=49, teacher=self.teacher)
+
+    def post_event(self, event_id, session):
+        payload = json.dumps({
+            'id': event_id, 'object': 'event', 'type': 'checkout.session.completed',
+            'data': {'object': session},
+        })
+        return self.client.post(reverse('etudiant:stripe_webhook'), payload, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=signed(payload, 'whsec_test'))
+
+    def session(self):
+        return {'id': 'cs_test_1', 'object': 'checkout.session', 'payment_status': 'paid',
+                'metadata': {'user_id': str(self.student.pk), 'formation_id': str(self.formation.pk)}}
+
+    def test_webhook_fulfils_once(self):
+        for _ in range(2):
+            self.assertEqual(self.post_event('evt_1', self.session()).status_code, 200)
+        self.assertEqual(self.post_event('evt_2', self.session()).status_code, 200)
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 1)
+        self.assertTrue(Purchase.objects.get(student=self.student).is_paid)
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        self.assertTrue(entitlements.has_access(User.objects.get(pk=self.student.pk), self.formation))
+
+    def test_webhook_skips_deleted_formations_and_students(self):
+        session = self.session()
+        self.formation.delete()
+        with self.assertLogs('etudiant.payments', 'WARNING'):
+            self.assertEqual(self.post_event('evt_1', session).status_code, 200)
+        self.student.delete()
+        self.formation = Formation.objects.create(titre="Java", description="d", prix=49, teacher=self.teacher)
+        with self.assertLogs('etudiant.payments', 'WARNING'):
+            self.assertEqual(self.post_event('evt_2', dict(session, metadata={
+                'user_id': session['metadata']['user_id'], 'formation_id': str(self.formation.pk)})).status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        self.assertFalse(Enrollment.objects.exists())
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_webhook_rejects_bad_signature(self):
+        with self.assertLogs('etudiant.views', 'WARNING'):
+            response = self.client.post(reverse('etudiant:stripe_webhook'), '{}', content_type='application/json',
+                                        HTTP_STRIPE_SIGNATURE='t=1,v1=bad')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_fulfil_is_batched(self):
+        others = [User.objects.create_user(f'etu{i}@example.com', 'pw', is_student=True) for i in range(5)]
+        orders = [(user.pk, self.formation.pk) for user in others]
+        # + one job row per new enrollment, + two dashboard counter updates
+        # that create their row here (update, savepoint, insert, release),
+        # + two platform KPI updates
+        with self.assertNumQueries(len(orders) + 10 + 2 * 4 + 2):
+            self.assertEqual(payments.fulfil(orders), 5)
+        self.assertEqual(payments.fulfil(orders), 0)
+
+    def test_sync_and_async_checkout_redirect_to_stripe(self):
+        self.client.force_login(self.student)
+        response = self.client.post(reverse('etudiant:buy_formation', args=[self.formation.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith('https://checkout.stripe.test/'))
+
+        response = self.client.post(reverse('etudiant:checkout', args=[self.formation.pk]))
+        self.assertEqual(response.status_code, 302)
+        session_id = response['Location'].rsplit('/', 1)[-1]
+        self.assertEqual(self.stub.sessions[session_id]['metadata']['user_id'], str(self.student.pk))
+
+    def test_return_page_verifies_session_before_granting_access(self):
+        self.client.force_login(self.student)
+        url = reverse('etudiant:payment_success')
+        self.client.get(url, {'formation_id': self.formation.pk})
+        self.assertFalse(Enrollment.objects.exists())
+
+        session = payments.create_checkout_session(payments.session_params(
+            self.formation, self.student, 'http://testserver/ok', 'http://testserver/ko'))
+        self.client.get(url, {'formation_id': self.formation.pk, 'session_id': session.id})
+        self.assertTrue(Enrollment.objects.filter(student=self.student, formation=self.formation).exists())
+
+
+class SeedBenchTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_bench', students=40, teachers=3, formations=8, submissions=300,
+                     batch_size=16, force=True, stdout=StringIO(), **options)
+
+    def test_seeds_consistent_data(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(is_student=True).count(), 40)
+        self.assertEqual(Submission.objects.count(), 300)
+        self.assertFalse(Purchase.objects.filter(is_paid=True).exclude(
+            student__etudiant_enrollments__formation=models.F('formation')).exists())
+        self.assertFalse(Submission.objects.exclude(
+            student__etudiant_enrollments__formation=models.F('course__formation')).exists())
+        self.assertTrue(self.client.login(email='etu-0@bench.local', password='bench'))
+
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed(clear=True, seed=7)
+        self.assertEqual(User.objects.count(), 44)
+
+    def test_load_test_reports_every_url(self):
+        self.seed()
+        out, err = StringIO(), StringIO()
+        # Deployed settings do not list the test client's host.
+        with override_settings(ALLOWED_HOSTS=['elearning.example.com']):
+            call_command('load_test', existing=True, requests=3, warmup=0, json=True, stdout=out, stderr=err)
+        results = json.loads(out.getvalue())
+        self.assertIn('enseignants:view_submissions', results)
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual({result['errors'] for result in results.values()}, {0})
+        for name in ('formations', 'etudiant:formation_detail', 'enseignants:view_submissions'):
+            self.assertEqual(results[name]['requests'], 3)
+            self.assertGreater(results[name]['queries'], 0)
@@ -5,11 +5,14 @@ app_name = 'etudiant'   # <<< this is IMPORTANT!
 
 urlpatterns = [
     path('buy/<int:pk>/', views.buy_formation, name='buy_formation'),
+    path('buy/<int:pk>/checkout/', views.checkout, name='checkout'),
+    path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
     path('success/', views.payment_success, name='payment_success'),
     path('cancel/', views.payment_cancel, name='payment_cancel'),
     path('formation/<int:pk>/submit/', views.submit_assignment, name='submit_assignment'),
     path('course/<int:course_pk>/submit/', views.submit_assignment, name='submit_course_assignment'),
     path('formation/<int:pk>/buy/', views.formation_detail, name='formation_detail'),
+    path('submission/<int:pk>/file/', views.submission_file, name='submission_file'),
     
 ]
 
@@ -3,34 +3,71 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django import forms
 from enseignants.models import Formation
-from .models import Enrollment, Submission
-from accounts.models import Purchase  # Add this import
+from .models import Submission
+from .entitlements import has_access
+from .progress import progress_map
 import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
 from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 import logging
 from enseignants.models import Course
+from elearning.media import serve_file
+from .models import StripeEvent
+from uploads.forms import UploadChoiceField
+from uploads.models import Upload
+from .payments import (
+    create_checkout_session, create_checkout_session_async, fulfil, paid_orders,
+    retrieve_checkout_session, session_params,
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+FULFILMENT_EVENTS = ('checkout.session.completed', 'checkout.session.async_payment_succeeded')
 
 class SubmissionForm(forms.Form):
-    fichier = forms.FileField(label='Fichier', widget=forms.FileInput(attrs={'accept': '.pdf,.docx', 'class': 'form-control'}))
+    fichier = forms.FileField(label='Fichier', required=False, widget=forms.FileInput(attrs={'accept': '.pdf,.docx', 'class': 'form-control'}))
+    # Id of a chunked upload (see uploads.chunks), sent instead of the file
+    fichier_upload = UploadChoiceField(Upload.SUBMISSION)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            self.fields['fichier_upload'].limit_to(user)
 
     def clean_fichier(self):
         fichier = self.cleaned_data.get('fichier')
         if fichier:
             if not fichier.name.lower().endswith(('.pdf', '.docx')):
                 raise forms.ValidationError("Seuls les fichiers PDF et DOCX sont acceptés.")
-            if fichier.size > 5 * 1024 * 1024:  # 5MB limit
-                raise forms.ValidationError("La taille du fichier ne doit pas dépasser 5 Mo.")
+            if fichier.size > settings.SUBMISSION_MAX_SIZE:
+                raise forms.ValidationError(
+                    f"La taille du fichier ne doit pas dépasser {settings.SUBMISSION_MAX_SIZE // (1024 * 1024)} Mo.")
         return fichier
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('fichier') and not cleaned_data.get('fichier_upload'):
+            raise forms.ValidationError("Veuillez choisir un fichier.")
+        return cleaned_data
+
+    def attach(self, submission):
+        """Set the submitted file on ``submission`` (not saved)."""
+        if self.cleaned_data.get('fichier_upload'):
+            self.cleaned_data['fichier_upload'].attach(submission, 'file')
+        else:
+            submission.file = self.cleaned_data['fichier']
+
 @login_required
 def formation_detail(request, pk):
-    formation = get_object_or_404(Formation, pk=pk)
+    formation = get_object_or_404(Formation.objects.select_related('teacher').prefetch_related('courses'), pk=pk)
     
     # Check user permissions
     if not (request.user.is_student or request.user.is_teacher or request.user.is_superuser):
@@ -40,33 +77,29 @@ def formation_detail(request, pk):
     # Determine enrollment status for students
     is_enrolled = False
     if request.user.is_student:
-        is_enrolled = Enrollment.objects.filter(student=request.user, formation=formation).exists()
+        is_enrolled = has_access(request.user, formation)
     elif request.user.is_teacher or request.user.is_superuser:
         is_enrolled = True
     
     # Log enrollment status for debugging
-    logger.debug(f"User: {request.user.email}, Formation: {formation.id}, is_enrolled: {is_enrolled}")
+    logger.debug("User: %s, Formation: %s, is_enrolled: %s", request.user.email, formation.id, is_enrolled)
     
     submission_form = SubmissionForm()
 
     # Check if there are any courses in this formation
-    has_courses = formation.courses.exists()
+    has_courses = bool(formation.courses.all())  # prefetched, also used by the template
 
-    # For each course, check if the student has already submitted
-    submitted_courses = {}
-    submitted_course_ids = []
+    # Submission state of every course, in one grouped query
+    course_progress = {}
     if is_enrolled and hasattr(request.user, 'is_student') and request.user.is_student:
-        for course in formation.courses.all():
-            submitted = Submission.objects.filter(course=course, student=request.user).exists()
-            submitted_courses[course.id] = submitted
-            if submitted:
-                submitted_course_ids.append(course.id)
+        course_progress = progress_map(request.user, formation)
+    submitted_course_ids = list(course_progress)
 
     return render(request, 'formation_detail.html', {
         'formation': formation,
         'is_enrolled': is_enrolled,
         'submission_form': submission_form,
-        'submitted_courses': submitted_courses,
+        'course_progress': course_progress,
         'submitted_course_ids': submitted_course_ids,
         'has_courses': has_courses
     })
@@ -78,7 +111,7 @@ def buy_formation(request, pk):
         messages.error(request, "Seuls les étudiants peuvent acheter des formations.")
         return redirect('formations')
     
-    if Enrollment.objects.filter(student=request.user, formation=formation).exists():
+    if has_access(request.user, formation):
         messages.info(request, "Vous êtes déjà inscrit à cette formation.")
         return redirect('etudiant:formation_detail', pk=formation.id)
     
@@ -90,23 +123,15 @@ def buy_formation(request, pk):
     
     # Handle POST request - process the purchase
     user_identifier = request.user.email or f"User_{request.user.id}"
-    logger.debug(f"Formation price for {formation.titre}: {formation.prix} (type: {type(formation.prix)})")
+    logger.debug("Formation price for %s: %s", formation.titre, formation.prix)
     
     # Handle free formations with explicit zero check
-    if formation.prix == 0 or float(formation.prix) == 0.0:
+    if formation.prix == 0:
         try:
-            # Create enrollment
-            enrollment = Enrollment.objects.create(student=request.user, formation=formation)
+            # Enrollment and paid purchase record, as for a completed payment
+            fulfil([(request.user.id, formation.id)])
             logger.info(f"Free enrollment created for user {user_identifier} in formation {formation.titre}")
             
-            # Create purchase record for free enrollment
-            purchase = Purchase.objects.create(
-                student=request.user,
-                formation=formation,
-                is_paid=True  # Free enrollments are considered paid
-            )
-            logger.info(f"Purchase record created for free enrollment: user {user_identifier} in formation {formation.titre}")
-            
             messages.success(request, "Inscription réussie ! Vous avez maintenant accès à cette formation gratuite.")
             return redirect('etudiant:formation_detail', pk=formation.id)
         except Exception as e:
@@ -116,68 +141,91 @@ def buy_formation(request, pk):
     
     # Stripe payment logic for paid formations
     try:
-        unit_amount = int(float(formation.prix) * 100)
-        
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': 'usd',
-                    'product_data': {
-                        'name': formation.titre,
-                    },
-                    'unit_amount': unit_amount,
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=request.build_absolute_uri(
-                reverse('etudiant:payment_success') + f'?formation_id={formation.id}'
-            ),
-            cancel_url=request.build_absolute_uri(reverse('etudiant:payment_cancel')),
-            metadata={
-                'formation_id': str(formation.id),
-                'user_id': str(request.user.id)
-            }
-        )
+        session = create_checkout_session(checkout_params(request, formation, request.user))
         logger.info(f"Stripe session created for user {user_identifier} for formation {formation.titre}")
         return redirect(session.url, code=303)
     except Exception as e:
         logger.error(f"Error creating Stripe session for user {user_identifier} in formation {formation.titre}: {str(e)}")
         messages.error(request, f"Erreur lors de la création de la session de paiement : {str(e)}")
         return redirect('formations')
+
+
+def checkout_params(request, formation, user):
+    success_url = request.build_absolute_uri(
+        reverse('etudiant:payment_success') + f'?formation_id={formation.id}'
+    ) + '&session_id={CHECKOUT_SESSION_ID}'
+    cancel_url = request.build_absolute_uri(reverse('etudiant:payment_cancel'))
+    return session_params(formation, user, success_url, cancel_url)
+
+
+async def checkout(request, pk):
+    """Create the Stripe session without holding a worker thread (served by the ASGI app)."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    formation = await Formation.objects.filter(pk=pk).afirst()
+    if formation is None:
+        raise Http404("Formation not found")
+    # Anything but a paid checkout (GET, free formation, non-student, already
+    # enrolled) is handled by the regular purchase page.
+    if (request.method != 'POST' or not user.is_student or formation.prix == 0
+            or await sync_to_async(has_access)(user, formation)):
+        return redirect('etudiant:buy_formation', pk=pk)
+    try:
+        session = await create_checkout_session_async(checkout_params(request, formation, user))
+    except stripe.StripeError as e:
+        logger.error(f"Error creating Stripe session for user {user.id} in formation {formation.id}: {e}")
+        return redirect('etudiant:payment_cancel')
+    logger.info(f"Stripe session created (async) for user {user.id} for formation {formation.id}")
+    return redirect(session.url, code=303)
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """Fulfil orders from Stripe events; each event is processed once."""
+    try:
+        event = stripe.Webhook.construct_event(
+            request.body, request.headers.get('Stripe-Signature'), settings.STRIPE_WEBHOOK_SECRET
+        )
+    except (ValueError, stripe.SignatureVerificationError) as e:
+        logger.warning(f"Rejected Stripe webhook: {e}")
+        return HttpResponse(status=400)
+
+    with transaction.atomic():
+        _, created = StripeEvent.objects.get_or_create(event_id=event['id'], defaults={'type': event['type']})
+        if created and event['type'] in FULFILMENT_EVENTS:
+            fulfil(paid_orders([event['data']['object']]))
+    return HttpResponse(status=200)
+
+
 @login_required
 def payment_success(request):
     formation_id = request.GET.get('formation_id')
+    session_id = request.GET.get('session_id')
     user_identifier = request.user.email or f"User_{request.user.id}"
     
     if formation_id:
         try:
             formation = get_object_or_404(Formation, id=formation_id)
-            
-            # Create or get enrollment
-            enrollment, created = Enrollment.objects.get_or_create(
-                student=request.user, 
-                formation=formation
-            )
-            logger.info(f"Enrollment {'created' if created else 'retrieved'} for user {user_identifier} in formation {formation.titre}")
-            
-            # Create purchase record
-            purchase, purchase_created = Purchase.objects.get_or_create(
-                student=request.user,
-                formation=formation,
-                defaults={'is_paid': True}
-            )
-            
-            # If purchase already existed but wasn't marked as paid, update it
-            if not purchase_created and not purchase.is_paid:
-                purchase.is_paid = True
-                purchase.save()
-                logger.info(f"Updated purchase record for user {user_identifier} in formation {formation.titre}")
-            
-            messages.success(request, "Paiement réussi ! Vous êtes maintenant inscrit à cette formation.")
+
+            # The webhook normally got here first; otherwise confirm the
+            # payment with Stripe before granting access.
+            if not has_access(request.user, formation) and session_id:
+                session = retrieve_checkout_session(session_id)
+                orders = paid_orders([session])
+                if (request.user.id, formation.id) in orders:
+                    fulfil(orders)
+                    logger.info(f"Order fulfilled on return for user {user_identifier} in formation {formation.titre}")
+
+            if has_access(request.user, formation):
+                messages.success(request, "Paiement réussi ! Vous êtes maintenant inscrit à cette formation.")
+            else:
+                messages.info(request, "Votre paiement est en cours de confirmation. L'accès sera activé dans quelques instants.")
             return redirect('etudiant:formation_detail', pk=formation.id)
             
+        except Http404:
+            raise
         except Exception as e:
             logger.error(f"Error during payment success for user {user_identifier}, formation_id {formation_id}: {str(e)}")
             messages.error(request, f"Erreur lors de l'inscription : {str(e)}")
@@ -207,12 +255,12 @@ def submit_assignment(request, pk=None, course_pk=None):
     if not hasattr(request.user, 'is_student') or not request.user.is_student:
         messages.error(request, "Seuls les étudiants peuvent soumettre des devoirs.")
         return redirect('formations')
-    if not Enrollment.objects.filter(student=request.user, formation=formation).exists():
+    if not has_access(request.user, formation):
         messages.error(request, "Vous devez être inscrit pour soumettre un devoir.")
         return redirect('etudiant:buy_formation', pk=formation.id)
     
     if request.method == 'POST':
-        form = SubmissionForm(request.POST, request.FILES)
+        form = SubmissionForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             # If course is None (old URL), try to get first course (for backward compatibility)
             if course is None:
@@ -220,11 +268,9 @@ def submit_assignment(request, pk=None, course_pk=None):
                 if not course:
                     messages.error(request, "Aucun cours n'est disponible pour cette formation.")
                     return redirect('etudiant:formation_detail', pk=formation.id)
-            Submission.objects.create(
-                course=course,
-                student=request.user,
-                file=form.cleaned_data['fichier']
-            )
+            submission = Submission(course=course, student=request.user)
+            form.attach(submission)
+            submission.save()
             messages.success(request, f"Devoir soumis avec succès pour le cours : {course.titre}.")
             return redirect('etudiant:formation_detail', pk=formation.id)
         else:
@@ -241,4 +287,13 @@ def submit_assignment(request, pk=None, course_pk=None):
             'formation': formation,
             'is_enrolled': True,
             'submission_form': form
-        })
\ No newline at end of file
+        })
+
+@login_required
+def submission_file(request, pk):
+    """Serve a submitted file to its author and to the course teacher"""
+    submission = get_object_or_404(Submission.objects.select_related('course__formation'), pk=pk)
+    if not (request.user.is_superuser or request.user.id == submission.student_id
+            or request.user.id == submission.course.formation.teacher_id):
+        raise PermissionDenied
+    return serve_file(request, submission.file, as_attachment='download' in request.GET)
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        queryset.update(status=Job.PENDING, attempts=0, run_after=timezone.now())
+    retry_jobs.short_description = "Relancer les tâches sélectionnées"
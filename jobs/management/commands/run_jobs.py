@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (mail, confirmations, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the due jobs once and exit.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--batch', type=int, default=100, help="Maximum jobs claimed per pass.")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending(limit=options['batch'])
+            if count:
+                self.stdout.write(f"{count} job(s) executed.")
+            if options['once']:
+                break
+            if not count:
+                time.sleep(options['sleep'])
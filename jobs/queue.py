@@ -0,0 +1,97 @@
+"""A small database-backed job queue.
+
+Functions decorated with ``@task`` can be queued with ``enqueue()``; the
+call returns as soon as the ``Job`` row is written. ``manage.py run_jobs``
+executes due jobs. A failed job is retried with exponential backoff
+(``JOBS_RETRY_DELAY * 2 ** (attempts - 1)`` seconds) until it has used
+``max_attempts``, then left in the ``failed`` state with its traceback.
+
+Jobs are claimed with a conditional UPDATE, so several workers can share
+the table on any database without ``SELECT ... FOR UPDATE``.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func=None, *, name=None):
+    """Register ``func`` as a job handler, under ``app.function`` by default."""
+    def register(func):
+        task_name = name or f"{func.__module__.split('.')[0]}.{func.__name__}"
+        registry[task_name] = func
+        func.task_name = task_name
+        return func
+    return register(func) if func is not None else register
+
+
+def enqueue(func, *, delay=0, max_attempts=None, **kwargs):
+    """Queue ``func(**kwargs)``. Arguments must be JSON-serialisable."""
+    task_name = getattr(func, 'task_name', func)
+    if task_name not in registry:
+        raise KeyError(f"Unknown task {task_name!r}")
+    return Job.objects.create(
+        name=task_name,
+        payload=kwargs,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+
+def due_jobs(now):
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    return Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim(job, now):
+    """Atomically move ``job`` to running; False if another worker got it first."""
+    claimed = Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+        status=Job.RUNNING, locked_at=now, attempts=job.attempts + 1,
+    )
+    if claimed:
+        job.status, job.locked_at, job.attempts = Job.RUNNING, now, job.attempts + 1
+    return bool(claimed)
+
+
+def run_job(job):
+    try:
+        registry[job.name](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s failed after %s attempts", job, job.attempts)
+        else:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1))
+            logger.warning("Job %s failed, retrying at %s", job, job.run_after)
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=['status', 'run_after', 'locked_at', 'last_error', 'finished_at'])
+    return job.status
+
+
+def run_pending(limit=100):
+    """Run up to ``limit`` due jobs; returns the number of jobs executed."""
+    now = timezone.now()
+    count = 0
+    for job in due_jobs(now).order_by('run_after', 'pk')[:limit]:
+        if claim(job, now):
+            run_job(job)
+            count += 1
+    return count
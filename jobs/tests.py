@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Job
+from .queue import enqueue, run_pending, task
+
+calls = []
+
+
+@task(name='jobs.flaky')
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_contact_form_is_queued_then_sent_by_worker(self):
+        response = self.client.post(reverse('contact'), {
+            'name': 'Amina', 'email': 'amina@example.com', 'subject': 'Question',
+            'message': 'Bonjour', 'consent': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.get().name, 'jobs.send_mail')
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Contact Form: Question')
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue(flaky, fail_times=1)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(run_pending(), 0)  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now() - timedelta(seconds=1))
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+    def test_job_fails_after_max_attempts(self):
+        job = enqueue(flaky, fail_times=10, max_attempts=1)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('RuntimeError', job.last_error)
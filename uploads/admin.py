@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import PdfInfo, Upload
+
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'owner', 'purpose', 'status', 'received', 'size', 'updated_at')
+    list_filter = ('status', 'purpose')
+    list_select_related = ('owner',)
+    readonly_fields = ('received', 'locked_at')
+
+
+@admin.register(PdfInfo)
+class PdfInfoAdmin(admin.ModelAdmin):
+    list_display = ('blob', 'status', 'pages', 'processed_at')
+    list_filter = ('status',)
+    exclude = ('thumbnail',)
+    readonly_fields = ('blob', 'status', 'pages', 'text', 'error', 'processed_at')
@@ -0,0 +1,151 @@
+"""Resumable chunked uploads.
+
+A client uploads a file in several short requests instead of one long
+multipart POST:
+
+1. ``POST /uploads/`` with ``purpose``, ``filename`` and ``size`` creates an
+   ``Upload``. The name and declared size are checked against the rules of
+   the purpose before a single byte is sent.
+2. ``PATCH /uploads/<id>/`` sends the next chunk as the raw request body,
+   with ``Upload-Offset`` (where the chunk starts) and optionally
+   ``Upload-Checksum: sha256 <hex>``. The body is streamed to the partial
+   file in ``UPLOAD_TEMP_DIR``; nothing is buffered in memory or copied
+   through Django's upload handlers. The first chunk must start with the
+   file type's magic bytes.
+3. ``HEAD /uploads/<id>/`` returns the current ``Upload-Offset`` so an
+   interrupted upload resumes where it stopped.
+
+Once every byte is received the upload is complete, and forms refer to it
+by id (see ``uploads.forms.UploadChoiceField``); ``Upload.attach()`` then
+moves the file into the model's storage.
+
+Chunks are claimed with a conditional UPDATE on ``received`` (as jobs are
+in ``jobs.queue``), so two requests can never write the same offset.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Upload
+
+READ_SIZE = 64 * 1024
+
+MAGIC = {
+    '.pdf': b'%PDF-',
+    '.docx': b'PK\x03\x04',
+}
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+class ChecksumMismatch(UploadError):
+    status = 460  # as in the tus protocol
+
+
+class TooLarge(UploadError):
+    status = 413
+
+
+def rules(purpose):
+    """Allowed extensions and maximum size for a purpose."""
+    if purpose == Upload.COURSE:
+        return ('.pdf',), settings.UPLOAD_COURSE_MAX_SIZE
+    return ('.pdf', '.docx'), settings.SUBMISSION_MAX_SIZE
+
+
+def check_declaration(purpose, filename, size):
+    extensions, max_size = rules(purpose)
+    if not filename.lower().endswith(extensions):
+        raise UploadError(f"Extensions acceptées : {', '.join(extensions)}.")
+    if size <= 0:
+        raise UploadError("Fichier vide.")
+    if size > max_size:
+        raise TooLarge(f"La taille du fichier ne doit pas dépasser {max_size // (1024 * 1024)} Mo.")
+
+
+def check_magic(filename, head):
+    magic = MAGIC.get(os.path.splitext(filename)[1].lower())
+    if magic and not head.startswith(magic):
+        raise UploadError("Le contenu ne correspond pas au type du fichier.")
+
+
+def parse_checksum(header):
+    """The expected hex digest from ``Upload-Checksum: sha256 <hex>``, or None."""
+    if not header:
+        return None
+    algorithm, _, digest = header.partition(' ')
+    if algorithm.lower() != 'sha256' or not digest:
+        raise UploadError("Seul Upload-Checksum: sha256 <hex> est accepté.")
+    return digest.strip().lower()
+
+
+def claim(upload, offset, now):
+    """Lock ``upload`` for a chunk starting at ``offset``; False if that is not possible."""
+    stale = now - timedelta(seconds=settings.UPLOAD_LOCK_TIMEOUT)
+    return Upload.objects.filter(
+        Q(locked_at__isnull=True) | Q(locked_at__lt=stale),
+        pk=upload.pk, status=Upload.OPEN, received=offset,
+    ).update(locked_at=now)
+
+
+def write_chunk(upload, offset, stream, length, checksum=None):
+    """Append ``length`` bytes read from ``stream`` at ``offset``; return the new offset."""
+    if upload.status != Upload.OPEN or offset != upload.received:
+        raise OffsetMismatch("Upload-Offset ne correspond pas.")
+    if length > settings.UPLOAD_CHUNK_SIZE:
+        raise TooLarge(f"Un morceau ne doit pas dépasser {settings.UPLOAD_CHUNK_SIZE} octets.")
+    if offset + length > upload.size:
+        raise TooLarge("Le morceau dépasse la taille annoncée.")
+    if not claim(upload, offset, timezone.now()):
+        raise OffsetMismatch("Un autre envoi est en cours pour ce fichier.")
+
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+        with open(upload.partial_path, 'ab') as f:
+            # A request that died mid-write may have left bytes past the offset.
+            f.truncate(offset)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                if offset == 0 and written == 0:
+                    check_magic(upload.filename, data)
+                digest.update(data)
+                f.write(data)
+                written += len(data)
+            if written != length:
+                raise UploadError("Morceau incomplet.")
+            if checksum is not None and digest.hexdigest() != checksum:
+                raise ChecksumMismatch("Somme de contrôle invalide.")
+    except Exception:
+        with open(upload.partial_path, 'ab') as f:
+            f.truncate(offset)
+        Upload.objects.filter(pk=upload.pk).update(locked_at=None)
+        raise
+
+    upload.received = offset + written
+    upload.status = Upload.COMPLETE if upload.received == upload.size else Upload.OPEN
+    upload.locked_at = None
+    upload.save(update_fields=['received', 'status', 'locked_at', 'updated_at'])
+    return upload.received
+
+
+def purge(older_than):
+    """Delete uploads (and their partial files) untouched since ``older_than``."""
+    count = 0
+    for upload in Upload.objects.filter(updated_at__lt=older_than).iterator():
+        upload.delete()
+        count += 1
+    return count
@@ -0,0 +1,17 @@
+from django import forms
+
+from .models import Upload
+
+
+class UploadChoiceField(forms.ModelChoiceField):
+    """Hidden field holding the id of a finished chunked upload."""
+    widget = forms.HiddenInput
+
+    def __init__(self, purpose, **kwargs):
+        kwargs.setdefault('required', False)
+        self.purpose = purpose
+        # Nothing is selectable until the form says whose uploads to accept.
+        super().__init__(Upload.objects.none(), **kwargs)
+
+    def limit_to(self, user):
+        self.queryset = Upload.objects.filter(owner=user, purpose=self.purpose, status=Upload.COMPLETE)
@@ -0,0 +1,70 @@
+"""Resizing one image into its variants.
+
+Runs in the worker processes of ``uploads.images.backfill()`` as well as
+in jobs, so it imports neither Django nor the models. Needs Pillow.
+"""
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+WEBP = 'webp'
+JPEG = 'jpg'
+PNG = 'png'
+SAVE_FORMATS = {WEBP: 'WEBP', JPEG: 'JPEG', PNG: 'PNG'}
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def targets(width, widths):
+    """Variant widths for an image ``width`` pixels wide: never upscaled, at most ``max(widths)``."""
+    return sorted({min(target, width) for target in widths}, reverse=True)
+
+
+def save(image, path, extension, quality):
+    # Written aside then renamed: a variant is never seen half written.
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            options = {'optimize': True} if extension == PNG else {'quality': quality}
+            if extension == JPEG:
+                options.update(optimize=True, progressive=True)
+            image.save(f, SAVE_FORMATS[extension], **options)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def render(source, directory, widths, quality):
+    """Write ``<width>.webp`` and ``<width>.jpg`` (``.png`` for transparent images)
+    into ``directory`` for each variant width of ``source``; return the file names.
+    """
+    with Image.open(source) as image:
+        if image.format == 'JPEG':
+            image.draft('RGB', (max(widths), max(widths)))  # decode at a reduced scale, still large enough
+        image = ImageOps.exif_transpose(image)
+        fallback = PNG if has_alpha(image) else JPEG
+        image = image.convert('RGBA' if fallback == PNG else 'RGB')
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        # Largest first: each variant is resized from the previous one.
+        for width in targets(image.width, widths):
+            if width < image.width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            for extension in (WEBP, fallback):
+                name = f'{width}.{extension}'
+                save(image, os.path.join(directory, name), extension, quality)
+                written.append(name)
+        return written
+
+
+def try_render(source, directory, widths, quality):
+    """``render()``, returning the error message (None on success) instead of raising."""
+    try:
+        render(source, directory, widths, quality)
+    except Exception as error:  # Pillow raises many types for damaged or unsupported files
+        return f'{type(error).__name__}: {error}'
+    return None
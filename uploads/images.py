@@ -0,0 +1,102 @@
+"""Resized WebP/JPEG variants of the images in MEDIA_ROOT, for ``srcset``.
+
+The variants of ``profile_pics/me.jpg`` are ``variants/profile_pics/me.jpg/<width>.webp``
+plus a JPEG (PNG for transparent images) at each width: ``IMAGE_WIDTHS``
+capped at the image's own width, so a small logo gets a single,
+recompressed variant. Names are derived from the image's name, so no table
+records them; ``{% picture %}`` (``uploads.templatetags.images``) lists the
+directory, cached until it changes, and falls back to the original while
+no variant exists.
+
+Profile pictures get theirs from a job queued when they are saved (see
+``enseignants.signals``). ``manage.py build_image_variants`` fills in the
+rest of the public images (``IMAGE_DIRS``) in a pool of ``IMAGE_WORKERS`` processes, skipping
+images whose variants are newer than they are.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import image_variants
+
+VARIANT_DIR = 'variants'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# Public images only: files served through access checks (submissions, course
+# material, CVs) must not get public variants.
+IMAGE_DIRS = ('', 'profile_pics')  # MEDIA_ROOT itself (logos) and UserProfile.profile_picture
+
+
+def variant_dir(name):
+    return os.path.join(settings.MEDIA_ROOT, VARIANT_DIR, name)
+
+
+def make_variants(name):
+    """(Re)write the variants of the image ``name``; return their file names."""
+    return image_variants.render(os.path.join(settings.MEDIA_ROOT, name), variant_dir(name),
+                                 settings.IMAGE_WIDTHS, settings.IMAGE_QUALITY)
+
+
+def variants(name):
+    """``{extension: [(width, url)]}`` of the variants of ``name``, smallest first."""
+    directory = variant_dir(name)
+    try:
+        # Renaming a variant into place changes the directory: the cache key.
+        changed = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    return listing(name, directory, changed)
+
+
+@lru_cache(maxsize=1024)
+def listing(name, directory, changed):
+    found = {}
+    for entry in os.listdir(directory):
+        width, _, extension = entry.partition('.')
+        if width.isdigit() and extension in image_variants.SAVE_FORMATS:
+            url = default_storage.url(f'{VARIANT_DIR}/{name}/{entry}')
+            found.setdefault(extension, []).append((int(width), url))
+    return {extension: sorted(urls) for extension, urls in found.items()}
+
+
+def is_stale(name):
+    try:
+        return os.stat(variant_dir(name)).st_mtime < os.stat(os.path.join(settings.MEDIA_ROOT, name)).st_mtime
+    except FileNotFoundError:
+        return True
+
+
+def media_images():
+    """Names of the images in the ``IMAGE_DIRS`` of MEDIA_ROOT."""
+    for directory in IMAGE_DIRS:
+        try:
+            entries = os.scandir(os.path.join(settings.MEDIA_ROOT, directory))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield f'{directory}/{entry.name}' if directory else entry.name
+
+
+def backfill(workers=None, force=False):
+    """Make the missing or outdated variants of every media image.
+
+    Returns ``(count, failures)``: the number of images processed and
+    ``{name: error}`` for those that could not be read.
+    """
+    names = [name for name in media_images() if force or is_stale(name)]
+    job = partial(image_variants.try_render, widths=settings.IMAGE_WIDTHS, quality=settings.IMAGE_QUALITY)
+    sources = [os.path.join(settings.MEDIA_ROOT, name) for name in names]
+    directories = [variant_dir(name) for name in names]
+    workers = min(workers or settings.IMAGE_WORKERS, len(names))
+    if workers <= 1:
+        errors = list(map(job, sources, directories))
+    else:
+        # Workers only get paths and return messages: spawn keeps them free of Django state.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            errors = list(pool.map(job, sources, directories, chunksize=8))
+    return len(names), {name: error for name, error in zip(names, errors) if error}
@@ -0,0 +1,119 @@
+"""Reference recounting, garbage collection and migration for deduplicated media.
+
+Used by ``manage.py gc_media`` and ``manage.py dedupe_media``; see
+``uploads.storage`` for the storage layout.
+"""
+import os
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Blob
+from .storage import content_addressed_fields, content_addressed_storage, digest_of, file_digest
+
+
+def stored_names(model, name):
+    """Non-empty file names stored in ``model.<name>``, as ``(pk, name)``."""
+    return (model._default_manager.exclude(**{f'{name}__isnull': True}).exclude(**{name: ''})
+            .values_list('pk', name).iterator(chunk_size=2000))
+
+
+def is_referenced(digest):
+    return any(
+        model._default_manager.filter(**{f'{name}__contains': f'/{digest}/'}).exists()
+        for model, name in content_addressed_fields()
+    )
+
+
+def recount():
+    """Set every ``Blob.refcount`` to the number of rows using it; return how many changed."""
+    counts = Counter()
+    for model, name in content_addressed_fields():
+        for _, value in stored_names(model, name):
+            digest = digest_of(value)
+            if digest:
+                counts[digest] += 1
+    changed = []
+    for blob in Blob.objects.only('sha256', 'refcount').iterator(chunk_size=2000):
+        if blob.refcount != counts[blob.sha256]:
+            blob.refcount = counts[blob.sha256]
+            changed.append(blob)
+    Blob.objects.bulk_update(changed, ['refcount'], batch_size=500)
+    return len(changed)
+
+
+def collect_garbage(storage, grace=timedelta(hours=1)):
+    """Delete unreferenced blobs older than ``grace``; return ``(count, bytes)`` freed.
+
+    Recent blobs are kept: their row may not be committed yet.
+    """
+    count = freed = 0
+    candidates = Blob.objects.filter(refcount=0, created_at__lt=timezone.now() - grace)
+    for blob in candidates.iterator():
+        # A file saved since the recount must not be lost.
+        if is_referenced(blob.sha256):
+            continue
+        if Blob.objects.filter(pk=blob.pk, refcount=0).delete()[0]:
+            storage.remove_blob(blob.sha256)
+            count += 1
+            freed += blob.size
+    return count, freed
+
+
+def dedupe_existing(dry_run=False, log=None):
+    """Move files stored before ``ContentAddressedStorage`` into it.
+
+    The files are copied into blobs first, then every row is pointed at
+    its blob in one transaction, and the originals are only removed after
+    it: an interrupted run leaves the rows on files that still exist, and
+    running again picks up where it stopped.
+
+    Returns a dict with the number of ``files`` and ``missing`` files, and
+    the space used ``before`` and ``after`` (bytes).
+    """
+    report = {'files': 0, 'missing': 0, 'before': 0, 'after': 0}
+    digests = {}   # legacy path -> (digest, size); a file may be used by several rows
+    new_blobs = set()
+    renames = defaultdict(list)  # (model, field name, new name) -> pks
+    references = Counter()
+    for model, field_name in content_addressed_fields():
+        storage = model._meta.get_field(field_name).storage
+        for pk, name in stored_names(model, field_name):
+            if digest_of(name):
+                continue
+            path = storage.path(name)
+            if path not in digests:
+                if not os.path.exists(path):
+                    report['missing'] += 1
+                    if log:
+                        log(f"Missing: {name}")
+                    continue
+                with open(path, 'rb') as f:
+                    # Copied, not moved: the rows still use the original.
+                    digest, size = file_digest(File(f)) if dry_run else storage.store(File(f))
+                digests[path] = digest, size
+                report['before'] += size
+                if digest not in new_blobs and not Blob.objects.filter(pk=digest).exists():
+                    new_blobs.add(digest)
+                    report['after'] += size
+            digest, size = digests[path]
+            report['files'] += 1
+            renames[model, field_name, storage.name_for(name, digest)].append(pk)
+            references[digest, size] += 1
+    if dry_run:
+        return report
+
+    with transaction.atomic():
+        for (model, field_name, name), pks in renames.items():
+            model._default_manager.filter(pk__in=pks).update(**{field_name: name})
+        for (digest, size), count in references.items():
+            content_addressed_storage().add_reference(digest, size, count)
+    for path in digests:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return report
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from uploads.images import backfill
+
+
+class Command(BaseCommand):
+    help = "Make the missing or outdated resized variants of the public media images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Worker processes (default: IMAGE_WORKERS).")
+        parser.add_argument('--force', action='store_true', help="Rebuild the variants of every image.")
+
+    def handle(self, *args, **options):
+        count, failures = backfill(workers=options['workers'], force=options['force'])
+        for name, error in failures.items():
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(f"{count - len(failures)} image(s) processed, {len(failures)} failed.")
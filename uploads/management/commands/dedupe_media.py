@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from uploads.maintenance import dedupe_existing
+
+
+class Command(BaseCommand):
+    help = "Move existing course files, submissions and CVs to the deduplicated storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the space that would be saved.")
+
+    def handle(self, *args, **options):
+        report = dedupe_existing(dry_run=options['dry_run'], log=self.stderr.write)
+        saved = report['before'] - report['after']
+        self.stdout.write(
+            f"{report['files']} file(s), {report['missing']} missing. "
+            f"Before: {report['before'] / 1024 / 1024:.1f} Mo, after: {report['after'] / 1024 / 1024:.1f} Mo, "
+            f"saved: {saved / 1024 / 1024:.1f} Mo"
+            + (" (dry run)" if options['dry_run'] else "")
+        )
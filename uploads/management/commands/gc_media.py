@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from uploads.maintenance import collect_garbage, recount
+from uploads.storage import content_addressed_storage
+
+
+class Command(BaseCommand):
+    help = "Recount references to deduplicated media files and delete the unused ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60,
+                            help="Keep unused files younger than this many minutes.")
+
+    def handle(self, *args, **options):
+        changed = recount()
+        count, freed = collect_garbage(content_addressed_storage(), grace=timedelta(minutes=options['grace']))
+        self.stdout.write(f"{changed} reference count(s) corrected, "
+                          f"{count} file(s) deleted, {freed / 1024 / 1024:.1f} Mo freed.")
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from uploads import pdf_extract, pdfs
+
+
+class Command(BaseCommand):
+    help = "Extract page counts, thumbnails and text from the uploaded PDFs not processed yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process the pending files once and exit.")
+        parser.add_argument('--sleep', type=float, default=10.0, help="Seconds to wait when nothing is pending.")
+        parser.add_argument('--batch', type=int, default=100, help="Files saved per pass.")
+        parser.add_argument('--workers', type=int, help="Worker processes (default: PDF_WORKERS).")
+        parser.add_argument('--retry-failed', action='store_true', help="Read the files that failed before again.")
+
+    def handle(self, *args, **options):
+        if pdf_extract.pdfium is None:
+            raise CommandError("process_pdfs needs pypdfium2 (pip install pypdfium2).")
+        if options['retry_failed']:
+            self.stdout.write(f"{pdfs.forget_failed()} failed file(s) to retry.")
+        executor = pdfs.pool(options['workers'])
+        try:
+            while True:
+                count = pdfs.process_pending(limit=options['batch'], executor=executor)
+                if count:
+                    self.stdout.write(f"{count} file(s) processed.")
+                if options['once'] and count < options['batch']:
+                    break
+                if not count:
+                    time.sleep(options['sleep'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from uploads.chunks import purge
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that were abandoned or never attached."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.UPLOAD_EXPIRY_HOURS,
+                            help="Age (since the last chunk) after which an upload is dropped.")
+
+    def handle(self, *args, **options):
+        count = purge(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(f"{count} upload(s) deleted.")
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0002_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfInfo',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pdf', serialize=False, to='uploads.blob')),
+                ('status', models.CharField(choices=[('done', 'Traité'), ('not_pdf', 'Pas un PDF'), ('failed', 'Échec')], max_length=10)),
+                ('pages', models.PositiveIntegerField(blank=True, null=True)),
+                ('thumbnail', models.BinaryField(blank=True, default=b'')),
+                ('text', models.TextField(blank=True, default='')),
+                ('error', models.TextField(blank=True, default='')),
+                ('processed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status'], name='pdfinfo_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.db import models
+
+
+class PartialFile(File):
+    """A finished upload, moved (not copied) into place by ``FileSystemStorage``."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class Upload(models.Model):
+    COURSE = 'course'
+    SUBMISSION = 'submission'
+    PURPOSE_CHOICES = [
+        (COURSE, 'Support de cours'),
+        (SUBMISSION, 'Devoir'),
+    ]
+    OPEN = 'open'
+    COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (OPEN, 'En cours'),
+        (COMPLETE, 'Terminé'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.UPLOAD_TEMP_DIR, self.id.hex)
+
+    def attach(self, instance, field_name):
+        """Store the finished file in ``instance.<field_name>`` and forget the upload.
+
+        ``instance`` is not saved.
+        """
+        if self.status != self.COMPLETE:
+            raise ValueError(f"Upload {self.pk} is not complete")
+        with open(self.partial_path, 'rb') as f:
+            getattr(instance, field_name).save(self.filename, PartialFile(f, name=f.name), save=False)
+        self.delete()
+
+
+class Blob(models.Model):
+    """One stored file of ``ContentAddressedStorage`` and how many names use it."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refcount'], name='blob_refcount_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.refcount} ref.)"
+
+
+class PdfInfo(models.Model):
+    """What ``manage.py process_pdfs`` extracted from a blob (see uploads.pdfs)."""
+    DONE = 'done'
+    NOT_PDF = 'not_pdf'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (DONE, 'Traité'),
+        (NOT_PDF, 'Pas un PDF'),
+        (FAILED, 'Échec'),
+    ]
+
+    blob = models.OneToOneField(Blob, on_delete=models.CASCADE, primary_key=True, related_name='pdf')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    pages = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.BinaryField(blank=True, default=b'')  # WEBP of the first page
+    text = models.TextField(blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    processed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='pdfinfo_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.blob_id[:12]} ({self.get_status_display()})"
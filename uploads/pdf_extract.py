@@ -0,0 +1,78 @@
+"""Reading one PDF: page count, first-page thumbnail and text.
+
+Runs in the worker processes of ``uploads.pdfs``, so it imports neither
+Django nor the models: workers are started with ``spawn`` and never
+share the database connections of the command.
+
+Needs ``pypdfium2`` (and Pillow, for the thumbnail).
+"""
+from io import BytesIO
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+DONE = 'done'
+NOT_PDF = 'not_pdf'
+FAILED = 'failed'
+PDF_MAGIC = b'%PDF-'
+THUMBNAIL_QUALITY = 70
+
+
+def page_text(page):
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range()
+    finally:
+        textpage.close()
+
+
+def thumbnail(page, width):
+    """The page rendered ``width`` pixels wide, as WEBP bytes."""
+    image = page.render(scale=width / page.get_width()).to_pil()
+    buffer = BytesIO()
+    image.save(buffer, 'WEBP', quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def extract(path, thumbnail_width, max_chars):
+    """``{'status', 'pages', 'thumbnail', 'text', 'error'}`` for the file at ``path``.
+
+    Files without the PDF signature are ``NOT_PDF``. Text is read page by
+    page until ``max_chars`` characters. Errors (unreadable, encrypted or
+    malformed file) are returned as ``FAILED``, never raised.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(1024)
+    except OSError as error:
+        return {'status': FAILED, 'error': str(error)}
+    if PDF_MAGIC not in head:
+        return {'status': NOT_PDF}
+    try:
+        document = pdfium.PdfDocument(path)
+        try:
+            texts, length = [], 0
+            for index in range(len(document)):
+                if length >= max_chars:
+                    break
+                page = document[index]
+                try:
+                    if index == 0:
+                        image = thumbnail(page, thumbnail_width)
+                    text = page_text(page)
+                finally:
+                    page.close()
+                texts.append(text.replace('\x00', ''))  # PostgreSQL text cannot hold NUL
+                length += len(text)
+            return {
+                'status': DONE,
+                'pages': len(document),
+                'thumbnail': image if texts else b'',
+                'text': '\n'.join(texts)[:max_chars],
+            }
+        finally:
+            document.close()
+    except Exception as error:  # pdfium raises PdfiumError, but a bad file can fail anywhere
+        return {'status': FAILED, 'error': f'{type(error).__name__}: {error}'}
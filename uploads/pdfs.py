@@ -0,0 +1,84 @@
+"""Page counts, thumbnails and text of the stored PDFs, extracted offline.
+
+``manage.py process_pdfs`` reads every ``Blob`` once and records what it
+found in a ``PdfInfo`` row keyed by the blob's SHA-256: a file uploaded
+several times, or under several names, is processed once, and each pass
+only picks the blobs that have no row yet. Files that are not PDFs are
+recorded as such and failures with their error; ``forget_failed()``
+(``--retry-failed``) makes those pending again.
+
+Extraction (``uploads.pdf_extract``) runs in a pool of ``PDF_WORKERS``
+processes started with ``spawn``: workers get a path and return plain
+data, only the command touches the database. Results are saved per batch
+and announced with ``uploads.signals.pdfs_processed``, which reindexes the
+formations using them (see ``enseignants.signals``).
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from . import pdf_extract
+from .models import Blob, PdfInfo
+from .signals import pdfs_processed
+from .storage import content_addressed_storage
+
+
+def pool(workers=None):
+    """A process pool for ``process_pending()``, or None to extract in this process."""
+    workers = workers or settings.PDF_WORKERS
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def pending(limit):
+    """SHA-256 of up to ``limit`` referenced blobs never processed, oldest first."""
+    return list(Blob.objects.filter(refcount__gt=0, pdf__isnull=True)
+                .order_by('created_at').values_list('sha256', flat=True)[:limit])
+
+
+def extract_all(digests, executor=None):
+    storage = content_addressed_storage()
+    paths = [storage.blob_path(digest) for digest in digests]
+    job = partial(pdf_extract.extract, thumbnail_width=settings.PDF_THUMBNAIL_WIDTH,
+                  max_chars=settings.PDF_TEXT_MAX_CHARS)
+    if executor is None:
+        return list(map(job, paths))
+    return list(executor.map(job, paths))
+
+
+def save(digests, results):
+    """Store one ``PdfInfo`` per result; return the digests of the PDFs read."""
+    with transaction.atomic():
+        # Blobs collected by gc_media while they were being read are skipped.
+        existing = set(Blob.objects.filter(sha256__in=digests).values_list('sha256', flat=True))
+        PdfInfo.objects.bulk_create([
+            PdfInfo(
+                blob_id=digest, status=result['status'], pages=result.get('pages'),
+                thumbnail=result.get('thumbnail', b''), text=result.get('text', ''),
+                error=result.get('error', ''),
+            )
+            for digest, result in zip(digests, results) if digest in existing
+        ], ignore_conflicts=True)
+    return [digest for digest, result in zip(digests, results)
+            if digest in existing and result['status'] == PdfInfo.DONE]
+
+
+def process_pending(limit=100, executor=None):
+    """Process up to ``limit`` pending blobs with ``executor`` (see ``pool()``); return how many."""
+    digests = pending(limit)
+    if not digests:
+        return 0
+    done = save(digests, extract_all(digests, executor))
+    if done:
+        pdfs_processed.send(sender=PdfInfo, digests=done)
+    return len(digests)
+
+
+def forget_failed():
+    """Make the files that could not be read pending again; return how many."""
+    count, _ = PdfInfo.objects.filter(status=PdfInfo.FAILED).delete()
+    return count
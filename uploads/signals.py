@@ -0,0 +1,34 @@
+import os
+from collections import defaultdict
+
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Upload
+from .storage import content_addressed_fields
+
+# Sent by uploads.pdfs with ``digests``, the blobs just read as PDFs.
+pdfs_processed = Signal()
+
+
+@receiver(post_delete, sender=Upload)
+def remove_partial_file(sender, instance, **kwargs):
+    try:
+        os.remove(instance.partial_path)
+    except FileNotFoundError:
+        pass  # already moved into place by attach()
+
+
+def release_files(sender, instance, **kwargs):
+    """Drop the blob references of a deleted row (see uploads.storage)."""
+    for name in DEDUPLICATED_FIELDS[sender]:
+        fieldfile = getattr(instance, name)
+        if fieldfile:
+            fieldfile.storage.delete(fieldfile.name)
+
+
+DEDUPLICATED_FIELDS = defaultdict(list)
+for model, name in content_addressed_fields():
+    DEDUPLICATED_FIELDS[model].append(name)
+for model in DEDUPLICATED_FIELDS:
+    post_delete.connect(release_files, sender=model, dispatch_uid=f'uploads.release_files.{model._meta.label}')
@@ -0,0 +1,145 @@
+"""Content-addressed, deduplicated storage for course files, submissions and CVs.
+
+Every file is stored once per SHA-256 under ``MEDIA_ROOT/blobs/<ab>/<sha256>``.
+The name saved in the database stays readable and keeps the field's
+``upload_to`` and the original file name: ``courses/td/<sha256>/cours.pdf``.
+Any number of names can point to the same blob.
+
+Each ``Blob`` row counts its references: saving a file adds one, deleting
+a row that uses it (see ``uploads.signals``) or calling ``storage.delete()``
+removes one. Unreferenced blobs are only removed by ``manage.py gc_media``,
+which first recounts references from the database, so a count that drifted
+(a file replaced in a form, a row deleted with ``QuerySet.update``) never
+loses data. ``manage.py dedupe_media`` moves files stored before this
+backend into it.
+
+Fields opt in with ``storage=content_addressed_storage``.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db.models import F, FileField
+
+from .models import Blob
+
+BLOB_DIR = 'blobs'
+NAME_RE = re.compile(r'(?:^|/)([0-9a-f]{64})/[^/]+$')
+READ_SIZE = 64 * 1024
+MAX_NAME_LENGTH = 255
+
+
+def content_addressed_storage():
+    """The storage used by deduplicated fields (``STORAGES['content_addressed']``)."""
+    return storages['content_addressed']
+
+
+def digest_of(name):
+    """The SHA-256 a stored name points to, or None for a plain (legacy) name."""
+    match = NAME_RE.search(name)
+    return match.group(1) if match else None
+
+
+def file_digest(content):
+    sha = hashlib.sha256()
+    size = 0
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(READ_SIZE):
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, digest):
+        return posixpath.join(BLOB_DIR, digest[:2], digest)
+
+    def blob_path(self, digest):
+        return super().path(self.blob_name(digest))
+
+    def path(self, name):
+        digest = digest_of(name)
+        return super().path(self.blob_name(digest) if digest else name)
+
+    def url(self, name):
+        digest = digest_of(name)
+        return super().url(self.blob_name(digest) if digest else name)
+
+    def get_available_name(self, name, max_length=None):
+        # Names are made unique by the digest added in _save().
+        return name
+
+    def _save(self, name, content):
+        digest, size = self.store(content)
+        self.add_reference(digest, size)
+        return self.name_for(name, digest)
+
+    def name_for(self, name, digest):
+        """The stored name of ``name`` once its content is known: ``<dir>/<sha256>/<file>``."""
+        directory, filename = posixpath.split(name)
+        prefix = posixpath.join(directory, digest) + '/'
+        if len(prefix) + len(filename) > MAX_NAME_LENGTH:
+            root, ext = posixpath.splitext(filename)
+            filename = root[:MAX_NAME_LENGTH - len(prefix) - len(ext)] + ext
+        return prefix + filename
+
+    def store(self, content):
+        """Write the blob of ``content`` unless it exists; return ``(digest, size)``.
+
+        Content with a ``temporary_file_path()`` is moved rather than copied.
+        """
+        digest, size = file_digest(content)
+        full_path = self.blob_path(digest)
+        if not os.path.exists(full_path):
+            self.write_blob(full_path, content)
+        elif hasattr(content, 'temporary_file_path'):
+            os.remove(content.temporary_file_path())
+        return digest, size
+
+    def write_blob(self, full_path, content):
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            # Identical content may land concurrently: overwriting is harmless.
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        else:
+            tmp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                for chunk in content.chunks(READ_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def add_reference(self, digest, size, count=1):
+        _, created = Blob.objects.get_or_create(sha256=digest, defaults={'size': size, 'refcount': count})
+        if not created:
+            Blob.objects.filter(pk=digest).update(refcount=F('refcount') + count)
+
+    def delete(self, name):
+        digest = digest_of(name)
+        if digest is None:
+            return super().delete(name)
+        # The blob itself is removed by gc_media once nothing uses it.
+        Blob.objects.filter(pk=digest, refcount__gt=0).update(refcount=F('refcount') - 1)
+
+    def remove_blob(self, digest):
+        try:
+            os.remove(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+
+def content_addressed_fields():
+    """``(model, field name)`` for every FileField stored with this backend."""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
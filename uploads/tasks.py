@@ -0,0 +1,8 @@
+from jobs.queue import task
+
+from .images import make_variants
+
+
+@task
+def make_image_variants(name):
+    make_variants(name)
@@ -0,0 +1,36 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from uploads.image_variants import WEBP
+from uploads.images import variants
+
+register = template.Library()
+
+
+def srcset(urls):
+    return ', '.join(f'{url} {width}w' for width, url in urls)
+
+
+@register.simple_tag
+def picture(image, alt='', sizes='100vw', **attrs):
+    """``{% picture profile.profile_picture alt="..." sizes="150px" class="..." %}`` -- a media
+    image (name or ImageField value) with WebP and JPEG/PNG ``srcset`` (see uploads.images).
+
+    Other keyword arguments become attributes of the ``<img>``. Images
+    without variants yet are shown as they are.
+    """
+    name = getattr(image, 'name', image)
+    if not name:
+        return ''
+    found = dict(variants(name))
+    webp = found.pop(WEBP, None)
+    fallback = next(iter(found.values()), None)
+    if not fallback:
+        return format_html('<img src="{}" alt="{}"{}>', default_storage.url(name), alt, flatatt(attrs))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}"{}></picture>',
+        format_html('<source type="image/webp" srcset="{}" sizes="{}">', srcset(webp), sizes) if webp else '',
+        fallback[-1][1], srcset(fallback), sizes, alt, flatatt(attrs),
+    )
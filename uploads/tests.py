@@ -0,0 +1,342 @@
+import hashlib
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from enseignants.forms import CourseForm
+from enseignants.models import Formation, Course, UserProfile
+from etudiant.models import Enrollment, Submission
+from jobs.queue import run_pending
+from .chunks import purge
+from .images import backfill, variants
+from .maintenance import collect_garbage, dedupe_existing, recount
+from enseignants.search import search_formations
+from .models import Blob, PdfInfo, Upload
+from .pdfs import forget_failed, process_pending
+from .storage import ContentAddressedStorage, content_addressed_storage, digest_of
+
+PDF = b'%PDF-1.4\n' + b'0123456789' * 100
+
+
+def text_pdf(text):
+    """A one-page PDF showing ``text``."""
+    stream = f'BT /F1 24 Tf 72 720 Td ({text}) Tj ET'.encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    pdf, offsets = b'%PDF-1.4\n', []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    return pdf + b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name, UPLOAD_TEMP_DIR=os.path.join(self.media.name, 'partial'),
+                                  UPLOAD_CHUNK_SIZE=400)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True, first_name='P', last_name='T')
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=0, teacher=self.teacher)
+        self.client.force_login(self.teacher)
+
+    def start(self, purpose=Upload.COURSE, filename='cours.pdf', size=len(PDF)):
+        return self.client.post(reverse('uploads:create'), {'purpose': purpose, 'filename': filename, 'size': size})
+
+    def send(self, url, offset, data, checksum=None):
+        headers = {'Upload-Offset': str(offset)}
+        if checksum:
+            headers['Upload-Checksum'] = f'sha256 {checksum}'
+        return self.client.patch(url, data, content_type='application/offset+octet-stream', headers=headers)
+
+    def upload(self, data=PDF, **kwargs):
+        state = self.start(size=len(data), **kwargs).json()
+        for offset in range(0, len(data), 400):
+            chunk = data[offset:offset + 400]
+            state = self.send(state['url'], offset, chunk, hashlib.sha256(chunk).hexdigest()).json()
+        self.assertTrue(state['complete'])
+        return Upload.objects.get(pk=state['id'])
+
+    def test_chunks_are_assembled_and_attached_to_the_course(self):
+        upload = self.upload()
+        form = CourseForm({'titre': "Cours 1", 'td_file_upload': str(upload.pk)}, user=self.teacher)
+        self.assertTrue(form.is_valid(), form.errors)
+        course = form.save(commit=False)
+        course.formation = self.formation
+        course.save()
+        course = Course.objects.get(pk=course.pk)
+        self.assertEqual(course.td_file.name, f'courses/td/{hashlib.sha256(PDF).hexdigest()}/cours.pdf')
+        with course.td_file.open('rb') as f:
+            self.assertEqual(f.read(), PDF)
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse(os.path.exists(upload.partial_path))
+
+    def test_resume_after_interruption(self):
+        url = self.start().json()['url']
+        self.send(url, 0, PDF[:400])
+        response = self.client.head(url)
+        self.assertEqual(response['Upload-Offset'], '400')
+        response = self.send(url, 0, PDF[:400])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.send(url, 400, PDF[400:]).status_code, 413)  # larger than a chunk
+        self.send(url, 400, PDF[400:800])
+        self.assertEqual(self.send(url, 800, PDF[800:]).json()['complete'], True)
+
+    def test_bad_checksum_is_discarded(self):
+        url = self.start().json()['url']
+        response = self.send(url, 0, PDF[:400], checksum='0' * 64)
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertEqual(os.path.getsize(Upload.objects.get().partial_path), 0)
+
+    def test_first_chunk_must_be_a_pdf(self):
+        url = self.start().json()['url']
+        self.assertEqual(self.send(url, 0, b'MZ' + PDF[2:400]).status_code, 400)
+
+    def test_declaration_is_validated(self):
+        self.assertEqual(self.start(filename='cours.exe').status_code, 400)
+        with override_settings(UPLOAD_COURSE_MAX_SIZE=100):
+            self.assertEqual(self.start().status_code, 413)
+        self.assertEqual(self.start(purpose=Upload.SUBMISSION).status_code, 403)
+
+    def test_uploads_are_private(self):
+        upload = self.upload()
+        other = User.objects.create_user('autre@example.com', 'pw', is_teacher=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.head(reverse('uploads:chunk', args=[upload.pk])).status_code, 404)
+        form = CourseForm({'titre': "Cours", 'td_file_upload': str(upload.pk)}, user=other)
+        self.assertFalse(form.is_valid())
+
+    def test_student_submission_through_upload(self):
+        course = Course.objects.create(formation=self.formation, titre="Cours")
+        student = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        Enrollment.objects.create(student=student, formation=self.formation)
+        self.client.force_login(student)
+        upload = self.upload(purpose=Upload.SUBMISSION, filename='devoir.pdf')
+        self.client.post(reverse('etudiant:submit_course_assignment', args=[course.pk]),
+                         {'fichier_upload': str(upload.pk)})
+        submission = Submission.objects.get()
+        self.assertRegex(submission.file.name, r'^submissions/[0-9a-f]{64}/devoir\.pdf$')
+
+    def test_purge(self):
+        upload = self.upload()
+        Upload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge(timezone.now() - timedelta(days=1)), 1)
+        self.assertFalse(os.path.exists(upload.partial_path))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.storage = content_addressed_storage()
+        teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True)
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=0, teacher=teacher)
+
+    def course_with(self, filename, content):
+        course = Course.objects.create(formation=self.formation, titre=filename)
+        course.td_file.save(filename, ContentFile(content))
+        return course
+
+    def blob_files(self):
+        return [name for _, _, names in os.walk(os.path.join(self.media.name, 'blobs')) for name in names]
+
+    def test_identical_files_are_stored_once(self):
+        first = self.course_with('td.pdf', PDF)
+        second = self.course_with('copie.pdf', PDF)
+        self.assertNotEqual(first.td_file.name, second.td_file.name)
+        self.assertEqual(first.td_file.path, second.td_file.path)
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        with second.td_file.open('rb') as f:
+            self.assertEqual(f.read(), PDF)
+
+    def test_unreferenced_blobs_are_collected(self):
+        first = self.course_with('td.pdf', PDF)
+        second = self.course_with('copie.pdf', PDF)
+        first.delete()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertEqual(collect_garbage(self.storage, grace=timedelta(0)), (0, 0))
+        # A reference dropped without signals is found by the recount.
+        Course.objects.filter(pk=second.pk).update(td_file='')
+        self.assertEqual(recount(), 1)
+        self.assertEqual(collect_garbage(self.storage, grace=timedelta(0)), (1, len(PDF)))
+        self.assertEqual(self.blob_files(), [])
+
+    def test_existing_media_is_migrated(self):
+        for name in ('courses/td/a.pdf', 'submissions/b.pdf'):
+            os.makedirs(os.path.join(self.media.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media.name, name), 'wb') as f:
+                f.write(PDF)
+        course = Course.objects.create(formation=self.formation, titre="Cours", td_file='courses/td/a.pdf')
+        student = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        submission = Submission.objects.create(course=course, student=student, file='submissions/b.pdf')
+
+        self.assertEqual(dedupe_existing(dry_run=True), {'files': 2, 'missing': 0, 'before': 2 * len(PDF), 'after': len(PDF)})
+        self.assertEqual(dedupe_existing(), {'files': 2, 'missing': 0, 'before': 2 * len(PDF), 'after': len(PDF)})
+        course.refresh_from_db()
+        submission.refresh_from_db()
+        self.assertEqual(course.td_file.path, submission.file.path)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, 'courses/td/a.pdf')))
+        self.assertEqual(dedupe_existing()['files'], 0)
+
+    def test_interrupted_migration_keeps_rows_on_their_files(self):
+        name = 'courses/td/a.pdf'
+        os.makedirs(os.path.join(self.media.name, 'courses/td'))
+        with open(os.path.join(self.media.name, name), 'wb') as f:
+            f.write(PDF)
+        course = Course.objects.create(formation=self.formation, titre="Cours", td_file=name)
+        with mock.patch.object(ContentAddressedStorage, 'add_reference', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                dedupe_existing()
+        course.refresh_from_db()
+        self.assertEqual(course.td_file.name, name)
+        self.assertTrue(os.path.exists(course.td_file.path))
+
+        self.assertEqual(dedupe_existing()['files'], 1)
+        course.refresh_from_db()
+        with course.td_file.open('rb') as f:
+            self.assertEqual(f.read(), PDF)
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+
+class PdfPipelineTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        teacher = User.objects.create_user('prof@example.com', 'pw', is_teacher=True)
+        self.formation = Formation.objects.create(titre="Python", description="d", prix=10, teacher=teacher)
+        self.course = Course.objects.create(formation=self.formation, titre="Bases")
+        self.course.td_file.save('td.pdf', ContentFile(text_pdf('Dictionnaires et comprehensions')))
+        self.course.tp_file.save('tp.txt', ContentFile(b'pas un PDF'))
+        self.course.correction.save('correction.pdf', ContentFile(PDF))  # truncated: no xref
+        self.course.save()
+
+    def info(self, fieldfile):
+        return PdfInfo.objects.get(pk=digest_of(fieldfile.name))
+
+    def test_each_file_is_processed_once(self):
+        self.assertEqual(search_formations('comprehensions'), [])
+        self.assertEqual(process_pending(), 3)
+        td = self.info(self.course.td_file)
+        self.assertEqual((td.status, td.pages), (PdfInfo.DONE, 1))
+        self.assertIn('Dictionnaires', td.text)
+        self.assertEqual(bytes(td.thumbnail[:4]), b'RIFF')
+        self.assertEqual(self.info(self.course.tp_file).status, PdfInfo.NOT_PDF)
+        self.assertEqual(self.info(self.course.correction).status, PdfInfo.FAILED)
+        # The text of the TD is searchable once read.
+        self.assertEqual(search_formations('comprehensions'), [self.formation.pk])
+
+        # Same content under another name: nothing new to read.
+        other = Course.objects.create(formation=self.formation, titre="Copie")
+        other.td_file.save('copie.pdf', ContentFile(text_pdf('Dictionnaires et comprehensions')))
+        self.assertEqual(process_pending(), 0)
+        self.assertEqual(forget_failed(), 1)
+        self.assertEqual(process_pending(), 1)
+
+    def test_command_uses_a_process_pool(self):
+        call_command('process_pdfs', '--once', '--workers', '2', stdout=open(os.devnull, 'w'))
+        self.assertEqual(PdfInfo.objects.filter(status=PdfInfo.DONE).count(), 1)
+        self.assertEqual(PdfInfo.objects.count(), 3)
+
+    def test_catalogue_shows_previews(self):
+        process_pending()
+        student = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        self.client.force_login(student)
+        response = self.client.get(reverse('formations'))
+        preview = reverse('enseignants:course_preview', kwargs={'pk': self.course.pk, 'kind': 'td'})
+        self.assertContains(response, preview)
+        self.assertNotContains(response, reverse('enseignants:course_preview', kwargs={'pk': self.course.pk, 'kind': 'tp'}))
+
+        response = self.client.get(preview)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('private', response['Cache-Control'])
+        response = self.client.get(preview, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse('enseignants:course_preview', kwargs={'pk': self.course.pk, 'kind': 'correction'}))
+        self.assertEqual(response.status_code, 404)
+
+
+def image_bytes(size, mode='RGB', format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, format)
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_WIDTHS=[160, 320, 640, 1280])
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def write(self, name, content):
+        path = os.path.join(self.media.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def test_profile_picture_variants_are_made_by_a_job(self):
+        user = User.objects.create_user('etu@example.com', 'pw', is_student=True)
+        profile = UserProfile.objects.create(user=user)
+        self.assertEqual(run_pending(), 0)  # nothing to resize for the default picture
+        profile.profile_picture.save('photo.jpg', ContentFile(image_bytes((800, 600))))
+        self.assertEqual(run_pending(), 1)
+
+        found = variants(profile.profile_picture.name)
+        self.assertEqual([width for width, _ in found['webp']], [160, 320, 640, 800])  # never upscaled
+        self.assertEqual([width for width, _ in found['jpg']], [160, 320, 640, 800])
+        html = Template('{% load images %}{% picture profile.profile_picture alt="Photo" sizes="120px" %}').render(
+            Context({'profile': profile}))
+        self.assertIn('<source type="image/webp" srcset="/media/variants/profile_pics/photo.jpg/160.webp 160w, ', html)
+        self.assertIn('src="/media/variants/profile_pics/photo.jpg/800.jpg"', html)
+
+    def test_backfill_covers_public_images_once(self):
+        self.write('logo.png', image_bytes((200, 100), 'RGBA', 'PNG'))
+        self.write('profile_pics/old.jpg', image_bytes((2000, 1000)))
+        self.write('profile_pics/broken.jpg', b'not an image')
+        self.write('submissions/scan.jpg', image_bytes((2000, 1000)))  # served with access checks
+
+        count, failures = backfill(workers=1)
+        self.assertEqual((count, list(failures)), (3, ['profile_pics/broken.jpg']))
+        self.assertEqual(sorted(variants('logo.png')), ['png', 'webp'])  # transparency kept
+        self.assertEqual([width for width, _ in variants('profile_pics/old.jpg')['jpg']], [160, 320, 640, 1280])
+        self.assertEqual(variants('submissions/scan.jpg'), {})
+        with Image.open(os.path.join(self.media.name, 'variants/profile_pics/old.jpg/320.webp')) as image:
+            self.assertEqual(image.size, (320, 160))
+        self.assertEqual(backfill(workers=1)[0], 1)  # only the broken one is tried again
+
+        html = Template("{% load images %}{% picture 'profile_pics/missing.jpg' alt='x' %}").render(Context())
+        self.assertEqual(html, '<img src="/media/profile_pics/missing.jpg" alt="x">')
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'uploads'
+
+urlpatterns = [
+    path('', views.create_upload, name='create'),
+    path('<uuid:pk>/', views.upload_chunk, name='chunk'),
+]
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+
+from . import chunks
+from .models import Upload
+
+
+def upload_state(upload):
+    response = JsonResponse({
+        'id': str(upload.pk),
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.status == Upload.COMPLETE,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'url': reverse('uploads:chunk', args=[upload.pk]),
+    })
+    response['Upload-Offset'] = str(upload.received)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def error(exc):
+    return JsonResponse({'error': str(exc)}, status=exc.status)
+
+
+@login_required
+@require_POST
+def create_upload(request):
+    purpose = request.POST.get('purpose')
+    filename = request.POST.get('filename', '')[:255]
+    if purpose not in (Upload.COURSE, Upload.SUBMISSION):
+        return JsonResponse({'error': "purpose invalide."}, status=400)
+    if purpose == Upload.COURSE and not (request.user.is_teacher or request.user.is_superuser):
+        return JsonResponse({'error': "Réservé aux enseignants."}, status=403)
+    if purpose == Upload.SUBMISSION and not request.user.is_student:
+        return JsonResponse({'error': "Réservé aux étudiants."}, status=403)
+    try:
+        size = int(request.POST.get('size', ''))
+        chunks.check_declaration(purpose, filename, size)
+    except ValueError:
+        return JsonResponse({'error': "size invalide."}, status=400)
+    except chunks.UploadError as exc:
+        return error(exc)
+    upload = Upload.objects.create(owner=request.user, purpose=purpose, filename=filename, size=size)
+    response = upload_state(upload)
+    response.status_code = 201
+    return response
+
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_chunk(request, pk):
+    upload = get_object_or_404(Upload, pk=pk, owner=request.user)
+    if request.method == 'DELETE':
+        upload.delete()
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': "Upload-Offset et Content-Length sont requis."}, status=400)
+        try:
+            chunks.write_chunk(upload, offset, request, length,
+                               chunks.parse_checksum(request.headers.get('Upload-Checksum')))
+        except chunks.UploadError as exc:
+            response = error(exc)
+            response['Upload-Offset'] = str(Upload.objects.filter(pk=upload.pk).values_list('received', flat=True).first() or 0)
+            return response
+    return upload_state(upload)